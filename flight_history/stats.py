@@ -2,13 +2,20 @@
 MODE = "daily"
 
 import os
-import glob
+import sys
+import sqlite3
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 from datetime import date, timedelta
 
 HISTORY_DIR = os.path.dirname(os.path.abspath(__file__))
+# Written by the tracker with historyBackend: sqlite, used instead of the day files when it has the newer data
+HISTORY_DB = os.path.join(HISTORY_DIR, "history.db")
+
+sys.path.insert(0, os.path.dirname(HISTORY_DIR))
+from modules.history_archive import read_archive_frame
+from modules.history_journal import flight_history_days, journal_days, journal_path, load_flight_history_day, sealed_journal_paths
 
 PALETTE = [
     "#5B8BD1", "#E87040", "#4CAF50", "#9C6BDE", "#E8B840",
@@ -31,51 +38,123 @@ def csv_path(d: date) -> str:
     return os.path.join(HISTORY_DIR, f"{d}.csv")
 
 
-def collect_files(mode: str) -> list[str]:
+def archive_path(d: date) -> str:
+    # Columnar archive written by scripts/archive_history.py
+    return os.path.join(HISTORY_DIR, f"{d}.npz")
+
+
+def day_file(d) -> str | None:
+    # The archive unless the CSV was written after it, it reads far faster
+    paths = [path for path in (archive_path(d), csv_path(d)) if os.path.exists(path)]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime) if len(paths) > 1 else paths[0]
+
+
+def all_days() -> list[str]:
+    # Days with a CSV, an archive or journal data the tracker hasn't compacted yet
+    return flight_history_days(HISTORY_DIR)
+
+
+def day_written(d) -> float:
+    paths = [path for path in (day_file(d), journal_path(HISTORY_DIR, d)) if path and os.path.exists(path)]
+    return max(os.path.getmtime(path) for path in paths + sealed_journal_paths(HISTORY_DIR, d))
+
+
+def mode_days(days: list[str], mode: str) -> list[str]:
+    # The days (sorted) the mode covers, daily is today or else the most recent day
     today = date.today()
     if mode == "daily":
-        p = csv_path(today)
-        if os.path.exists(p):
-            return [p]
-        # fall back to most recent file
-        all_files = sorted(glob.glob(os.path.join(HISTORY_DIR, "????-??-??.csv")))
-        return [all_files[-1]] if all_files else []
+        return [d for d in days if d <= str(today)][-1:]
     if mode == "weekly":
-        return [csv_path(today - timedelta(days=i)) for i in range(7)
-                if os.path.exists(csv_path(today - timedelta(days=i)))]
-    if mode == "monthly":
-        return [csv_path(today - timedelta(days=i)) for i in range(30)
-                if os.path.exists(csv_path(today - timedelta(days=i)))]
-    if mode == "all_time":
-        return sorted(glob.glob(os.path.join(HISTORY_DIR, "????-??-??.csv")))
-    raise ValueError(f"Unknown mode: {mode!r}")
+        first = str(today - timedelta(days=6))
+    elif mode == "monthly":
+        first = str(today - timedelta(days=29))
+    elif mode == "all_time":
+        return list(days)
+    else:
+        raise ValueError(f"Unknown mode: {mode!r}")
+    return [d for d in days if first <= d <= str(today)]
+
+
+def db_days() -> list[str]:
+    conn = sqlite3.connect(f"file:{HISTORY_DB}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in conn.execute("SELECT DISTINCT day FROM sightings ORDER BY day")]
+    finally:
+        conn.close()
+
+
+def choose_source(mode: str) -> tuple[str, list[str]]:
+    # ("db" or "files", days) for the mode. A tracker that changed backend
+    # leaves both behind, so the source with the newest day wins, then the
+    # one covering more days, then the one written to last.
+    file_days = mode_days(all_days(), mode)
+    database_days = mode_days(db_days(), mode) if os.path.exists(HISTORY_DB) else []
+    if not database_days or not file_days:
+        return ("db", database_days) if database_days else ("files", file_days)
+    db_written = max(os.path.getmtime(path) for path in (HISTORY_DB, HISTORY_DB + "-wal") if os.path.exists(path))
+    files_written = max(day_written(d) for d in file_days)
+    if (database_days[-1], len(database_days), db_written) > (file_days[-1], len(file_days), files_written):
+        return "db", database_days
+    return "files", file_days
 
 
 NUMERIC_COLS = [
     "altitude", "alt_geom", "speed", "mach", "baro_rate", "geom_rate",
     "ias", "tas", "lat", "lon", "messages", "rssi", "roll", "oat", "tat",
 ]
+# The columns the charts and summary use, nothing else is read
+STATS_COLUMNS = [
+    "icao", "first_seen", "owner", "manufacturer", "model", "category", "emergency",
+    "altitude", "speed", "mach", "baro_rate",
+]
+
+
+def load_day(d: str, pending: set[str]) -> pd.DataFrame:
+    # Days with journal data not yet compacted into their CSV (today, up to
+    # historyCompactInterval behind) are read merged with it, as rarity.py does
+    if d in pending:
+        rows = load_flight_history_day(HISTORY_DIR, d, with_history=False)
+        return pd.DataFrame.from_records(list(rows.values()), columns=STATS_COLUMNS)
+    path = day_file(d)
+    if path.endswith(".npz"):
+        return read_archive_frame(path, STATS_COLUMNS)
+    return pd.read_csv(path, usecols=lambda col: col in STATS_COLUMNS, low_memory=False)
 
 
-def load_data(files: list[str]) -> pd.DataFrame:
+def load_data(days: list[str]) -> pd.DataFrame:
+    pending = journal_days(HISTORY_DIR)
     parts = []
-    for f in files:
+    for d in days:
         try:
-            parts.append(pd.read_csv(f, low_memory=False))
+            parts.append(load_day(d, pending))
         except Exception as e:
-            print(f"  Warning: could not read {f}: {e}")
+            print(f"  Warning: could not read {d}: {e}")
     if not parts:
         raise FileNotFoundError("No valid CSV data found.")
-    df = pd.concat(parts, ignore_index=True)
+    return prepare_data(pd.concat(parts, ignore_index=True))
+
+
+def load_db_data(days: list[str]) -> pd.DataFrame:
+    # Only the days in range are read, off the day index, and only STATS_COLUMNS
+    conn = sqlite3.connect(f"file:{HISTORY_DB}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(f"SELECT day, {', '.join(STATS_COLUMNS)} FROM sightings WHERE day BETWEEN ? AND ?", conn,
+                                 params=(days[0], days[-1]))
+    finally:
+        conn.close()
 
-    # Coerce numeric columns — raw data uses '-' for missing
+
+def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
+    # Coerce numeric columns — raw data uses '-' for missing, archives are already typed
     for col in NUMERIC_COLS:
-        if col in df.columns:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
             df[col] = pd.to_numeric(df[col].replace("-", pd.NA), errors="coerce")
 
     # Parse timestamps
     for col in ("first_seen", "last_seen"):
-        if col in df.columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
             df[col] = pd.to_datetime(df[col], errors="coerce")
 
     # Clean string columns
@@ -257,12 +336,22 @@ def plot_summary(ax, df: pd.DataFrame, mode: str, files_count: int):
 
 def main():
     print(f"[stats] Mode: {MODE}")
-    files = collect_files(MODE)
-    if not files:
-        print(f"Error: no CSV files found for mode '{MODE}' in {HISTORY_DIR}")
-        return
-    print(f"[stats] Loading {len(files)} file(s)…")
-    df = load_data(files)
+    source, days = choose_source(MODE)
+    if source == "db":
+        print(f"[stats] Loading {len(days)} day(s) from {HISTORY_DB}…")
+        df = load_db_data(days)
+        if df.empty:
+            print(f"Error: no sightings found for mode '{MODE}' in {HISTORY_DB}")
+            return
+        files = days
+        df = prepare_data(df)
+    else:
+        files = days
+        if not files:
+            print(f"Error: no CSV files found for mode '{MODE}' in {HISTORY_DIR}")
+            return
+        print(f"[stats] Loading {len(files)} day(s)…")
+        df = load_data(days)
     print(f"[stats] {len(df):,} flight records loaded")
 
     df["cat_label"] = df["category"].map(CATEGORY_LABELS).fillna(df.get("category", pd.Series(dtype=str)))
@@ -0,0 +1,196 @@
+import csv
+import gzip
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from .core_utils import clean_manufacturer, clean_string
+from .trajectory_points import encode_icao
+
+# Offline aircraft registry, built by scripts/import_registry.py from a
+# downloaded registry dump and consulted before hexdb. One file, memory-mapped
+# and only ever replaced whole (temp file + rename), so a new dump can be
+# dropped in while the tracker runs:
+#
+#   header     8 byte magic, record count, string count, string bytes (u4 each)
+#   keys       encoded icaos (trajectory_points.encode_icao) as sorted u4
+#   records    (registration, manufacturer, model, owner, icao_type_code) as
+#              u4 in key order, indexes into the string table
+#   offsets    string count + 1 u4 offsets into the string bytes
+#   strings    utf-8, string 0 is '-'
+
+REGISTRY_MAGIC = b'PTREG\x00\x01\x00'
+REGISTRY_FIELDS = ('registration', 'manufacturer', 'model', 'owner', 'icao_type_code')
+RECORD_DTYPE = np.dtype([(field, '<u4') for field in REGISTRY_FIELDS])
+_HEADER = struct.Struct('<8sIII')
+
+#Column names used by the common dumps (hexdb, OpenSky aircraftDatabase.csv, tar1090-db), first present wins
+_SOURCE_COLUMNS = {
+    'icao': ('icao', 'icao24', 'hex', 'modes', 'mode_s', 'icaoaddress'),
+    'registration': ('registration', 'reg', 'r'),
+    'manufacturer': ('manufacturer', 'manufacturername', 'manufacturer_name'),
+    'model': ('model', 'type', 'desc'),
+    'owner': ('owner', 'registeredowners', 'operator', 'ownop', 'airline'),
+    'icao_type_code': ('icao_type_code', 'icaotypecode', 'typecode', 't'),
+}
+
+
+def registry_record(source_row):
+    # A dump row as {icao, registration, manufacturer, model, owner,
+    # icao_type_code}, cleaned like fetch_plane_info's; None without a valid icao
+    values = {str(key).strip().lower(): value for key, value in source_row.items() if key is not None}
+
+    def pick(field):
+        for column in _SOURCE_COLUMNS[field]:
+            value = values.get(column)
+            if value is not None and str(value).strip():
+                return str(value).strip()
+        return '-'
+
+    icao = pick('icao').upper()
+    if encode_icao(icao) is None:
+        return None
+    return {
+        'icao': icao,
+        'registration': clean_string(pick('registration')),
+        'manufacturer': clean_manufacturer(pick('manufacturer')),
+        'model': clean_string(pick('model')),
+        'owner': clean_string(pick('owner')),
+        'icao_type_code': clean_string(pick('icao_type_code')),
+    }
+
+
+def read_registry_source(path):
+    # Rows of a CSV, JSON (a list, or {icao: {...}}) or JSON lines dump, optionally gzipped
+    opener = gzip.open if path.endswith('.gz') else open
+    name = path[:-3] if path.endswith('.gz') else path
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if name.endswith('.csv'):
+            yield from csv.DictReader(f)
+        elif name.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            data = json.load(f)
+            if isinstance(data, dict):
+                for icao, row in data.items():
+                    if isinstance(row, dict):
+                        yield {'icao': icao, **row}
+            else:
+                yield from (row for row in data if isinstance(row, dict))
+
+
+def build_registry(records, path):
+    # Writes records (registry_record dicts) as a registry file, a later
+    # record for the same icao replaces an earlier one. Returns the count.
+    strings = {'-': 0}
+    codes = []
+    rows = []
+    for record in records:
+        code = encode_icao(record['icao'])
+        if code is None:
+            continue
+        codes.append(code)
+        rows.append(tuple(strings.setdefault(record.get(field) or '-', len(strings)) for field in REGISTRY_FIELDS))
+    keys = np.array(codes, dtype='<u4')
+    array = np.array(rows, dtype=RECORD_DTYPE) if rows else np.empty(0, dtype=RECORD_DTYPE)
+    if len(array):
+        order = np.lexsort((np.arange(len(keys)), keys))
+        keys, array = keys[order], array[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[:-1] = keys[1:] != keys[:-1]
+        keys, array = keys[keep], array[keep]
+
+    encoded = [text.encode('utf-8') for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    offsets[1:] = np.cumsum([len(text) for text in encoded])
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(REGISTRY_MAGIC, len(array), len(encoded), int(offsets[-1])))
+            keys.tofile(f)
+            array.tofile(f)
+            offsets.tofile(f)
+            f.write(b''.join(encoded))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(array)
+
+
+class AircraftRegistry:
+    # Memory-mapped reader, a lookup is one binary search. The file is
+    # re-opened when it has been replaced, checked every check_interval seconds.
+    def __init__(self, path, check_interval=30.0, registry=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.registry = registry
+        self.signature = None
+        self.checked_at = 0.0
+        #(keys, records, offsets, strings) of one file, swapped in a single assignment so a
+        #lookup running during reload() never mixes the old records with the new strings
+        self.tables = (np.empty(0, dtype='<u4'), np.empty(0, dtype=RECORD_DTYPE), np.zeros(1, dtype='<u4'), np.empty(0, dtype=np.uint8))
+        self.reload()
+
+    def __len__(self):
+        return len(self.tables[0])
+
+    def reload(self):
+        # True when a new file was mapped
+        self.checked_at = time.time()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime)
+        if signature == self.signature:
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, record_count, string_count, string_bytes = _HEADER.unpack_from(mapped)
+            if magic != REGISTRY_MAGIC:
+                raise ValueError('not a registry file')
+            #Plain ndarray views of the mapping, np.memmap's per-index overhead dominates a lookup
+            offset = _HEADER.size
+            keys = np.frombuffer(mapped, dtype='<u4', count=record_count, offset=offset)
+            offset += record_count * 4
+            records = np.frombuffer(mapped, dtype=RECORD_DTYPE, count=record_count, offset=offset)
+            offset += record_count * RECORD_DTYPE.itemsize
+            offsets = np.frombuffer(mapped, dtype='<u4', count=string_count + 1, offset=offset)
+            offset += (string_count + 1) * 4
+            strings = np.frombuffer(mapped, dtype=np.uint8, count=string_bytes, offset=offset)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Registry error: {self.path}: {e}")
+            return False
+        self.tables = (keys, records, offsets, strings)
+        self.signature = signature
+        return True
+
+    def lookup(self, icao):
+        # {registration, manufacturer, model, owner, icao_type_code} or None
+        started = time.perf_counter()
+        if time.time() - self.checked_at >= self.check_interval:
+            self.reload()
+        entry = None
+        code = encode_icao(icao)
+        keys, records, offsets, strings = self.tables
+        if code is not None and len(keys):
+            #A uint32 key, a Python int would make searchsorted convert the whole array
+            index = int(keys.searchsorted(np.uint32(code)))
+            if index < len(keys) and keys[index] == code:
+                entry = {}
+                for field, string in zip(REGISTRY_FIELDS, records[index].tolist()):
+                    start, end = offsets[string:string + 2].tolist()
+                    entry[field] = strings[start:end].tobytes().decode('utf-8')
+        if self.registry is not None:
+            self.registry.inc('registry_hits' if entry else 'registry_misses')
+            self.registry.observe('registry_lookup_ms', (time.perf_counter() - started) * 1000)
+        return entry
@@ -0,0 +1,364 @@
+import math
+import time
+
+from .network_utils import stream_from_server
+
+# Beast binary framing (readsb/dump1090 port 30005): 0x1a, type, 6 byte 12MHz
+# MLAT counter, 1 byte signal level, then the Mode S payload. Any 0x1a inside
+# the frame is doubled.
+BEAST_ESCAPE = 0x1a
+BEAST_FRAME_LENGTHS = {0x31: 2, 0x32: 7, 0x33: 14}
+BEAST_MLAT_CLOCK_HZ = 12_000_000
+
+MODES_CRC_GENERATOR = 0xFFF409
+CPR_MAX_PAIR_SECONDS = 10.0
+CPR_LOCAL_MAX_AGE_SECONDS = 600.0
+CPR_MAX_RANGE_KM = 600.0
+BEAST_STATE_MAX_AGE_SECONDS = 300
+
+_CALLSIGN_CHARS = '#ABCDEFGHIJKLMNOPQRSTUVWXYZ##### ###############0123456789######'
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 16
+        for _ in range(8):
+            crc = ((crc << 1) ^ MODES_CRC_GENERATOR) if crc & 0x800000 else (crc << 1)
+        table.append(crc & 0xFFFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def modes_crc(message):
+    # Remainder over the whole message: 0 for a clean DF17/18, the sender's
+    # address for DF4/5/20/21 where the parity is overlaid with the AP field
+    crc = 0
+    for byte in message[:-3]:
+        crc = ((crc << 8) & 0xFFFFFF) ^ _CRC_TABLE[((crc >> 16) ^ byte) & 0xFF]
+    return crc ^ int.from_bytes(message[-3:], 'big')
+
+
+def split_beast_frames(buffer):
+    # Returns ([(frame_type, mlat_ticks, signal, payload), ...], unconsumed tail)
+    frames = []
+    data = bytes(buffer)
+    index = 0
+    length = len(data)
+
+    while index < length:
+        if data[index] != BEAST_ESCAPE:
+            index += 1
+            continue
+        if index + 1 >= length:
+            break
+        frame_type = data[index + 1]
+        payload_length = BEAST_FRAME_LENGTHS.get(frame_type)
+        if payload_length is None:
+            index += 1
+            continue
+
+        wanted = 6 + 1 + payload_length
+        body = bytearray()
+        cursor = index + 2
+        while len(body) < wanted and cursor < length:
+            byte = data[cursor]
+            if byte == BEAST_ESCAPE:
+                if cursor + 1 >= length:
+                    break
+                if data[cursor + 1] != BEAST_ESCAPE:
+                    # Unescaped 0x1a means the frame was cut short, resync there
+                    break
+                cursor += 1
+            body.append(byte)
+            cursor += 1
+
+        if len(body) < wanted:
+            if cursor >= length or (cursor + 1 >= length and data[cursor] == BEAST_ESCAPE):
+                return frames, data[index:]
+            index = cursor
+            continue
+
+        frames.append((frame_type, int.from_bytes(body[:6], 'big'), body[6], bytes(body[7:])))
+        index = cursor
+
+    return frames, b''
+
+
+def _cpr_nl(lat):
+    if lat == 0:
+        return 59
+    if abs(lat) == 87:
+        return 2
+    if abs(lat) > 87:
+        return 1
+    nz = 15
+    a = 1 - math.cos(math.pi / (2 * nz))
+    b = math.cos(math.pi / 180.0 * abs(lat)) ** 2
+    return int(math.floor(2 * math.pi / math.acos(1 - a / b)))
+
+
+def cpr_global_position(even, odd):
+    # even/odd are (lat_cpr, lon_cpr, received_time) with 17 bit raw values
+    lat_even_cpr, lon_even_cpr = even[0] / 131072.0, even[1] / 131072.0
+    lat_odd_cpr, lon_odd_cpr = odd[0] / 131072.0, odd[1] / 131072.0
+
+    j = math.floor(59 * lat_even_cpr - 60 * lat_odd_cpr + 0.5)
+    lat_even = (360.0 / 60) * (j % 60 + lat_even_cpr)
+    lat_odd = (360.0 / 59) * (j % 59 + lat_odd_cpr)
+    if lat_even >= 270:
+        lat_even -= 360
+    if lat_odd >= 270:
+        lat_odd -= 360
+
+    if _cpr_nl(lat_even) != _cpr_nl(lat_odd):
+        return None
+
+    if even[2] >= odd[2]:
+        lat = lat_even
+        nl = _cpr_nl(lat)
+        ni = max(nl, 1)
+        m = math.floor(lon_even_cpr * (nl - 1) - lon_odd_cpr * nl + 0.5)
+        lon = (360.0 / ni) * (m % ni + lon_even_cpr)
+    else:
+        lat = lat_odd
+        nl = _cpr_nl(lat)
+        ni = max(nl - 1, 1)
+        m = math.floor(lon_even_cpr * (nl - 1) - lon_odd_cpr * nl + 0.5)
+        lon = (360.0 / ni) * (m % ni + lon_odd_cpr)
+
+    if lon >= 180:
+        lon -= 360
+    return lat, lon
+
+
+def cpr_local_position(lat_cpr_raw, lon_cpr_raw, odd, ref_lat, ref_lon):
+    lat_cpr = lat_cpr_raw / 131072.0
+    lon_cpr = lon_cpr_raw / 131072.0
+    i = 1 if odd else 0
+
+    dlat = 360.0 / (60 - i)
+    j = math.floor(ref_lat / dlat) + math.floor(0.5 + (ref_lat % dlat) / dlat - lat_cpr)
+    lat = dlat * (j + lat_cpr)
+
+    nl = _cpr_nl(lat) - i
+    dlon = 360.0 / nl if nl > 0 else 360.0
+    m = math.floor(ref_lon / dlon) + math.floor(0.5 + (ref_lon % dlon) / dlon - lon_cpr)
+    lon = dlon * (m + lon_cpr)
+    return lat, lon
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _decode_ac12(ac12):
+    # Only the Q=1 (25ft) encoding, Gillham altitudes are ignored
+    if not ac12 & 0x10:
+        return None
+    n = ((ac12 & 0xFE0) >> 1) | (ac12 & 0x0F)
+    return n * 25 - 1000
+
+
+def _decode_ac13(ac13):
+    if ac13 & 0x40 or not ac13 & 0x10:
+        return None
+    n = ((ac13 & 0x1F80) >> 2) | ((ac13 & 0x20) >> 1) | (ac13 & 0x0F)
+    return n * 25 - 1000
+
+
+def _decode_squawk(id13):
+    bit = lambda n: (id13 >> n) & 1
+    a = bit(7) * 4 + bit(9) * 2 + bit(11)
+    b = bit(1) * 4 + bit(3) * 2 + bit(5)
+    c = bit(8) * 4 + bit(10) * 2 + bit(12)
+    d = bit(0) * 4 + bit(2) * 2 + bit(4)
+    return f"{a}{b}{c}{d}"
+
+
+def _decode_identification(me):
+    type_code = me >> 51
+    category_set = 'DCBA'[type_code - 1]
+    category = f"{category_set}{(me >> 48) & 0x7}"
+    chars = ''.join(_CALLSIGN_CHARS[(me >> (42 - 6 * i)) & 0x3F] for i in range(8))
+    return {'flight': chars.replace('#', '').strip(), 'category': category}
+
+
+def _decode_velocity(me):
+    subtype = (me >> 48) & 0x7
+    fields = {}
+
+    vertical_rate = (me >> 10) & 0x1FF
+    if vertical_rate:
+        rate = (vertical_rate - 1) * 64 * (-1 if (me >> 19) & 1 else 1)
+        fields['baro_rate' if (me >> 20) & 1 else 'geom_rate'] = rate
+
+    if subtype in (1, 2):
+        multiplier = 4 if subtype == 2 else 1
+        v_ew = (me >> 32) & 0x3FF
+        v_ns = (me >> 21) & 0x3FF
+        if v_ew and v_ns:
+            v_ew = (v_ew - 1) * multiplier * (-1 if (me >> 42) & 1 else 1)
+            v_ns = (v_ns - 1) * multiplier * (-1 if (me >> 31) & 1 else 1)
+            fields['gs'] = round(math.hypot(v_ew, v_ns), 1)
+            fields['track'] = round(math.degrees(math.atan2(v_ew, v_ns)) % 360, 2)
+    elif subtype in (3, 4):
+        if (me >> 42) & 1:
+            fields['mag_heading'] = round(((me >> 32) & 0x3FF) * 360.0 / 1024, 2)
+        airspeed = (me >> 21) & 0x3FF
+        if airspeed:
+            airspeed = (airspeed - 1) * (4 if subtype == 4 else 1)
+            fields['tas' if (me >> 31) & 1 else 'ias'] = airspeed
+    return fields
+
+
+def _apply_position(aircraft, me, type_code, now, reference):
+    odd = (me >> 34) & 1
+    lat_cpr = (me >> 17) & 0x1FFFF
+    lon_cpr = me & 0x1FFFF
+    fields = {}
+
+    altitude = _decode_ac12((me >> 36) & 0xFFF)
+    if altitude is not None:
+        fields['alt_geom' if type_code >= 20 else 'alt_baro'] = altitude
+
+    aircraft['cpr_odd' if odd else 'cpr_even'] = (lat_cpr, lon_cpr, now)
+    position = None
+
+    last_position_time = aircraft.get('last_position_time')
+    if 'lat' in aircraft and last_position_time is not None and now - last_position_time <= CPR_LOCAL_MAX_AGE_SECONDS:
+        position = cpr_local_position(lat_cpr, lon_cpr, odd, aircraft['lat'], aircraft['lon'])
+        if _distance_km(aircraft['lat'], aircraft['lon'], position[0], position[1]) > 50:
+            position = None
+
+    if position is None:
+        even = aircraft.get('cpr_even')
+        odd_frame = aircraft.get('cpr_odd')
+        if even and odd_frame and abs(even[2] - odd_frame[2]) <= CPR_MAX_PAIR_SECONDS:
+            position = cpr_global_position(even, odd_frame)
+            if position is not None and reference is not None:
+                if _distance_km(reference[0], reference[1], position[0], position[1]) > CPR_MAX_RANGE_KM:
+                    position = None
+
+    if position is not None:
+        fields['lat'] = round(position[0], 6)
+        fields['lon'] = round(position[1], 6)
+    return fields
+
+
+def decode_modes_message(aircraft_state, payload, now=None, reference=None, signal=None, mlat_ticks=None):
+    # Decode one Mode S payload into the readsb-style aircraft state. Returns
+    # (aircraft, fields updated by this message) or None if it was unusable.
+    now = now or time.time()
+    if len(payload) < 7:
+        return None
+
+    downlink_format = payload[0] >> 3
+    if downlink_format in (17, 18) and len(payload) == 14:
+        if modes_crc(payload) != 0:
+            return None
+        if downlink_format == 18 and (payload[0] & 0x7) not in (0, 1, 6):
+            return None
+        hex_code = payload[1:4].hex()
+    elif downlink_format in (4, 5, 20, 21):
+        # Address/parity: only trusted for aircraft already heard via DF17/18
+        hex_code = f"{modes_crc(payload):06x}"
+        if hex_code not in aircraft_state:
+            return None
+    else:
+        return None
+
+    aircraft = aircraft_state.get(hex_code)
+    if aircraft is None:
+        aircraft = {'hex': hex_code, 'messages': 0}
+        aircraft_state[hex_code] = aircraft
+
+    fields = {}
+    if downlink_format in (17, 18):
+        me = int.from_bytes(payload[4:11], 'big')
+        type_code = me >> 51
+        if 1 <= type_code <= 4:
+            fields = _decode_identification(me)
+        elif 9 <= type_code <= 18 or 20 <= type_code <= 22:
+            fields = _apply_position(aircraft, me, type_code, now, reference)
+        elif type_code == 19:
+            fields = _decode_velocity(me)
+    elif downlink_format in (4, 20):
+        altitude = _decode_ac13(((payload[2] & 0x1F) << 8) | payload[3])
+        if altitude is not None:
+            fields['alt_baro'] = altitude
+    else:
+        fields['squawk'] = _decode_squawk(((payload[2] & 0x1F) << 8) | payload[3])
+
+    aircraft.update(fields)
+    aircraft['messages'] += 1
+    aircraft['last_message_time'] = now
+    if 'lat' in fields:
+        aircraft['last_position_time'] = now
+    if mlat_ticks is not None:
+        aircraft['mlat_ticks'] = mlat_ticks
+    if signal is not None:
+        aircraft['rssi'] = round(10 * math.log10(max((signal / 255.0) ** 2, 1.125e-5)), 1)
+
+    aircraft['seen'] = 0.0
+    if 'last_position_time' in aircraft:
+        aircraft['seen_pos'] = round(now - aircraft['last_position_time'], 1)
+    return aircraft, fields
+
+
+def prune_beast_state(aircraft_state, max_age_seconds=BEAST_STATE_MAX_AGE_SECONDS, now=None):
+    now = now or time.time()
+    cutoff = now - max_age_seconds
+    for hex_code in [h for h, a in aircraft_state.items() if a.get('last_message_time', 0) < cutoff]:
+        del aircraft_state[hex_code]
+
+
+def decode_beast_bytes(data, aircraft_state=None, reference=None, now=None):
+    # Offline helper for captured .bin files: every frame is stamped with `now`
+    aircraft_state = {} if aircraft_state is None else aircraft_state
+    frames, _tail = split_beast_frames(data)
+    updates = []
+    for frame_type, mlat_ticks, signal, payload in frames:
+        if frame_type == 0x31:
+            continue
+        result = decode_modes_message(aircraft_state, payload, now, reference, signal, mlat_ticks)
+        if result is not None:
+            updates.append((dict(result[0]), result[1]))
+    return aircraft_state, updates
+
+
+def beast_stream(server, on_aircraft, should_run=lambda: True, on_status=None, reference=None, retry_delay=1, max_retry_delay=60, read_timeout=30):
+    # Same contract as sbs_stream: on_aircraft(aircraft, fields) per decoded message
+    aircraft_state = {}
+    pending = [b'']
+    last_prune = [time.time()]
+
+    def handle_chunk(chunk):
+        frames, pending[0] = split_beast_frames(pending[0] + chunk)
+        handled = 0
+        now = time.time()
+        for frame_type, mlat_ticks, signal, payload in frames:
+            if frame_type == 0x31:
+                continue
+            result = decode_modes_message(aircraft_state, payload, now, reference, signal, mlat_ticks)
+            if result is None:
+                continue
+            handled += 1
+            on_aircraft(*result)
+
+        if now - last_prune[0] >= 10:
+            prune_beast_state(aircraft_state, now=now)
+            last_prune[0] = now
+        return handled
+
+    def on_connection_status(text):
+        pending[0] = b''
+        (on_status or print)(text)
+
+    stream_from_server(server, handle_chunk, should_run, on_connection_status, 'Beast feed', retry_delay, max_retry_delay, read_timeout)
+    return aircraft_state
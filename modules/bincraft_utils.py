@@ -0,0 +1,281 @@
+import math
+import time
+from datetime import datetime
+from itertools import repeat
+
+import numpy as np
+
+# readsb's compact binCraft snapshot (--write-binCraft, as read by tar1090):
+# a header padded to `stride` bytes followed by one fixed-size record per
+# aircraft. Header words: now (ms, low/high), stride, aircraft with position,
+# globe index, 4 x int16 limits, message count, receiver lat/lon, version.
+BINCRAFT_RECORD_DTYPE = np.dtype([
+    ('addr', '<u4'), ('seen_pos', '<u2'), ('seen', '<u2'),
+    ('lon', '<i4'), ('lat', '<i4'),
+    ('baro_rate', '<i2'), ('geom_rate', '<i2'), ('alt_baro', '<i2'), ('alt_geom', '<i2'),
+    ('nav_altitude_mcp', '<u2'), ('nav_altitude_fms', '<u2'), ('nav_qnh', '<i2'), ('nav_heading', '<i2'),
+    ('squawk', '<u2'), ('gs', '<i2'), ('mach', '<i2'), ('roll', '<i2'),
+    ('track', '<i2'), ('track_rate', '<i2'), ('mag_heading', '<i2'), ('true_heading', '<i2'),
+    ('wd', '<i2'), ('ws', '<i2'), ('oat', '<i2'), ('tat', '<i2'),
+    ('tas', '<u2'), ('ias', '<u2'), ('pos_rc', '<u2'), ('messages', '<u2'),
+    ('category', 'u1'), ('pos_nic', 'u1'), ('nav_modes', 'u1'), ('emergency_addrtype', 'u1'),
+    ('airground_altsrc', 'u1'), ('sil_type_adsb', 'u1'), ('adsr_tisb', 'u1'), ('nac', 'u1'), ('sil_flags', 'u1'),
+    ('validity', 'u1', (5,)),
+    ('callsign', 'S8'), ('db_flags', '<u2'), ('type_code', 'S4'), ('registration', 'S12'),
+    ('receiver_count', 'u1'), ('signal', 'u1'), ('extra_flags', 'u1'), ('reserved', 'u1', (5,)),
+])
+BINCRAFT_HEADER_DTYPE = np.dtype([
+    ('now_low', '<u4'), ('now_high', '<u4'), ('stride', '<u4'), ('with_pos', '<u4'), ('globe_index', '<u4'),
+    ('limits', '<i2', (4,)), ('messages', '<u4'), ('receiver_lat', '<i4'), ('receiver_lon', '<i4'), ('version', '<u4'),
+])
+
+# (record field, aircraft.json key, scale, validity byte, validity mask).
+# readsb's validity block is a run of bitfields: byte 0 starts with the
+# nic_baro, alert and spi values themselves, then callsign, alt_baro,
+# alt_geom, position and gs; byte 2 is nic/nac/sil validity we don't read
+BINCRAFT_NUMERIC_FIELDS = [
+    ('alt_baro', 'alt_baro', 25, 0, 0x10),
+    ('alt_geom', 'alt_geom', 25, 0, 0x20),
+    ('gs', 'gs', 0.1, 0, 0x80),
+    ('ias', 'ias', 1, 1, 0x01),
+    ('tas', 'tas', 1, 1, 0x02),
+    ('mach', 'mach', 0.001, 1, 0x04),
+    ('track', 'track', 1 / 90, 1, 0x08),
+    ('track_rate', 'track_rate', 0.01, 1, 0x10),
+    ('roll', 'roll', 0.01, 1, 0x20),
+    ('mag_heading', 'mag_heading', 1 / 90, 1, 0x40),
+    ('true_heading', 'true_heading', 1 / 90, 1, 0x80),
+    ('baro_rate', 'baro_rate', 8, 2, 0x01),
+    ('geom_rate', 'geom_rate', 8, 2, 0x02),
+    ('nav_qnh', 'nav_qnh', 0.1, 3, 0x20),
+    ('nav_altitude_mcp', 'nav_altitude_mcp', 4, 3, 0x40),
+    ('nav_altitude_fms', 'nav_altitude_fms', 4, 3, 0x80),
+    ('nav_heading', 'nav_heading', 1 / 90, 4, 0x02),
+    ('wd', 'wd', 1, 4, 0x10),
+    ('ws', 'ws', 1, 4, 0x10),
+    ('oat', 'oat', 1, 4, 0x20),
+    ('tat', 'tat', 1, 4, 0x20),
+]
+BINCRAFT_VALID_CALLSIGN = (0, 0x08)
+BINCRAFT_VALID_POSITION = (0, 0x40)
+BINCRAFT_VALID_SQUAWK = (3, 0x04)
+BINCRAFT_VALID_EMERGENCY = (3, 0x08)
+
+#parse_aircraft's keys in its order: the ones bincraft_planes fills from columns, then the enrichment placeholders
+_PLANE_FIELDS = ('icao', 'flight', 'squawk', 'category', 'emergency', 'altitude', 'alt_geom', 'baro_rate', 'geom_rate', 'speed',
+                 'ias', 'tas', 'mach', 'track', 'track_rate', 'mag_heading', 'true_heading', 'nav_heading', 'nav_altitude_fms',
+                 'nav_altitude_mcp', 'nav_qnh', 'nav_modes', 'roll', 'oat', 'tat', 'wd', 'ws', 'rssi', 'seen', 'seen_pos', 'messages',
+                 'lat', 'lon')
+_PLANE_ENRICHMENT_FIELDS = ('manufacturer', 'registration', 'owner', 'model', 'icao_type_code', 'code_mode_s', 'operator_flag')
+
+EMERGENCY_NAMES = ['none', 'general', 'lifeguard', 'minfuel', 'nordo', 'unlawful', 'downed', 'reserved']
+BINCRAFT_SUFFIXES = ('.binCraft', '.binCraft.zst')
+#.binCraft.zst needs the optional zstandard package (pip install zstandard)
+ZSTD_MISSING_MESSAGE = "Reading .binCraft.zst needs the zstandard package (pip install zstandard), or point readsbPath at an uncompressed .binCraft/aircraft.json"
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def is_bincraft_path(path):
+    return str(path).endswith(BINCRAFT_SUFFIXES)
+
+
+def bincraft_path_error(path):
+    # Why path can't be read here (compressed without zstandard installed), or None
+    if str(path).endswith('.zst') and zstandard is None:
+        return ZSTD_MISSING_MESSAGE
+    return None
+
+
+def read_bincraft_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if str(path).endswith('.zst'):
+        if zstandard is None:
+            raise ImportError(ZSTD_MISSING_MESSAGE)
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def decode_bincraft(buffer):
+    # Bulk unpack into column arrays: numeric columns are float64 with NaN
+    # where readsb marked the value invalid, so callers can vectorise on them
+    header = np.frombuffer(buffer, dtype=BINCRAFT_HEADER_DTYPE, count=1)[0]
+    stride = int(header['stride'])
+    if stride < BINCRAFT_RECORD_DTYPE.itemsize:
+        raise ValueError(f"Unsupported binCraft record size {stride}")
+
+    count = max(0, (len(buffer) - stride) // stride)
+    records = np.ndarray(shape=(count,), dtype=BINCRAFT_RECORD_DTYPE, buffer=buffer, offset=stride, strides=(stride,))
+    validity = records['validity']
+
+    def valid(byte_index, mask):
+        return (validity[:, byte_index] & mask) != 0
+
+    columns = {
+        'hex': records['addr'] & 0xFFFFFF,
+        'non_icao': (records['addr'] & 0x1000000) != 0,
+        'messages': records['messages'].astype(np.int64),
+        'seen': records['seen'] / 10.0,
+        'seen_pos': np.where(valid(*BINCRAFT_VALID_POSITION), records['seen_pos'] / 10.0, np.nan),
+        'lat': np.where(valid(*BINCRAFT_VALID_POSITION), records['lat'] / 1e6, np.nan),
+        'lon': np.where(valid(*BINCRAFT_VALID_POSITION), records['lon'] / 1e6, np.nan),
+        'callsign_valid': valid(*BINCRAFT_VALID_CALLSIGN),
+        'callsign': records['callsign'],
+        'squawk_valid': valid(*BINCRAFT_VALID_SQUAWK),
+        'squawk': records['squawk'],
+        'emergency': np.where(valid(*BINCRAFT_VALID_EMERGENCY), (records['emergency_addrtype'] & 0x0F).astype(np.int16), -1),
+        'category': records['category'],
+        'signal': records['signal'],
+    }
+    for field, key, scale, byte_index, mask in BINCRAFT_NUMERIC_FIELDS:
+        columns[key] = np.where(valid(byte_index, mask), records[field].astype(np.float64) * scale, np.nan)
+
+    now = int(header['now_low']) / 1000.0 + int(header['now_high']) * 4294967.296
+    return now, columns
+
+
+def bincraft_changed_rows(now, columns, previous_keys=None):
+    # aircraft_update_key for every record at once: rows with a position whose
+    # message count or position time moved since previous_keys (empty for the
+    # first snapshot), and the keys to pass in with the next snapshot
+    addr = columns['hex'] | (columns['non_icao'].astype(np.uint32) << 24)
+    messages = columns['messages']
+    position_time = np.round(now - columns['seen_pos'], 1)
+    changed = np.isfinite(columns['lat']) & np.isfinite(columns['lon'])
+    if previous_keys and len(previous_keys[0]):
+        previous_addr, previous_messages, previous_time = previous_keys
+        order = np.argsort(previous_addr, kind='stable')
+        sorted_addr = previous_addr[order]
+        match = order[np.minimum(np.searchsorted(sorted_addr, addr), len(order) - 1)]
+        same_time = (previous_time[match] == position_time) | (np.isnan(previous_time[match]) & np.isnan(position_time))
+        changed &= ~((previous_addr[match] == addr) & (previous_messages[match] == messages) & same_time)
+    return np.flatnonzero(changed), (addr, messages, position_time)
+
+
+def _plane_column(values, valid, cast):
+    # One parse_aircraft field as a list, '-' where readsb left it invalid
+    out = np.where(valid, values, 0).astype(cast).astype(object)
+    out[~valid] = '-'
+    return out.tolist()
+
+
+def bincraft_planes(now, columns, rows):
+    # parse_aircraft's plane dicts for the given rows, built straight from the
+    # columns, with each fix's position time (now - seen_pos)
+    def pick(key):
+        return columns[key][rows]
+
+    def numeric(key, cast=float):
+        values = pick(key)
+        return _plane_column(values, np.isfinite(values), cast)
+
+    def text(values, valid):
+        return [value if ok else '-' for value, ok in zip(values, valid.tolist())]
+
+    hexes = pick('hex').tolist()
+    icaos = [('~%06X' if non_icao else '%06X') % value for value, non_icao in zip(hexes, pick('non_icao').tolist())]
+    callsigns = [value.decode('ascii', errors='ignore').strip() for value in pick('callsign').tolist()]
+    flights = text(callsigns, pick('callsign_valid') & np.array([bool(value) for value in callsigns], dtype=bool))
+    squawks = text(['%04x' % value for value in pick('squawk').tolist()], pick('squawk_valid'))
+    categories = pick('category')
+    category_names = text(['%02X' % value for value in categories.tolist()], categories != 0)
+    emergencies = pick('emergency')
+    emergency_names = text([EMERGENCY_NAMES[value & 0x07] for value in emergencies.tolist()], emergencies >= 0)
+    alt_baro = pick('alt_baro')
+    altitudes = _plane_column(np.where(np.isfinite(alt_baro), alt_baro, pick('alt_geom')), np.isfinite(alt_baro) | np.isfinite(pick('alt_geom')), np.int64)
+    signals = pick('signal').astype(np.float64)
+    rssi = np.round(10 * np.log10(signals * signals / 65025 + 1.125e-5), 1).tolist()
+    seen_pos = pick('seen_pos')
+
+    count = len(icaos)
+    values = [
+        icaos, flights, squawks, category_names, emergency_names, altitudes,
+        numeric('alt_geom', np.int64), numeric('baro_rate', np.int64), numeric('geom_rate', np.int64), numeric('gs'),
+        numeric('ias', np.int64), numeric('tas', np.int64), numeric('mach'), numeric('track'), numeric('track_rate'),
+        numeric('mag_heading'), numeric('true_heading'), numeric('nav_heading'), numeric('nav_altitude_fms', np.int64),
+        numeric('nav_altitude_mcp', np.int64), numeric('nav_qnh'), repeat('-', count), numeric('roll'),
+        numeric('oat', np.int64), numeric('tat', np.int64), numeric('wd', np.int64), numeric('ws', np.int64),
+        rssi, pick('seen').tolist(), _plane_column(seen_pos, np.isfinite(seen_pos), float), pick('messages').tolist(),
+        numeric('lat'), numeric('lon'),
+    ]
+    spotted_at = datetime.now().strftime('%H:%M:%S')
+    update_time = time.time()
+    constants = {field: '-' for field in _PLANE_ENRICHMENT_FIELDS}
+    constants['spotted_at'] = spotted_at
+    constants['last_update_time'] = update_time
+
+    planes = []
+    for row in zip(*values):
+        plane = dict(zip(_PLANE_FIELDS, row))
+        plane.update(constants)
+        planes.append(plane)
+    return planes, (now - seen_pos).tolist()
+
+
+def load_bincraft_columns(path):
+    return decode_bincraft(read_bincraft_file(path))
+
+
+def encode_bincraft(now, aircraft_list, stride=BINCRAFT_RECORD_DTYPE.itemsize):
+    # Inverse of decode_bincraft for aircraft.json-style dicts, used by the
+    # benchmarks and the synthetic/replay sources
+    records = np.zeros(len(aircraft_list), dtype=BINCRAFT_RECORD_DTYPE)
+    for i, aircraft in enumerate(aircraft_list):
+        record = records[i]
+        validity = [0, 0, 0, 0, 0]
+        hex_code = str(aircraft.get('hex', '0'))
+        record['addr'] = int(hex_code.lstrip('~'), 16) | (0x1000000 if hex_code.startswith('~') else 0)
+        record['messages'] = min(int(aircraft.get('messages', 0)), 0xFFFF)
+        record['seen'] = min(int(round(float(aircraft.get('seen', 0)) * 10)), 0xFFFF)
+
+        if aircraft.get('lat') is not None and aircraft.get('lon') is not None:
+            record['lat'] = int(round(float(aircraft['lat']) * 1e6))
+            record['lon'] = int(round(float(aircraft['lon']) * 1e6))
+            record['seen_pos'] = min(int(round(float(aircraft.get('seen_pos', 0)) * 10)), 0xFFFF)
+            validity[BINCRAFT_VALID_POSITION[0]] |= BINCRAFT_VALID_POSITION[1]
+
+        for field, key, scale, byte_index, mask in BINCRAFT_NUMERIC_FIELDS:
+            value = aircraft.get(key)
+            if isinstance(value, (int, float)):
+                record[field] = int(round(value / scale))
+                validity[byte_index] |= mask
+
+        flight = aircraft.get('flight')
+        if flight:
+            record['callsign'] = str(flight)[:8].encode('ascii', errors='ignore')
+            validity[BINCRAFT_VALID_CALLSIGN[0]] |= BINCRAFT_VALID_CALLSIGN[1]
+        squawk = aircraft.get('squawk')
+        if squawk:
+            record['squawk'] = int(str(squawk), 16)
+            validity[BINCRAFT_VALID_SQUAWK[0]] |= BINCRAFT_VALID_SQUAWK[1]
+        emergency = aircraft.get('emergency')
+        if emergency in EMERGENCY_NAMES:
+            record['emergency_addrtype'] = EMERGENCY_NAMES.index(emergency)
+            validity[BINCRAFT_VALID_EMERGENCY[0]] |= BINCRAFT_VALID_EMERGENCY[1]
+        category = aircraft.get('category')
+        if category:
+            record['category'] = int(str(category), 16)
+        rssi = aircraft.get('rssi')
+        if isinstance(rssi, (int, float)):
+            record['signal'] = max(0, min(255, int(round(math.sqrt(max(0.0, 10 ** (rssi / 10) - 1.125e-5) * 65025)))))
+        record['validity'] = validity
+
+    header = np.zeros(1, dtype=BINCRAFT_HEADER_DTYPE)
+    now_ms = int(round(now * 1000))
+    header['now_low'] = now_ms & 0xFFFFFFFF
+    header['now_high'] = now_ms >> 32
+    header['stride'] = stride
+    header['with_pos'] = sum(1 for a in aircraft_list if a.get('lat') is not None)
+
+    out = bytearray(stride * (len(aircraft_list) + 1))
+    out[:BINCRAFT_HEADER_DTYPE.itemsize] = header.tobytes()
+    raw = records.tobytes()
+    itemsize = BINCRAFT_RECORD_DTYPE.itemsize
+    for i in range(len(aircraft_list)):
+        start = stride * (i + 1)
+        out[start:start + itemsize] = raw[i * itemsize:(i + 1) * itemsize]
+    return bytes(out)
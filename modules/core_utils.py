@@ -97,3 +97,18 @@ def calculate_bearing(lat1, lon1, lat2, lon2):
 
 def clean_string(string):
     return re.sub(r"[\/\\.,:]", " ", string)
+
+
+_MANUFACTURER_NAMES = {
+    'Avions de Transport Regional': 'ATR',
+    'Honda Aircraft Company': 'Honda',
+    'The Boeing Company': 'Boeing',
+    'Airbus SAS': 'Airbus',
+    'Airbus Industrie': 'Airbus',
+}
+
+
+def clean_manufacturer(name):
+    # Registry manufacturer names shortened the way the radar shows them
+    manufacturer = clean_string(name)
+    return _MANUFACTURER_NAMES.get(manufacturer, manufacturer)
@@ -1,12 +1,21 @@
 import ast
 import csv
+import math
 import os
 import time
 from collections import Counter
 from datetime import datetime
 from time import localtime, strftime
 
+import numpy as np
+
 from .core_utils import calculate_distance, clean_string
+from .history_archive import archive_path, read_archive_frame
+from .history_db import SIGHTING_FIELDS, latest_history_day, load_day_positions, sightings_cache
+from .history_journal import (FLIGHT_HISTORY_FIELDS, flight_history_day_exists, flight_history_days, flight_history_row, history_csv_path,
+                              journal_days, load_flight_history_day, load_flight_history_points, parse_location_history, take_legacy_points)
+from .trajectory_points import decode_icao, merge_points_file, points_path, query_points, read_points, trail_array
+from .trajectory_store import trajectory_to_dict
 
 
 def parse_aircraft(aircraft):
@@ -125,18 +134,106 @@ def parse_aircraft(aircraft):
     }
 
 
+def readsb_file_signature(path):
+    stat_result = os.stat(path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def aircraft_update_key(aircraft, snapshot_now=None):
+    # readsb bumps 'messages' for every frame it decodes and resets 'seen_pos'
+    # on every new position, so an unchanged key means nothing new arrived
+    messages = aircraft.get('messages')
+    seen_pos = aircraft.get('seen_pos')
+    position_time = None
+    if seen_pos is not None and snapshot_now is not None:
+        try:
+            position_time = round(float(snapshot_now) - float(seen_pos), 1)
+        except (TypeError, ValueError):
+            position_time = None
+    if messages is None and position_time is None:
+        return None
+    return messages, position_time
+
+
+def aircraft_position_time(aircraft, snapshot_now=None):
+    # Epoch of the aircraft's last position fix: streaming decoders stamp it
+    # directly, readsb snapshots give it as 'now' minus 'seen_pos'
+    position_time = aircraft.get('last_position_time')
+    if position_time is not None:
+        return position_time
+    seen_pos = aircraft.get('seen_pos')
+    if seen_pos is None or snapshot_now is None:
+        return None
+    try:
+        return float(snapshot_now) - float(seen_pos)
+    except (TypeError, ValueError):
+        return None
+
+
 _STATS_NUMERIC_COLS = [
     "altitude", "alt_geom", "speed", "mach", "baro_rate", "geom_rate",
     "ias", "tas", "lat", "lon", "messages", "rssi", "roll", "oat", "tat",
 ]
+#Columns get_stats reads, the rest of an archive (or CSV) is never loaded
+_STATS_COLUMNS = set(_STATS_NUMERIC_COLS) | {
+    "icao", "flight", "first_seen", "last_seen", "owner", "manufacturer", "model", "category", "emergency", "registration",
+}
 
 
-def get_stats(home_lat=None, home_lon=None, flight_history_dir='./flight_history'):
+def load_stats_frame(flight_history_dir='./flight_history', history_db=None, day=None):
+    # One day's sightings as a DataFrame cleaned the way stats.py does, the
+    # columns get_stats uses only. day=None picks today, else the latest day
+    # with history. Returns (day, df), (None, None) when there is nothing.
     import pandas as pd
-    import glob as _glob
 
     today = datetime.today().strftime('%Y-%m-%d')
-    csv_path_today = os.path.join(flight_history_dir, f'{today}.csv')
+    if history_db:
+        #SQLite backend: only sightings whose last_seen moved since the previous call are fetched
+        day = day or latest_history_day(history_db, today)
+        if day is None:
+            return None, None
+        df = pd.DataFrame(sightings_cache.day_rows(history_db, day), columns=SIGHTING_FIELDS)
+    else:
+        if day is None and flight_history_day_exists(flight_history_dir, today):
+            day = today
+        elif day is None:
+            all_days = flight_history_days(flight_history_dir)
+            day = all_days[-1] if all_days else None
+        if day is None or not flight_history_day_exists(flight_history_dir, day):
+            return None, None
+        #Days with journal data not yet compacted are merged in memory, trails are not needed here
+        if day in journal_days(flight_history_dir):
+            rows = load_flight_history_day(flight_history_dir, day, with_history=False)
+            df = pd.DataFrame(list(rows.values()), columns=SIGHTING_FIELDS)
+        #Archived days: typed columns, only the ones used below
+        elif os.path.exists(archive_path(flight_history_dir, day)):
+            df = read_archive_frame(archive_path(flight_history_dir, day), _STATS_COLUMNS)
+        else:
+            df = pd.read_csv(history_csv_path(flight_history_dir, day), usecols=lambda col: col in _STATS_COLUMNS, low_memory=False)
+
+    # Coerce numeric columns exactly as stats.py does, archives are already typed
+    for col in _STATS_NUMERIC_COLS:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col].replace("-", pd.NA), errors="coerce")
+
+    # Parse timestamps exactly as stats.py does
+    for col in ("first_seen", "last_seen"):
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+    # Clean string columns exactly as stats.py does
+    for col in ("owner", "manufacturer", "model", "category", "emergency", "registration"):
+        if col in df.columns:
+            df[col] = df[col].replace(["-", "none", "None", ""], pd.NA)
+
+    # Deduplicate exactly as stats.py does
+    if "icao" in df.columns and "first_seen" in df.columns:
+        df = df.drop_duplicates(subset=["icao", "first_seen"])
+    return day, df
+
+
+def get_stats(home_lat=None, home_lon=None, flight_history_dir='./flight_history', history_db=None):
+    import pandas as pd
 
     default_stats = {
         'total': 0,
@@ -159,35 +256,10 @@ def get_stats(home_lat=None, home_lon=None, flight_history_dir='./flight_history
         'last_updated': strftime('%H:%M:%S', localtime()),
     }
 
-    if os.path.exists(csv_path_today):
-        csv_path = csv_path_today
-    else:
-        all_files = sorted(_glob.glob(os.path.join(flight_history_dir, '????-??-??.csv')))
-        if not all_files:
-            return default_stats
-        csv_path = all_files[-1]
-
     try:
-        df = pd.read_csv(csv_path, low_memory=False)
-
-        # Coerce numeric columns exactly as stats.py does
-        for col in _STATS_NUMERIC_COLS:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col].replace("-", pd.NA), errors="coerce")
-
-        # Parse timestamps exactly as stats.py does
-        for col in ("first_seen", "last_seen"):
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors="coerce")
-
-        # Clean string columns exactly as stats.py does
-        for col in ("owner", "manufacturer", "model", "category", "emergency", "registration"):
-            if col in df.columns:
-                df[col] = df[col].replace(["-", "none", "None", ""], pd.NA)
-
-        # Deduplicate exactly as stats.py does
-        if "icao" in df.columns and "first_seen" in df.columns:
-            df = df.drop_duplicates(subset=["icao", "first_seen"])
+        _, df = load_stats_frame(flight_history_dir, history_db)
+        if df is None:
+            return default_stats
 
         total = len(df)
 
@@ -252,17 +324,21 @@ def get_stats(home_lat=None, home_lon=None, flight_history_dir='./flight_history
         furthest = None
         furthest_plane = None
         if home_lat is not None and home_lon is not None and 'lat' in df.columns and 'lon' in df.columns:
-            valid = df[df['lat'].notna() & df['lon'].notna()]
+            lats = pd.to_numeric(df['lat'], errors='coerce').to_numpy(dtype=np.float64)
+            lons = pd.to_numeric(df['lon'], errors='coerce').to_numpy(dtype=np.float64)
+            #Haversine over the columns, then calculate_distance (rounded, first one wins) on the rows that can still be the furthest
+            dlat = np.radians(lats - float(home_lat)) / 2
+            dlon = np.radians(lons - float(home_lon)) / 2
+            a = np.sin(dlat) ** 2 + math.cos(math.radians(float(home_lat))) * np.cos(np.radians(lats)) * np.sin(dlon) ** 2
+            distances = 2 * 6371 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
             best = 0.0
             best_row = None
-            for _, row in valid.iterrows():
-                try:
-                    d = calculate_distance(float(home_lat), float(home_lon), row['lat'], row['lon'])
+            if np.isfinite(distances).any():
+                for index in np.flatnonzero(distances >= np.nanmax(distances) - 0.1):
+                    d = calculate_distance(float(home_lat), float(home_lon), lats[index], lons[index])
                     if d > best:
                         best = d
-                        best_row = row
-                except (ValueError, TypeError):
-                    pass
+                        best_row = df.iloc[index]
             if best > 0:
                 furthest = best
                 if best_row is not None:
@@ -349,51 +425,30 @@ def aggregate_directional_hits(history, sector_count, now=None, time_window_seco
     return totals
 
 
-def load_today_heatmap_hits(history_dir='./flight_history', now=None):
+def load_today_heatmap_hits(history_dir='./flight_history', now=None, history_db=None):
     now = now or time.time()
     today = datetime.fromtimestamp(now).strftime('%Y-%m-%d')
-    csv_path = os.path.join(history_dir, f'{today}.csv')
     heatmap_hits = []
 
-    if not os.path.exists(csv_path):
+    if history_db:
+        #Positions come straight off the ts index, already sorted
+        day_start = datetime.strptime(today, '%Y-%m-%d').timestamp()
+        try:
+            return [(timestamp, lat, lon) for timestamp, _icao, lat, lon in load_day_positions(history_db, day_start, day_start + 24 * 60 * 60)]
+        except Exception as e:
+            print(f"Heatmap history error: {e}")
+            return heatmap_hits
+
+    if not flight_history_day_exists(history_dir, today):
         return heatmap_hits
 
     try:
-        with open(csv_path, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                history_raw = row.get('location_history', '{}')
-                if not history_raw or history_raw == '{}':
-                    continue
-
-                try:
-                    location_history = ast.literal_eval(history_raw)
-                except (ValueError, SyntaxError, TypeError):
-                    continue
-
-                if not isinstance(location_history, dict):
-                    continue
-
-                for time_key, coords in location_history.items():
-                    if not isinstance(coords, (list, tuple)) or len(coords) < 2:
-                        continue
-
-                    try:
-                        key_text = str(time_key)
-                        if key_text.replace('.', '', 1).isdigit():
-                            sample_epoch = float(key_text)
-                        else:
-                            sample_time = datetime.strptime(key_text, '%H:%M:%S').time()
-                            sample_dt = datetime.combine(datetime.fromtimestamp(now).date(), sample_time)
-                            sample_epoch = sample_dt.timestamp()
-                        heatmap_hits.append((sample_epoch, float(coords[0]), float(coords[1])))
-                    except (ValueError, TypeError):
-                        continue
-    except (FileNotFoundError, PermissionError, OSError, csv.Error, UnicodeDecodeError):
+        points = load_flight_history_points(history_dir, today)
+    except (PermissionError, OSError, csv.Error, UnicodeDecodeError):
         return heatmap_hits
 
-    heatmap_hits.sort(key=lambda item: item[0])
-    return heatmap_hits
+    points = points[np.argsort(points['ts'], kind='stable')]
+    return [(timestamp, round(lat, 6), round(lon, 6)) for timestamp, lat, lon in zip(points['ts'].tolist(), points['lat'].tolist(), points['lon'].tolist())]
 
 
 def load_recent_heatmap_history(history_dir='./stats_history', history_seconds=24 * 60 * 60, now=None):
@@ -421,6 +476,12 @@ def load_recent_heatmap_history(history_dir='./stats_history', history_seconds=2
         if day_end < cutoff or day_start > now:
             continue
 
+        #Trails live in the day's points file, older CSVs still carry them in location_history
+        day_points = query_points(read_points(points_path(history_dir, file_stem)), start=cutoff)
+        day_points = day_points[day_points['ts'] <= now]
+        heatmap_history.extend(zip(day_points['ts'].tolist(), [decode_icao(code) for code in day_points['icao'].tolist()],
+                                   day_points['lat'].tolist(), day_points['lon'].tolist()))
+
         csv_path = os.path.join(history_dir, entry_name)
         try:
             with open(csv_path, 'r', newline='', encoding='utf-8') as file:
@@ -552,24 +613,13 @@ def persist_top_graph_sample(active_count_history, total_seen_history, active_co
     return bucket_time
 
 
-FLIGHT_HISTORY_FIELDS = [
-    'icao', 'flight', 'squawk', 'category', 'emergency',
-    'manufacturer', 'registration', 'model', 'owner', 'rating',
-    'altitude', 'alt_geom', 'baro_rate', 'geom_rate',
-    'speed', 'ias', 'tas', 'mach',
-    'track', 'track_rate', 'mag_heading', 'true_heading', 'nav_heading',
-    'nav_altitude_fms', 'nav_altitude_mcp', 'nav_qnh', 'nav_modes',
-    'roll', 'oat', 'tat', 'wd', 'ws',
-    'rssi', 'seen', 'seen_pos', 'messages',
-    'lat', 'lon',
-    'location_history',
-    'first_seen', 'last_seen',
-]
-
 FLIGHT_HISTORY_DIR = './flight_history'
 
 
 def save_flight_history(planes_dict, history_dir=FLIGHT_HISTORY_DIR, on_error=None):
+    # Full rewrite of the day's summary CSV with every plane's whole trail
+    # merged into the points file. The tracker appends to the journal instead
+    # (history_journal), this is kept for tools and as the reference output.
     if not planes_dict:
         return
 
@@ -594,67 +644,17 @@ def save_flight_history(planes_dict, history_dir=FLIGHT_HISTORY_DIR, on_error=No
                             if row.get('icao'):
                                 existing[row['icao']] = row
 
+                trails = [take_legacy_points(existing, today)]
                 for icao, plane in planes_dict.items():
-
-                    merged_history = {}
-                    if icao in existing:
-                        raw = existing[icao].get('location_history', '{}')
-                        if raw and raw != '{}':
-                            try:
-                                merged_history = ast.literal_eval(raw)
-                            except Exception:
-                                pass
-
-                    plane_history = plane.get('location_history', {})
-                    if isinstance(plane_history, dict):
-                        merged_history.update(plane_history)
-
+                    trails.append(trail_array(icao, plane.get('location_history')))
                     first_seen = existing.get(icao, {}).get('first_seen') or now_str
+                    existing[icao] = dict(
+                        flight_history_row(icao, plane),
+                        first_seen=first_seen,
+                        last_seen=now_str,
+                    )
 
-                    existing[icao] = {
-                        'icao': icao,
-                        'flight': plane.get('flight', '-'),
-                        'squawk': plane.get('squawk', '-'),
-                        'category': plane.get('category', '-'),
-                        'emergency': plane.get('emergency', '-'),
-                        'manufacturer': plane.get('manufacturer', '-'),
-                        'registration': plane.get('registration', '-'),
-                        'model': plane.get('model', '-'),
-                        'owner': plane.get('owner', '-'),
-                        'rating': plane.get('rating', '-'),
-                        'altitude': plane.get('altitude', '-'),
-                        'alt_geom': plane.get('alt_geom', '-'),
-                        'baro_rate': plane.get('baro_rate', '-'),
-                        'geom_rate': plane.get('geom_rate', '-'),
-                        'speed': plane.get('speed', '-'),
-                        'ias': plane.get('ias', '-'),
-                        'tas': plane.get('tas', '-'),
-                        'mach': plane.get('mach', '-'),
-                        'track': plane.get('track', '-'),
-                        'track_rate': plane.get('track_rate', '-'),
-                        'mag_heading': plane.get('mag_heading', '-'),
-                        'true_heading': plane.get('true_heading', '-'),
-                        'nav_heading': plane.get('nav_heading', '-'),
-                        'nav_altitude_fms': plane.get('nav_altitude_fms', '-'),
-                        'nav_altitude_mcp': plane.get('nav_altitude_mcp', '-'),
-                        'nav_qnh': plane.get('nav_qnh', '-'),
-                        'nav_modes': plane.get('nav_modes', '-'),
-                        'roll': plane.get('roll', '-'),
-                        'oat': plane.get('oat', '-'),
-                        'tat': plane.get('tat', '-'),
-                        'wd': plane.get('wd', '-'),
-                        'ws': plane.get('ws', '-'),
-                        'rssi': plane.get('rssi', '-'),
-                        'seen': plane.get('seen', '-'),
-                        'seen_pos': plane.get('seen_pos', '-'),
-                        'messages': plane.get('messages', '-'),
-                        'lat': plane.get('last_lat', plane.get('lat', '-')),
-                        'lon': plane.get('last_lon', plane.get('lon', '-')),
-                        'location_history': str(merged_history),
-                        'first_seen': first_seen,
-                        'last_seen': now_str,
-                    }
-
+                merge_points_file(points_path(history_dir, today), np.concatenate(trails))
                 with open(temp_path, 'w', newline='', encoding='utf-8') as f:
                     writer = csv.DictWriter(f, fieldnames=FLIGHT_HISTORY_FIELDS, extrasaction='ignore')
                     writer.writeheader()
@@ -675,79 +675,81 @@ def save_flight_history(planes_dict, history_dir=FLIGHT_HISTORY_DIR, on_error=No
                 pass
 
 
-def save_plane_to_csv(icao, plane_data):
-    try:
-        manufacturer = plane_data.get('manufacturer', '-')
-        model = plane_data.get('model', '-')
-        owner = plane_data.get('owner', '-')
-        registration = plane_data.get('registration', '-')
+STATS_CSV_PATH = os.path.join('./stats_history', 'stats.csv')
+STATS_CSV_FIELDS = ['icao', 'manufacturer', 'model', 'full_model', 'airline', 'location_history', 'altitude', 'timestamp']
 
-        if manufacturer == '-' or model == '-' or owner == '-' or registration == '-':
-            return
 
-        stats_dir = './stats_history'
-        csv_path = os.path.join(stats_dir, 'stats.csv')
-        os.makedirs(stats_dir, exist_ok=True)
+def stats_csv_ready(plane_data):
+    # Whether the plane is enriched enough for stats.csv: manufacturer, model,
+    # owner and registration all known
+    return all(plane_data.get(field, '-') != '-' for field in ('manufacturer', 'model', 'owner', 'registration'))
 
-        lock_path = csv_path + '.lock'
-        with open(lock_path, 'w') as lock_file:
-            import fcntl
-            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
 
-            try:
-                existing_planes = {}
-                if os.path.exists(csv_path):
-                    with open(csv_path, 'r', newline='', encoding='utf-8') as file:
-                        reader = csv.DictReader(file)
-                        for row in reader:
-                            if row.get('icao'):
-                                existing_planes[row['icao']] = row
+def stats_csv_row(icao, plane_data):
+    # The stats.csv row for an enriched plane, None until stats_csv_ready
+    if not stats_csv_ready(plane_data):
+        return None
+    manufacturer = plane_data['manufacturer']
+    model = plane_data['model']
+    owner = plane_data['owner']
 
-                full_model = f"{manufacturer} {model}".strip()
-                location_history = {}
-                if icao in existing_planes:
-                    existing_history = existing_planes[icao].get('location_history', '{}')
-                    if existing_history and existing_history != '{}':
-                        try:
-                            location_history = ast.literal_eval(existing_history)
-                        except Exception:
-                            pass
-
-                plane_history = plane_data.get('location_history', {})
-                if isinstance(plane_history, dict) and plane_history:
-                    location_history.update(plane_history)
-                elif plane_data['lat'] != '-' and plane_data['lon'] != '-':
-                    history_key = str(plane_data.get('history_timestamp', plane_data.get('spotted_at', time.time())))
-                    location_history[history_key] = [plane_data['lat'], plane_data['lon']]
-
-                row_data = {
-                    'icao': icao,
-                    'manufacturer': manufacturer,
-                    'model': model,
-                    'full_model': full_model,
-                    'airline': owner.strip(),
-                    'location_history': str(location_history),
-                    'altitude': plane_data.get('altitude'),
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                }
-
-                existing_planes[icao] = row_data
-                temp_path = csv_path + '.tmp'
-                with open(temp_path, 'w', newline='', encoding='utf-8') as file:
-                    fieldnames = ['icao', 'manufacturer', 'model', 'full_model', 'airline', 'location_history', 'altitude', 'timestamp']
-                    writer = csv.DictWriter(file, fieldnames=fieldnames)
-                    writer.writeheader()
-                    for plane in existing_planes.values():
-                        writer.writerow(plane)
+    location_history = trajectory_to_dict(plane_data.get('location_history'))
+    if not location_history and plane_data.get('lat', '-') != '-' and plane_data.get('lon', '-') != '-':
+        history_key = str(plane_data.get('history_timestamp', plane_data.get('spotted_at', time.time())))
+        location_history[history_key] = [plane_data['lat'], plane_data['lon']]
 
-                os.replace(temp_path, csv_path)
-            finally:
-                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    return {
+        'icao': icao,
+        'manufacturer': manufacturer,
+        'model': model,
+        'full_model': f"{manufacturer} {model}".strip(),
+        'airline': owner.strip(),
+        'location_history': location_history,
+        'altitude': plane_data.get('altitude'),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def write_stats_csv(rows, csv_path=STATS_CSV_PATH):
+    # Folds {icao: row} into stats.csv with one rewrite (temp file + rename)
+    # under the file's lock. Each row's location_history is merged into the
+    # trail already in the file, only the rows being written are parsed.
+    import fcntl
+
+    os.makedirs(os.path.dirname(csv_path) or '.', exist_ok=True)
+    temp_path = csv_path + '.tmp'
+    with open(csv_path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            existing_planes = {}
+            if os.path.exists(csv_path):
+                csv.field_size_limit(10 * 1024 * 1024)
+                with open(csv_path, 'r', newline='', encoding='utf-8') as file:
+                    for row in csv.DictReader(file):
+                        if row.get('icao'):
+                            existing_planes[row['icao']] = row
+
+            for icao, row in rows.items():
+                location_history = parse_location_history(existing_planes.get(icao, {}).get('location_history'))
+                location_history.update(row.get('location_history') or {})
+                existing_planes[icao] = dict(row, location_history=str(location_history))
+            with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=STATS_CSV_FIELDS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(existing_planes.values())
+            os.replace(temp_path, csv_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    return len(rows)
+
+
+def save_plane_to_csv(icao, plane_data):
+    # One plane straight into stats.csv, the tracker batches them with StatsCsvWriter
+    try:
+        row = stats_csv_row(icao, plane_data)
+        if row is not None:
+            write_stats_csv({icao: row})
     except Exception as e:
         print(f"CSV error: {e}")
-        temp_path = csv_path + '.tmp' if 'csv_path' in locals() else None
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
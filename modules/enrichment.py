@@ -0,0 +1,163 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Aircraft lookups (hexdb) for unidentified planes run on a fixed pool of
+# worker threads instead of one new thread per plane. Planes wait in a
+# priority queue, lowest priority first, and an icao is only ever queued or
+# in flight once: submitting it again can only raise its priority. Each
+# request takes a token from a shared bucket first, so a burst of new
+# aircraft is spread out at the allowed rate. At most max_pending planes
+# wait, past that submit refuses and the plane is offered again later.
+
+
+class TokenBucket:
+    # rate tokens per second, up to capacity saved up for bursts
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        # 0 when a token was taken, else the seconds until the next one
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class EnrichmentService:
+    # handler(icao) does one lookup and stores the result, wanted(icao) is
+    # asked again when a plane reaches the front of the queue so planes that
+    # left or were identified meanwhile don't use up a request
+    def __init__(self, handler, workers=4, rate=3.0, burst=10, max_pending=500, wanted=None, registry=None):
+        self.handler = handler
+        self.wanted = wanted
+        self.workers = workers
+        self.max_pending = max_pending
+        self.registry = registry
+        self.bucket = TokenBucket(rate, burst)
+        #Heap of (priority, sequence, icao), entries whose priority was raised since are skipped
+        self.queue = []
+        self.priorities = {}
+        self.queued_at = {}
+        self.in_flight = set()
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+        self.threads = []
+
+    def _inc(self, name, value=1):
+        if self.registry is not None:
+            self.registry.inc(name, value)
+
+    def __contains__(self, icao):
+        with self.condition:
+            return icao in self.priorities or icao in self.in_flight
+
+    def __len__(self):
+        # Queued plus in flight
+        with self.condition:
+            return len(self.priorities) + len(self.in_flight)
+
+    def submit(self, icao, priority=0):
+        # False when the queue is full, a plane already queued keeps the more urgent priority
+        with self.condition:
+            if icao in self.in_flight:
+                return True
+            queued = self.priorities.get(icao)
+            if queued is not None:
+                if priority < queued:
+                    self.priorities[icao] = priority
+                    heapq.heappush(self.queue, (priority, next(self.sequence), icao))
+                    self._compact()
+                self._inc('enrichment_coalesced')
+                return True
+            if len(self.priorities) >= self.max_pending:
+                self._inc('enrichment_dropped')
+                return False
+            self.priorities[icao] = priority
+            self.queued_at[icao] = time.perf_counter()
+            heapq.heappush(self.queue, (priority, next(self.sequence), icao))
+            self.condition.notify()
+        self._inc('enrichment_submitted')
+        return True
+
+    def _compact(self):
+        #Planes closing in get re-submitted every snapshot, drop the superseded entries before they pile up
+        if len(self.queue) > 2 * len(self.priorities) + 64:
+            self.queue = [item for item in self.queue if self.priorities.get(item[2]) == item[0]]
+            heapq.heapify(self.queue)
+
+    def _next(self):
+        # The most urgent queued icao, None once closed
+        with self.condition:
+            while self.running:
+                while self.queue:
+                    priority, _, icao = heapq.heappop(self.queue)
+                    if self.priorities.get(icao) == priority:
+                        del self.priorities[icao]
+                        self.in_flight.add(icao)
+                        if self.registry is not None:
+                            self.registry.observe('enrichment_wait_ms', (time.perf_counter() - self.queued_at.pop(icao)) * 1000)
+                        else:
+                            self.queued_at.pop(icao, None)
+                        return icao
+                self.condition.wait()
+            return None
+
+    def _take_token(self):
+        # Waits for the rate limit, False if closed meanwhile
+        while True:
+            wait = self.bucket.take()
+            if not wait:
+                return True
+            self._inc('enrichment_throttled')
+            with self.condition:
+                if self.condition.wait_for(lambda: not self.running, wait):
+                    return False
+
+    def run(self):
+        while True:
+            icao = self._next()
+            if icao is None:
+                return
+            try:
+                if self.wanted is not None and not self.wanted(icao):
+                    self._inc('enrichment_skipped')
+                elif self._take_token():
+                    self._inc('enrichment_requests')
+                    self.handler(icao)
+            except Exception as e:
+                print(f"Enrichment error: {icao}: {e}")
+                self._inc('enrichment_errors')
+            finally:
+                with self.condition:
+                    self.in_flight.discard(icao)
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self.run, name=f'enrichment-{n}', daemon=True) for n in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def close(self, timeout=5.0):
+        # Stops the workers, queued planes are dropped and lookups in flight given timeout seconds
+        with self.condition:
+            self.running = False
+            self.queue.clear()
+            self.priorities.clear()
+            self.queued_at.clear()
+            self.condition.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self.threads = []
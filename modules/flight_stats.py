@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from time import localtime, strftime
+
+from .core_utils import calculate_distance, clean_string
+from .data_utils import load_stats_frame
+
+# Today's get_stats figures kept up to date as aircraft are seen and enriched,
+# instead of re-reading the day file every minute. Each aircraft of the day
+# has one row (its latest owner, manufacturer, model, emergency, altitude,
+# speed and mach, as in the day's CSV). An update takes the old row out of
+# the sums and adds the new one; the counters are only touched when owner,
+# manufacturer, model or emergency changed. Highest, fastest and furthest
+# only grow during the day. A new day starts empty; history is read once at
+# startup by load_history(), where aircraft already seen live keep their row.
+
+_MISSING = ('-', 'none', 'None', '')
+_TOP_FIELDS = ('model', 'manufacturer', 'owner')
+_AVERAGED = ('altitude', 'speed', 'mach')
+
+
+def _text(value):
+    if isinstance(value, str) and value not in _MISSING:
+        return value
+    return None
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number else None
+
+
+def _stats_row(plane):
+    return (_text(plane.get('owner')), _text(plane.get('manufacturer')), _text(plane.get('model')), _text(plane.get('emergency')),
+            _number(plane.get('altitude')), _number(plane.get('speed')), _number(plane.get('mach')))
+
+
+class FlightStatsAggregate:
+    def __init__(self, home_lat=None, home_lon=None):
+        self.home = (float(home_lat), float(home_lon)) if home_lat is not None and home_lon is not None else None
+        self.lock = threading.Lock()
+        self._reset(time.time())
+
+    def _reset(self, now):
+        day_start = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.day = day_start.strftime('%Y-%m-%d')
+        self.day_end = (day_start + timedelta(days=1)).timestamp()
+        self.rows = {}
+        self.counts = {field: Counter() for field in _TOP_FIELDS}
+        self.tops = {field: (None, 0) for field in _TOP_FIELDS}
+        #First manufacturer seen with each model, for the top aircraft
+        self.model_manufacturer = {}
+        self.sums = {field: [0.0, 0] for field in _AVERAGED}
+        self.emergencies = 0
+        self.highest = None
+        self.max_speed = None
+        self.furthest = None
+        self.furthest_plane = None
+        self.snapshot = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def update(self, icao, plane, now=None):
+        # plane is a tracked plane dict or a day-file row
+        row = _stats_row(plane)
+        lat = _number(plane.get('last_lat', plane.get('lat')))
+        lon = _number(plane.get('last_lon', plane.get('lon')))
+        with self.lock:
+            if (now or time.time()) >= self.day_end:
+                self._reset(now or time.time())
+            self._apply(icao, row, _text(plane.get('flight')), lat, lon)
+
+    def _apply(self, icao, row, flight, lat, lon):
+        previous = self.rows.get(icao)
+        if previous != row:
+            #Most updates only move altitude or speed, the counters are left alone unless the identity changed
+            if previous is None or previous[:4] != row[:4]:
+                if previous is not None:
+                    self._count(previous, -1)
+                self._count(row, 1)
+            if previous is None or previous[4:] != row[4:]:
+                if previous is not None:
+                    self._sum(previous, -1)
+                self._sum(row, 1)
+            self.rows[icao] = row
+            self.snapshot = None
+        owner, _, model, _, altitude, speed, _ = row
+        if altitude is not None and (self.highest is None or altitude > self.highest):
+            self.highest = altitude
+            self.snapshot = None
+        if speed is not None and (self.max_speed is None or speed > self.max_speed):
+            self.max_speed = speed
+            self.snapshot = None
+        if self.home is not None and lat is not None and lon is not None:
+            distance = calculate_distance(self.home[0], self.home[1], lat, lon)
+            if distance > (self.furthest or 0):
+                self.furthest = distance
+                self.furthest_plane = {'icao': icao, 'flight': flight or '-', 'model': model or '-', 'airline': owner or '-', 'distance_km': round(distance, 2)}
+                self.snapshot = None
+
+    def _count(self, row, sign):
+        owner, manufacturer, model, emergency = row[:4]
+        for field, value in zip(_TOP_FIELDS, (model, manufacturer, owner)):
+            if value is not None:
+                self._bump(field, value, sign)
+        if sign > 0 and model is not None and manufacturer is not None:
+            self.model_manufacturer.setdefault(model, manufacturer)
+        if emergency is not None:
+            self.emergencies += sign
+
+    def _sum(self, row, sign):
+        for field, value in zip(_AVERAGED, row[4:]):
+            if value is not None:
+                total = self.sums[field]
+                total[0] += sign * value
+                total[1] += sign
+
+    def _bump(self, field, value, sign):
+        counts = self.counts[field]
+        count = counts[value] + sign
+        if count:
+            counts[value] = count
+        else:
+            del counts[value]
+        top, top_count = self.tops[field]
+        if sign > 0 and count > top_count:
+            self.tops[field] = (value, count)
+        elif sign < 0 and value == top:
+            #Only when the leader loses a row (an aircraft re-identified), find the new one
+            self.tops[field] = max(counts.items(), key=lambda item: item[1]) if counts else (None, 0)
+
+    def _average(self, field):
+        total, count = self.sums[field]
+        return total / count if count else None
+
+    def stats(self):
+        # get_stats' dict for today, rebuilt only after something changed. Shared, don't modify it.
+        with self.lock:
+            if time.time() >= self.day_end:
+                self._reset(time.time())
+            if self.snapshot is None:
+                model, model_count = self.tops['model']
+                manufacturer = self.model_manufacturer.get(model)
+                altitude, speed, mach = (self._average(field) for field in _AVERAGED)
+                self.snapshot = {
+                    'total': len(self.rows),
+                    'top_model': {'name': model, 'count': model_count},
+                    'top_manufacturer': dict(zip(('name', 'count'), self.tops['manufacturer'])),
+                    'top_aircraft': {'name': f"{manufacturer} {model}", 'count': model_count} if manufacturer else {'name': None, 'count': 0},
+                    'top_airline': dict(zip(('name', 'count'), self.tops['owner'])),
+                    'manufacturer_breakdown': {clean_string(name): count for name, count in self.counts['manufacturer'].most_common()},
+                    'furthest_detected': self.furthest,
+                    'furthest_plane': dict(self.furthest_plane) if self.furthest_plane else None,
+                    'highest_detected': int(self.highest) if self.highest is not None else None,
+                    'unique_airlines': len(self.counts['owner']),
+                    'unique_models': len(self.counts['model']),
+                    'unique_manufacturers': len(self.counts['manufacturer']),
+                    'emergencies_count': self.emergencies,
+                    'avg_altitude': int(round(altitude)) if altitude is not None else None,
+                    'avg_speed': int(round(speed)) if speed is not None else None,
+                    'max_speed': int(round(self.max_speed)) if self.max_speed is not None else None,
+                    'avg_mach': round(mach, 3) if mach is not None else None,
+                    'last_updated': strftime('%H:%M:%S', localtime()),
+                }
+            return self.snapshot
+
+    def load_history(self, flight_history_dir='./flight_history', history_db=None):
+        # Folds today's history in, rows of aircraft already updated live are
+        # skipped. Returns how many were added.
+        day, df = load_stats_frame(flight_history_dir, history_db, self.day)
+        if df is None:
+            return 0
+        added = 0
+        with self.lock:
+            if day != self.day:
+                return 0
+            for plane in df.to_dict('records'):
+                icao = plane.get('icao')
+                if not isinstance(icao, str) or icao in self.rows:
+                    continue
+                self._apply(icao, _stats_row(plane), _text(plane.get('flight')), _number(plane.get('lat')), _number(plane.get('lon')))
+                added += 1
+        return added
@@ -0,0 +1,92 @@
+import csv
+import json
+import os
+import time
+
+from .metrics import percentile
+
+FRAME_SECTIONS = ['input', 'map', 'heatmap', 'planes', 'trajectories', 'graphs', 'sidebar', 'logs', 'overlay', 'present']
+
+
+class FrameTimer:
+    # Splits each frame into named sections. mark(section) charges the time
+    # since the previous mark to that section, so marks can be interleaved
+    # inside loops (e.g. planes/trajectories per plane). Does nothing when
+    # disabled so the render loop can call it unconditionally. Rows are only
+    # kept in self.frames when keep_frames is set.
+    def __init__(self, enabled=True, keep_frames=True, sections=FRAME_SECTIONS):
+        self.enabled = enabled
+        self.keep_frames = keep_frames
+        self.sections = list(sections)
+        self.frames = []
+        self.frame_count = 0
+        self._frame = None
+        self._frame_started = 0.0
+        self._last_mark = 0.0
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._frame = dict.fromkeys(self.sections, 0.0)
+        self._frame_started = now
+        self._last_mark = now
+
+    def mark(self, section):
+        if self._frame is None:
+            return
+        now = time.perf_counter()
+        self._frame[section] = self._frame.get(section, 0.0) + (now - self._last_mark) * 1000
+        self._last_mark = now
+
+    def end_frame(self, **extra):
+        # Closes the frame, any time since the last mark is left unassigned
+        # and only shows up in total_ms
+        if self._frame is None:
+            return None
+        row = {'frame': self.frame_count, 'total_ms': round((time.perf_counter() - self._frame_started) * 1000, 3)}
+        row.update((section, round(ms, 3)) for section, ms in self._frame.items())
+        row.update(extra)
+        if self.keep_frames:
+            self.frames.append(row)
+        self.frame_count += 1
+        self._frame = None
+        return row
+
+    def summary(self, skip=0):
+        # mean/p50/p95/max per section, skipping the first `skip` warm-up frames
+        frames = self.frames[skip:]
+        result = {}
+        for column in ['total_ms'] + self.sections:
+            values = sorted(frame.get(column, 0.0) for frame in frames)
+            if not values:
+                continue
+            result[column] = {
+                'mean': round(sum(values) / len(values), 3),
+                'p50': round(percentile(values, 0.50), 3),
+                'p95': round(percentile(values, 0.95), 3),
+                'max': round(values[-1], 3),
+            }
+        return result
+
+    def write(self, path, skip=0):
+        # CSV (one row per frame) for .csv paths, otherwise JSON with the frames and a summary
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if path.lower().endswith('.csv'):
+            columns = []
+            for frame in self.frames:
+                columns.extend(key for key in frame if key not in columns)
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.frames)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'warmup_frames': skip, 'summary': self.summary(skip), 'frames': self.frames}, f, indent=2)
+
+    def format_summary(self, skip=0):
+        lines = [f"{'section':<14} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for column, stats in self.summary(skip).items():
+            lines.append(f"{column:<14} {stats['mean']:>9.3f} {stats['p50']:>9.3f} {stats['p95']:>9.3f} {stats['max']:>9.3f}")
+        return '\n'.join(lines)
@@ -0,0 +1,183 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Finished days can be archived as YYYY-MM-DD.npz next to the daily CSV: a
+# compressed numpy archive with one member per column, so readers only load
+# the columns they ask for. Numeric columns are float64 with NaN for missing
+# ('-') values, first_seen/last_seen are datetime64[s] and every other column
+# is dictionary encoded (int32 codes into a sorted value table, -1 missing).
+#
+#   __columns__         column names in CSV order
+#   <column>.f8         numeric values
+#   <column>.dt         timestamps
+#   <column>.codes      dictionary codes
+#   <column>.values     dictionary values
+
+ARCHIVE_NUMERIC_FIELDS = {
+    'rating', 'altitude', 'alt_geom', 'baro_rate', 'geom_rate',
+    'speed', 'ias', 'tas', 'mach',
+    'track', 'track_rate', 'mag_heading', 'true_heading', 'nav_heading',
+    'nav_altitude_fms', 'nav_altitude_mcp', 'nav_qnh',
+    'roll', 'oat', 'tat', 'wd', 'ws',
+    'rssi', 'seen', 'seen_pos', 'messages',
+    'lat', 'lon',
+}
+ARCHIVE_TIME_FIELDS = {'first_seen', 'last_seen'}
+_MISSING = (None, '', '-')
+
+
+def archive_path(history_dir, day):
+    return os.path.join(history_dir, f'{day}.npz')
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _timestamp(value):
+    try:
+        return np.datetime64(str(value).replace(' ', 'T'), 's')
+    except ValueError:
+        return np.datetime64('NaT', 's')
+
+
+def _dictionary(values):
+    lookup = {}
+    for value in values:
+        if value not in _MISSING:
+            lookup.setdefault(str(value), None)
+    dictionary = np.array(sorted(lookup), dtype=str)
+    positions = {value: code for code, value in enumerate(dictionary.tolist())}
+    codes = np.fromiter((-1 if value in _MISSING else positions[str(value)] for value in values), dtype=np.int32, count=len(values))
+    return codes, dictionary
+
+
+def write_archive(path, rows, fieldnames):
+    # rows are dicts as the CSV reader returns them, written via temp file + rename
+    arrays = {'__columns__': np.array(fieldnames, dtype=str)}
+    for name in fieldnames:
+        values = [row.get(name) for row in rows]
+        if name in ARCHIVE_NUMERIC_FIELDS:
+            arrays[f'{name}.f8'] = np.array([_number(value) for value in values], dtype=np.float64)
+        elif name in ARCHIVE_TIME_FIELDS:
+            arrays[f'{name}.dt'] = np.array([_timestamp(value) for value in values], dtype='datetime64[s]')
+        else:
+            arrays[f'{name}.codes'], arrays[f'{name}.values'] = _dictionary(values)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(rows)
+
+
+def _column(archive, name):
+    if f'{name}.f8' in archive.files:
+        return archive[f'{name}.f8']
+    if f'{name}.dt' in archive.files:
+        return archive[f'{name}.dt']
+    #Code -1 picks the '-' appended to the dictionary, the CSV's missing marker
+    dictionary = np.append(archive[f'{name}.values'].astype(object), '-')
+    return dictionary[archive[f'{name}.codes']]
+
+
+def read_archive(path, columns=None):
+    # {column: array} in archive order, only the requested columns are read.
+    # Strings come back as object arrays with '-' for missing values.
+    with np.load(path, allow_pickle=False) as archive:
+        names = archive['__columns__'].tolist()
+        if columns is not None:
+            wanted = set(columns)
+            names = [name for name in names if name in wanted]
+        return {name: _column(archive, name) for name in names}
+
+
+def read_archive_frame(path, columns=None):
+    import pandas as pd
+    return pd.DataFrame(read_archive(path, columns), copy=False)
+
+
+def archive_value_counts(path, column):
+    # {value: rows} for a dictionary encoded column, straight from the codes
+    with np.load(path, allow_pickle=False) as archive:
+        codes = archive[f'{column}.codes']
+        dictionary = archive[f'{column}.values'].tolist()
+    counts = np.bincount(codes[codes >= 0], minlength=len(dictionary))
+    return {value: int(count) for value, count in zip(dictionary, counts.tolist()) if count}
+
+
+def _text(value):
+    if value is None:
+        return '-'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, float):
+        if np.isnan(value):
+            return '-'
+        return str(int(value)) if value.is_integer() else repr(value)
+    return value
+
+
+def _csv_value(name, value):
+    # A CSV value as the archive would hold it, None for missing. A value the
+    # column's type can't hold is returned as is, so it never matches.
+    if value in _MISSING:
+        return None
+    if name in ARCHIVE_NUMERIC_FIELDS:
+        number = _number(value)
+        return value if np.isnan(number) else number
+    if name in ARCHIVE_TIME_FIELDS:
+        timestamp = _timestamp(value)
+        return value if np.isnat(timestamp) else timestamp
+    return str(value)
+
+
+def _archive_value(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.datetime64) and np.isnat(value):
+        return None
+    if isinstance(value, str) and value in _MISSING:
+        return None
+    return value
+
+
+def archive_mismatch(path, rows, fieldnames):
+    # Checks the archive holds every value of rows (as written by
+    # write_archive), column by column after normalising both sides. Returns
+    # the first difference as text, or None when nothing was lost.
+    columns = read_archive(path)
+    if list(columns) != list(fieldnames):
+        return f'columns {list(columns)} instead of {list(fieldnames)}'
+    rows = list(rows)
+    for name, values in columns.items():
+        if len(values) != len(rows):
+            return f'{len(values)} rows instead of {len(rows)}'
+        #datetime64 columns stay numpy scalars so NaT is recognisable
+        values = list(values) if values.dtype.kind in 'OM' else values.tolist()
+        for row, value in zip(rows, values):
+            expected = _csv_value(name, row.get(name))
+            if _archive_value(value) != expected:
+                return f'{row.get("icao")} {name}: {row.get(name)!r} became {value!r}'
+    return None
+
+
+def archive_rows(path):
+    # {icao: row} with CSV-style string values, for readers that work on rows
+    columns = read_archive(path)
+    names = list(columns)
+    lists = [columns[name].tolist() if columns[name].dtype != object else list(columns[name]) for name in names]
+    rows = {}
+    for values in zip(*lists):
+        row = {name: _text(value) for name, value in zip(names, values)}
+        if row.get('icao') not in _MISSING:
+            rows[row['icao']] = row
+    return rows
@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .history_journal import FLIGHT_HISTORY_FIELDS, FlightHistoryJournal, parse_location_history
+from .trajectory_points import history_points
+
+# Optional SQLite (WAL) backend for flight history, selected with
+# historyBackend: sqlite. One sightings row per aircraft per day keyed by
+# (icao, first_seen) holds the same summary columns as the daily CSV; trail
+# points live in positions keyed by (icao, ts). The tracker writes one
+# transaction per flush, readers use their own connections and are never
+# blocked by it.
+
+HISTORY_DB_FILENAME = 'history.db'
+SIGHTING_FIELDS = list(FLIGHT_HISTORY_FIELDS)
+_SIGHTING_COLUMNS = set(SIGHTING_FIELDS)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sightings (
+    {', '.join(SIGHTING_FIELDS)}, day TEXT NOT NULL,
+    PRIMARY KEY (icao, first_seen)
+);
+CREATE INDEX IF NOT EXISTS sightings_icao ON sightings (icao);
+CREATE INDEX IF NOT EXISTS sightings_day_last_seen ON sightings (day, last_seen);
+CREATE INDEX IF NOT EXISTS sightings_last_seen ON sightings (last_seen);
+CREATE INDEX IF NOT EXISTS sightings_model ON sightings (model);
+CREATE INDEX IF NOT EXISTS sightings_owner ON sightings (owner);
+CREATE TABLE IF NOT EXISTS positions (
+    icao TEXT NOT NULL, ts REAL NOT NULL, lat REAL, lon REAL,
+    PRIMARY KEY (icao, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS positions_ts ON positions (ts);
+CREATE TABLE IF NOT EXISTS aircraft (
+    icao TEXT PRIMARY KEY, manufacturer, model, full_model, airline, altitude, timestamp
+);
+"""
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def history_db_path(history_dir):
+    return os.path.join(history_dir, HISTORY_DB_FILENAME)
+
+
+def connect_history_db(db_path, readonly=False):
+    # WAL lets the stats workers read while the tracker writes; NORMAL sync
+    # only risks the last transaction on power loss, never corruption
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=10)
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    with _schema_lock:
+        if db_path not in _schema_ready:
+            conn.executescript(_SCHEMA)
+            _schema_ready.add(db_path)
+    return conn
+
+
+def _day_bounds(day):
+    start = datetime.strptime(day, '%Y-%m-%d').timestamp()
+    return start, start + 24 * 60 * 60
+
+
+def upsert_sightings(conn, day, records, first_seen):
+    # Folds journal-style records ({'icao', 't', 'f', 'u' or 'p'}) into the tables.
+    # first_seen maps icao -> the day's sighting key and is filled in for new
+    # aircraft. Records are grouped by their changed columns so each group is
+    # one executemany. Call inside a transaction.
+    groups = {}
+    positions = []
+    for record in records:
+        icao = record['icao']
+        seen_at = record['t']
+        key = first_seen.setdefault(icao, seen_at)
+        fields = {name: value for name, value in (record.get('f') or {}).items() if name in _SIGHTING_COLUMNS and name not in ('icao', 'first_seen', 'last_seen')}
+        columns = tuple(sorted(fields))
+        groups.setdefault(columns, []).append((icao, key, seen_at, day) + tuple(fields[column] for column in columns))
+        positions.extend((icao, timestamp, lat, lon) for timestamp, lat, lon in record.get('p') or ())
+        positions.extend((icao, timestamp / 1e6, lat / 1e6, lon / 1e6) for timestamp, lat, lon in record.get('u') or ())
+
+    for columns, rows in groups.items():
+        names = ('icao', 'first_seen', 'last_seen', 'day') + columns
+        updates = ', '.join(f"{name} = excluded.{name}" for name in ('last_seen',) + columns)
+        conn.executemany(
+            f"INSERT INTO sightings ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT (icao, first_seen) DO UPDATE SET {updates}",
+            rows,
+        )
+    conn.executemany('INSERT OR IGNORE INTO positions (icao, ts, lat, lon) VALUES (?, ?, ?, ?)', positions)
+    return len(records)
+
+
+class HistoryDatabase(FlightHistoryJournal):
+    # Tracker-side writer with the journal's change tracking, each flush is
+    # one batched upsert transaction instead of a file append. The connection
+    # belongs to the thread that first writes.
+    def __init__(self, db_path):
+        super().__init__(os.path.dirname(os.path.abspath(db_path)))
+        self.db_path = db_path
+        self.conn = None
+        self.first_seen_day = None
+        self.first_seen = {}
+
+    def write(self, day, records):
+        if not records:
+            return 0
+        if self.conn is None:
+            self.conn = connect_history_db(self.db_path)
+        if day != self.first_seen_day:
+            #Aircraft already seen today (e.g. before a restart) keep their sighting row
+            self.first_seen = dict(self.conn.execute('SELECT icao, MIN(first_seen) FROM sightings WHERE day = ? GROUP BY icao', (day,)))
+            self.first_seen_day = day
+        with self.conn:
+            return upsert_sightings(self.conn, day, records, self.first_seen)
+
+    def take_finished_day(self):
+        # Nothing to seal or compact, the finished day is already in the database
+        self.finished_day = None
+        return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def save_plane_to_db(db_path, icao, plane_data):
+    # SQLite counterpart of save_plane_to_csv: one upsert into aircraft, the
+    # trail is already in positions
+    manufacturer = plane_data.get('manufacturer', '-')
+    model = plane_data.get('model', '-')
+    owner = plane_data.get('owner', '-')
+    registration = plane_data.get('registration', '-')
+    if manufacturer == '-' or model == '-' or owner == '-' or registration == '-':
+        return
+    try:
+        conn = connect_history_db(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO aircraft (icao, manufacturer, model, full_model, airline, altitude, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (icao, manufacturer, model, f"{manufacturer} {model}".strip(), owner.strip(), plane_data.get('altitude'), datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Aircraft DB error: {e}")
+
+
+def history_db_days(db_path):
+    if not os.path.exists(db_path):
+        return []
+    conn = connect_history_db(db_path, readonly=True)
+    try:
+        return [day for (day,) in conn.execute('SELECT DISTINCT day FROM sightings ORDER BY day')]
+    finally:
+        conn.close()
+
+
+def load_day_positions(db_path, start, end, conn=None):
+    # (epoch, icao, lat, lon) with start <= epoch < end, oldest first, from the ts index
+    own_conn = conn is None
+    if own_conn:
+        if not os.path.exists(db_path):
+            return []
+        conn = connect_history_db(db_path, readonly=True)
+    try:
+        return conn.execute('SELECT ts, icao, lat, lon FROM positions WHERE ts >= ? AND ts < ? ORDER BY ts', (start, end)).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def load_sightings_day(db_path, day, with_history=True):
+    # The day's rows shaped like load_flight_history_day's, location_history
+    # rebuilt from positions when with_history is set
+    rows = {}
+    if not os.path.exists(db_path):
+        return rows
+    conn = connect_history_db(db_path, readonly=True)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(SIGHTING_FIELDS)} FROM sightings WHERE day = ? ORDER BY first_seen", (day,))
+        for values in cursor:
+            row = dict(zip(SIGHTING_FIELDS, values))
+            row['location_history'] = {}
+            rows.setdefault(row['icao'], row)
+        if with_history:
+            for timestamp, icao, lat, lon in load_day_positions(db_path, *_day_bounds(day), conn=conn):
+                row = rows.get(icao)
+                if row is not None:
+                    row['location_history'][f"{timestamp:.6f}"] = [lat, lon]
+    finally:
+        conn.close()
+    return rows
+
+
+def count_models(db_path):
+    # Sightings per model across every day, the rarity model counts
+    if not os.path.exists(db_path):
+        return {}
+    conn = connect_history_db(db_path, readonly=True)
+    try:
+        return dict(conn.execute("SELECT model, COUNT(*) FROM sightings WHERE model IS NOT NULL AND TRIM(model) NOT IN ('', '-') GROUP BY model"))
+    finally:
+        conn.close()
+
+
+class SightingsCache:
+    # Keeps one day's sightings in memory and only fetches rows whose
+    # last_seen moved since the previous call, so periodic stats don't
+    # re-read the whole day. One per process (the stats worker keeps it
+    # between calls).
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.db_path = None
+        self.day = None
+        self.rows = {}
+        self.since = ''
+
+    def day_rows(self, db_path, day):
+        with self.lock:
+            if (db_path, day) != (self.db_path, self.day):
+                self.db_path, self.day, self.rows, self.since = db_path, day, {}, ''
+            if not os.path.exists(db_path):
+                return []
+            conn = connect_history_db(db_path, readonly=True)
+            try:
+                #>= because last_seen has one second resolution, rows updated in the same second are re-read
+                cursor = conn.execute(f"SELECT {', '.join(SIGHTING_FIELDS)} FROM sightings WHERE day = ? AND last_seen >= ?", (day, self.since))
+                for values in cursor:
+                    row = dict(zip(SIGHTING_FIELDS, values))
+                    self.rows[(row['icao'], row['first_seen'])] = row
+                    if row['last_seen'] and row['last_seen'] > self.since:
+                        self.since = row['last_seen']
+            finally:
+                conn.close()
+            return list(self.rows.values())
+
+
+sightings_cache = SightingsCache()
+
+
+def latest_history_day(db_path, today):
+    # today when it has sightings, otherwise the most recent day with any
+    days = history_db_days(db_path)
+    if not days:
+        return None
+    return today if today in days else days[-1]
+
+
+def import_flight_history_rows(conn, day, rows):
+    # Imports one day's rows as load_flight_history_day returns them.
+    # Re-importing a day updates the sightings in place and skips positions
+    # already stored.
+    records = []
+    first_seen = dict(conn.execute('SELECT icao, MIN(first_seen) FROM sightings WHERE day = ? GROUP BY icao', (day,)))
+    for icao, row in rows.items():
+        seen_at = row.get('last_seen') or row.get('first_seen') or f'{day} 00:00:00'
+        first_seen.setdefault(icao, row.get('first_seen') or seen_at)
+        fields = {name: row.get(name, '-') for name in SIGHTING_FIELDS}
+        points = history_points(parse_location_history(row.get('location_history')), day)
+        records.append({'icao': icao, 't': seen_at, 'f': fields, 'p': points})
+    with conn:
+        return upsert_sightings(conn, day, records, first_seen)
@@ -0,0 +1,527 @@
+import ast
+import csv
+import fcntl
+import json
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+
+from .history_archive import archive_mismatch, archive_path, archive_rows, write_archive
+from .trajectory_points import (history_points, merge_points_file, points_from_lists, points_path, points_to_histories, read_points, sort_points,
+                                timestamp_keys)
+from .trajectory_store import TrajectoryStore, trajectory_to_dict
+
+# Flight history is kept per day as YYYY-MM-DD.csv (one summary row per
+# aircraft), YYYY-MM-DD.points (trail points, see trajectory_points) and an
+# append-only YYYY-MM-DD.journal of JSON lines, one per aircraft that changed
+# since the previous flush:
+#
+#   {"icao": "4CA123", "t": "2024-05-01 12:00:00", "f": {changed fields}, "u": [[epoch_us, lat_e6, lon_e6], ...]}
+#
+# Trail points are integers: the epoch in microseconds (timestamp_keys) and
+# microdegrees, which encode in a third of the time floats take. Journals
+# written before carry them as floats in "p": [[epoch, lat, lon], ...].
+#
+# The tracker seals the journal into YYYY-MM-DD.journal.<n> before each
+# compaction; compaction folds the sealed segments into the CSV and the
+# points file and deletes them. Readers that need today's data merge them
+# with every journal. CSVs from before the points file keep their trails in a
+# location_history column, which is still read and moved out on compaction.
+# Finished days can also be archived in columnar form (see history_archive),
+# the stats readers prefer it and row readers fall back to it when the CSV
+# was removed.
+
+FLIGHT_HISTORY_FIELDS = [
+    'icao', 'flight', 'squawk', 'category', 'emergency',
+    'manufacturer', 'registration', 'model', 'owner', 'rating',
+    'altitude', 'alt_geom', 'baro_rate', 'geom_rate',
+    'speed', 'ias', 'tas', 'mach',
+    'track', 'track_rate', 'mag_heading', 'true_heading', 'nav_heading',
+    'nav_altitude_fms', 'nav_altitude_mcp', 'nav_qnh', 'nav_modes',
+    'roll', 'oat', 'tat', 'wd', 'ws',
+    'rssi', 'seen', 'seen_pos', 'messages',
+    'lat', 'lon',
+    'first_seen', 'last_seen',
+]
+
+_SUMMARY_FIELDS = [field for field in FLIGHT_HISTORY_FIELDS if field not in ('icao', 'first_seen', 'last_seen', 'lat', 'lon')]
+_SEGMENT_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})\.journal\.(\d+)$')
+_READ_ATTEMPTS = 5
+
+
+def flight_history_row(icao, plane):
+    # Per-aircraft summary columns of the daily CSV, without the trail and the seen times
+    row = {'icao': icao}
+    for field in _SUMMARY_FIELDS:
+        row[field] = plane.get(field, '-')
+    row['lat'] = plane.get('last_lat', plane.get('lat', '-'))
+    row['lon'] = plane.get('last_lon', plane.get('lon', '-'))
+    return row
+
+
+def history_csv_path(history_dir, day):
+    return os.path.join(history_dir, f'{day}.csv')
+
+
+def journal_path(history_dir, day):
+    return os.path.join(history_dir, f'{day}.journal')
+
+
+def sealed_journal_paths(history_dir, day=None):
+    # Sealed segments oldest first, for one day or (day=None) every day
+    segments = []
+    try:
+        entry_names = os.listdir(history_dir)
+    except OSError:
+        return segments
+    for entry_name in entry_names:
+        match = _SEGMENT_PATTERN.match(entry_name)
+        if match and (day is None or match.group(1) == day):
+            segments.append((match.group(1), int(match.group(2)), os.path.join(history_dir, entry_name)))
+    segments.sort()
+    return [path for _, _, path in segments]
+
+
+def journal_days(history_dir):
+    # Days that have journal data not yet folded into their CSV
+    days = set()
+    try:
+        entry_names = os.listdir(history_dir)
+    except OSError:
+        return days
+    for entry_name in entry_names:
+        match = _SEGMENT_PATTERN.match(entry_name)
+        if match:
+            days.add(match.group(1))
+        elif entry_name.endswith('.journal'):
+            days.add(entry_name[:-len('.journal')])
+    return days
+
+
+def flight_history_day_exists(history_dir, day):
+    return (os.path.exists(history_csv_path(history_dir, day)) or os.path.exists(archive_path(history_dir, day))
+            or day in journal_days(history_dir))
+
+
+def flight_history_days(history_dir):
+    # Every day with a CSV, an archive or a journal, oldest first
+    days = set(journal_days(history_dir))
+    try:
+        for entry_name in os.listdir(history_dir):
+            if re.match(r'^\d{4}-\d{2}-\d{2}\.(csv|npz)$', entry_name):
+                days.add(entry_name[:-4])
+    except OSError:
+        pass
+    return sorted(days)
+
+
+class _JournalLock:
+    # Short lock between appends and sealing, compaction never holds it while merging
+    def __init__(self, history_dir, day):
+        self.path = journal_path(history_dir, day) + '.lock'
+
+    def __enter__(self):
+        self.file = open(self.path, 'w')
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+
+
+def seal_journal(history_dir, day):
+    # Moves the active journal to the next numbered segment so compaction
+    # works on a file nothing appends to. Returns the segment path or None.
+    active_path = journal_path(history_dir, day)
+    if not os.path.exists(active_path):
+        return None
+    with _JournalLock(history_dir, day):
+        if not os.path.exists(active_path):
+            return None
+        if os.path.getsize(active_path) == 0:
+            os.remove(active_path)
+            return None
+        existing = sealed_journal_paths(history_dir, day)
+        next_index = int(existing[-1].rsplit('.', 1)[1]) + 1 if existing else 1
+        segment_path = f'{active_path}.{next_index}'
+        os.replace(active_path, segment_path)
+    return segment_path
+
+
+def trail_tail(location_history, after=None):
+    # Taken with the planes locked: the trail points newer than `after`
+    # (microseconds, None for the whole trail) copied out as (times, lats,
+    # lons, spill), spill being the spill state for tail_points to read when
+    # those points may reach past the ring
+    since = None if after is None else after / 1e6
+    if isinstance(location_history, TrajectoryStore):
+        times, lats, lons = location_history.tail_after(since)
+        #Only when the ring wrapped past the last flush do the spilled points matter
+        spill = location_history.spill_view() if location_history.spilled_count and len(times) == len(location_history) else None
+        return times, lats, lons, spill
+    points = []
+    for time_key, coords in trajectory_to_dict(location_history).items():
+        try:
+            timestamp = float(time_key)
+        except (ValueError, TypeError):
+            continue
+        if since is None or timestamp > since:
+            points.append((timestamp, coords[0], coords[1]))
+    points.sort()
+    return [point[0] for point in points], [point[1] for point in points], [point[2] for point in points], None
+
+
+def tail_points(tail, after=None):
+    # A trail_tail as [epoch_us, lat_e6, lon_e6] points whose microsecond key is
+    # above `after`. Reads the spill file, call without the planes locked.
+    times, lats, lons, spill = tail
+    times = np.asarray(times, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    spilled = spill.spilled_points() if spill is not None else []
+    if spilled:
+        block = np.asarray(spilled, dtype=np.float64)
+        times = np.concatenate([block[:, 0], times])
+        lats = np.concatenate([block[:, 1], lats])
+        lons = np.concatenate([block[:, 2], lons])
+    keys = timestamp_keys(times)
+    if after is not None:
+        keep = keys > after
+        keys, lats, lons = keys[keep], lats[keep], lons[keep]
+    return np.column_stack((keys, np.rint(lats * 1e6), np.rint(lons * 1e6))).astype(np.int64).tolist()
+
+
+class FlightHistoryJournal:
+    # Tracker-side writer. Remembers what it last wrote per aircraft so each
+    # flush only appends changed fields and new trail points. Switching day
+    # seals the previous day's journal and starts every aircraft afresh.
+    def __init__(self, history_dir):
+        self.history_dir = history_dir
+        self.day = None
+        self.written_fields = {}
+        #Last trail point written per aircraft, in microseconds
+        self.written_until = {}
+        self.finished_day = None
+
+    def snapshot(self, planes_dict, now=None, rating_for=None):
+        # The part of a flush that needs the planes locked: each aircraft's
+        # summary row and the trail points added since it was last written
+        # (trail_tail). Cheap, diffing and any spill file reads are left to
+        # collect(). Returns (day, time, [(icao, fields, tail), ...]).
+        now = now or datetime.now()
+        day = now.strftime('%Y-%m-%d')
+        if day != self.day:
+            self.finished_day = self.day
+            self.day = day
+            self.written_fields = {}
+            self.written_until = {}
+
+        planes = []
+        for icao, plane in planes_dict.items():
+            fields = flight_history_row(icao, plane)
+            if rating_for is not None:
+                fields['rating'] = rating_for(plane)
+            planes.append((icao, fields, trail_tail(plane.get('location_history'), self.written_until.get(icao))))
+        return day, now.strftime('%Y-%m-%d %H:%M:%S'), planes
+
+    def collect(self, snapshot):
+        # Builds the journal records from a snapshot() without the planes
+        # locked. Returns (day, records).
+        day, now_str, planes = snapshot
+        records = []
+        for icao, fields, tail in planes:
+            previous = self.written_fields.get(icao)
+            changed = {key: value for key, value in fields.items() if previous is None or previous.get(key) != value}
+            points = tail_points(tail, self.written_until.get(icao))
+            if not changed and not points:
+                continue
+            records.append({'icao': icao, 't': now_str, 'f': changed, 'u': points})
+            self.written_fields[icao] = fields
+            if points:
+                self.written_until[icao] = points[-1][0]
+
+        #Aircraft that left the table start afresh if they come back
+        present = {icao for icao, _, _ in planes}
+        for icao in [icao for icao in self.written_fields if icao not in present]:
+            del self.written_fields[icao]
+            self.written_until.pop(icao, None)
+        return day, records
+
+    def write(self, day, records):
+        # Serialised here so the JSON encoding stays outside the caller's lock
+        if not records:
+            return 0
+        lines = [json.dumps(record, separators=(',', ':'), default=str) for record in records]
+        os.makedirs(self.history_dir, exist_ok=True)
+        with _JournalLock(self.history_dir, day):
+            with open(journal_path(self.history_dir, day), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        return len(lines)
+
+    def flush(self, planes_dict, now=None, rating_for=None):
+        day, records = self.collect(self.snapshot(planes_dict, now, rating_for))
+        return self.write(day, records)
+
+    def take_finished_day(self):
+        # The day that ended at the last collect(), sealed and ready to compact, or None
+        day = self.finished_day
+        self.finished_day = None
+        if day is not None:
+            seal_journal(self.history_dir, day)
+        return day
+
+
+def read_journal(path):
+    # Journal records in file order; a torn last line from an append in progress is skipped
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        return None
+    return records
+
+
+def parse_location_history(raw):
+    if isinstance(raw, dict):
+        return raw
+    if not raw or raw == '{}':
+        return {}
+    try:
+        parsed = ast.literal_eval(raw)
+    except (ValueError, SyntaxError, TypeError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def apply_journal_records(rows, records):
+    # Folds journal records into CSV-style rows keyed by icao, trail points are left to journal_points
+    for record in records:
+        icao = record.get('icao')
+        if not icao:
+            continue
+        row = rows.get(icao)
+        if row is None:
+            row = rows[icao] = {'icao': icao, 'first_seen': record.get('t')}
+        row.update(record.get('f') or {})
+        if not row.get('first_seen'):
+            row['first_seen'] = record.get('t')
+        row['last_seen'] = record.get('t')
+    return rows
+
+
+def journal_points(records):
+    # Trail points carried by journal records, integer or (older journals)
+    # float, as an unsorted point array
+    points_by_icao = {}
+    micro_points_by_icao = {}
+    for record in records:
+        if record.get('icao') and record.get('u'):
+            micro_points_by_icao.setdefault(record['icao'], []).extend(record['u'])
+        if record.get('icao') and record.get('p'):
+            points_by_icao.setdefault(record['icao'], []).extend(record['p'])
+    return np.concatenate([points_from_lists(micro_points_by_icao, scale=1e6), points_from_lists(points_by_icao)])
+
+
+def take_legacy_points(rows, day):
+    # Removes the location_history column older CSVs carry and returns its points
+    points_by_icao = {}
+    for icao, row in rows.items():
+        raw = row.pop('location_history', None)
+        if raw and raw != '{}':
+            points_by_icao[icao] = history_points(parse_location_history(raw), day)
+    return points_from_lists(points_by_icao)
+
+
+def _read_csv_rows(csv_path):
+    rows = {}
+    if not os.path.exists(csv_path):
+        return rows
+    #Only older CSVs with a location_history column need the raised limit
+    csv.field_size_limit(10 * 1024 * 1024)
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('icao'):
+                rows[row['icao']] = row
+    return rows
+
+
+def _read_day_rows(history_dir, day):
+    # The CSV's rows, or the archive's when the CSV was removed after archiving
+    csv_path = history_csv_path(history_dir, day)
+    if not os.path.exists(csv_path) and os.path.exists(archive_path(history_dir, day)):
+        return archive_rows(archive_path(history_dir, day))
+    return _read_csv_rows(csv_path)
+
+
+def _csv_has_trails(csv_path):
+    try:
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            return 'location_history' in next(csv.reader(f), [])
+    except OSError:
+        return False
+
+
+def _file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _day_files_state(history_dir, day):
+    # What a seal or compaction changes: the segment list, the active
+    # journal's inode (sealing renames it away) and the CSV and points file
+    # (compaction replaces them)
+    active = _file_identity(journal_path(history_dir, day))
+    return (sealed_journal_paths(history_dir, day), active and active[0],
+            _file_identity(history_csv_path(history_dir, day)), _file_identity(points_path(history_dir, day)))
+
+
+def _read_day(history_dir, day, read_rows, read_stored_points):
+    # CSV rows, stored points and journal records of one consistent moment.
+    # Compaction can run concurrently: if a segment listed before the CSV was
+    # read is gone, or a seal or compaction finished while reading, the read
+    # is retried.
+    for _ in range(_READ_ATTEMPTS):
+        state = _day_files_state(history_dir, day)
+        segments = state[0]
+        rows = read_rows()
+        stored_points = read_stored_points()
+        records = []
+        complete = True
+        for path in segments + [journal_path(history_dir, day)]:
+            segment_records = read_journal(path)
+            if segment_records is None:
+                if path in segments:
+                    complete = False
+                    break
+                continue
+            records.extend(segment_records)
+        if complete and _day_files_state(history_dir, day) == state:
+            break
+    return rows, stored_points, records
+
+
+def load_flight_history_day(history_dir, day, with_history=True):
+    # The day's rows as the compacted CSV would have them, without writing
+    # anything. With with_history each row gets a location_history dict built
+    # from the points file, an old location_history column and the journals.
+    if with_history:
+        read_stored_points = lambda: np.array(read_points(points_path(history_dir, day)))
+    else:
+        read_stored_points = lambda: None
+    rows, stored_points, records = _read_day(history_dir, day, lambda: _read_day_rows(history_dir, day), read_stored_points)
+
+    if with_history:
+        points = sort_points(np.concatenate([take_legacy_points(rows, day), stored_points, journal_points(records)]))
+    else:
+        for row in rows.values():
+            row.pop('location_history', None)
+    apply_journal_records(rows, records)
+    if with_history:
+        histories = points_to_histories(points)
+        for icao, row in rows.items():
+            row['location_history'] = histories.get(icao, {})
+    return rows
+
+
+def load_flight_history_points(history_dir, day):
+    # Every trail point of the day (points file, journals, old CSV column) as
+    # a point array sorted by (icao, ts), without building per-point dicts
+    csv_path = history_csv_path(history_dir, day)
+    if _csv_has_trails(csv_path):
+        read_rows = lambda: _read_csv_rows(csv_path)
+    else:
+        read_rows = lambda: {}
+    rows, stored_points, records = _read_day(history_dir, day, read_rows, lambda: np.array(read_points(points_path(history_dir, day))))
+    return sort_points(np.concatenate([take_legacy_points(rows, day), stored_points, journal_points(records)]))
+
+
+def compact_flight_history(history_dir, day):
+    # Folds the day's sealed segments into its CSV and points file (temp file
+    # + rename under the CSV lock) and removes them. Points are written first,
+    # so a crash before the segments are removed only repeats points that are
+    # deduplicated next time. A stale archive of the day is removed, the
+    # converter can write it again. Returns the number of records folded in.
+    csv_path = history_csv_path(history_dir, day)
+    temp_path = csv_path + '.tmp'
+    with open(csv_path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            segments = sealed_journal_paths(history_dir, day)
+            if not segments:
+                return 0
+            records = []
+            for path in segments:
+                records.extend(read_journal(path) or [])
+
+            rows = _read_day_rows(history_dir, day)
+            merge_points_file(points_path(history_dir, day), np.concatenate([take_legacy_points(rows, day), journal_points(records)]))
+            apply_journal_records(rows, records)
+            with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=FLIGHT_HISTORY_FIELDS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows.values())
+            os.replace(temp_path, csv_path)
+            #The CSV is now newer than any archive of the day
+            if os.path.exists(archive_path(history_dir, day)):
+                os.remove(archive_path(history_dir, day))
+            for path in segments:
+                os.remove(path)
+            return len(records)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def compact_pending_days(history_dir, today=None, include_today=False):
+    # Seals and compacts every day with journal data, today only when
+    # include_today is set. Used at startup and by scripts/compact_history.py.
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    compacted = {}
+    for day in sorted(journal_days(history_dir)):
+        if day == today and not include_today:
+            continue
+        seal_journal(history_dir, day)
+        compacted[day] = compact_flight_history(history_dir, day)
+    return compacted
+
+
+def archive_flight_history_day(history_dir, day, remove_csv=False):
+    # Writes a finished, compacted day's CSV as a columnar archive, moving the
+    # trails of an old format CSV into the points file first. With remove_csv
+    # the CSV is deleted once every value of every row reads back from the
+    # archive; on any difference the archive is removed instead and
+    # ValueError raised. Returns the number of rows archived.
+    csv_path = history_csv_path(history_dir, day)
+    with open(csv_path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            rows = _read_csv_rows(csv_path)
+            if not rows:
+                return 0
+            legacy_points = take_legacy_points(rows, day)
+            if len(legacy_points):
+                merge_points_file(points_path(history_dir, day), legacy_points)
+            fieldnames = list(next(iter(rows.values())))
+            write_archive(archive_path(history_dir, day), list(rows.values()), fieldnames)
+            if remove_csv:
+                mismatch = archive_mismatch(archive_path(history_dir, day), rows.values(), fieldnames)
+                if mismatch:
+                    #Readers prefer the newer file, a lossy archive must not shadow the CSV
+                    os.remove(archive_path(history_dir, day))
+                    raise ValueError(f'{archive_path(history_dir, day)} does not match {csv_path}, CSV kept: {mismatch}')
+                os.remove(csv_path)
+            return len(rows)
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# hexdb lookups kept across sessions in a small SQLite (WAL) table keyed by
+# icao, one row written per successful lookup instead of rewriting a JSON
+# file of every airframe. Recently used entries stay in an in-memory LRU,
+# entries older than max_age_days are misses and are deleted on open and
+# then hourly. An old config/icao_cache.json is imported once and renamed.
+#
+# ICAOs hexdb doesn't know (404) or that kept failing are remembered in a
+# second table with a re-check time that doubles with every further miss, so
+# they aren't looked up again on every sighting or after a restart. Those
+# re-check times are also kept in memory, checked before an API worker starts.
+
+ICAO_CACHE_FIELDS = ('manufacturer', 'model', 'owner', 'registration')
+_EVICT_INTERVAL = 60 * 60
+#Re-check delay after the first miss and its cap, per reason
+UNKNOWN_RECHECK = {'not_found': (86400, 30 * 86400), 'error': (3600, 86400)}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS aircraft (
+    icao TEXT PRIMARY KEY, manufacturer TEXT, model TEXT, owner TEXT, registration TEXT, cached_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS aircraft_cached_at ON aircraft (cached_at);
+CREATE TABLE IF NOT EXISTS unknown (
+    icao TEXT PRIMARY KEY, reason TEXT NOT NULL, failures INTEGER NOT NULL, checked_at REAL NOT NULL, recheck_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class IcaoCache:
+    def __init__(self, path, max_age_days=30, hot_size=4096, legacy_json_path=None, registry=None, unknown_recheck=None):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.unknown_recheck = dict(UNKNOWN_RECHECK, **(unknown_recheck or {}))
+        self.hot_size = hot_size
+        self.registry = registry
+        self.hot = OrderedDict()
+        self.last_evicted = 0.0
+        #One connection shared by the ingest thread and the API workers
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript(_SCHEMA)
+        #icao -> (failures, recheck_at) for every remembered unknown
+        self.unknown = {icao: (failures, recheck_at) for icao, failures, recheck_at in self.conn.execute('SELECT icao, failures, recheck_at FROM unknown')}
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self.import_json(legacy_json_path)
+        self.evict_expired()
+
+    def _inc(self, name, value=1):
+        if self.registry is not None:
+            self.registry.inc(name, value)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM aircraft').fetchone()[0]
+
+    def get(self, icao, now=None):
+        # The cached fields plus cached_at, None when unknown or expired
+        started = time.perf_counter()
+        now = now or time.time()
+        with self.lock:
+            entry = self.hot.get(icao)
+            if entry is not None:
+                self.hot.move_to_end(icao)
+                source = 'icao_cache_hits'
+            else:
+                row = self.conn.execute(f"SELECT {', '.join(ICAO_CACHE_FIELDS)}, cached_at FROM aircraft WHERE icao = ?", (icao,)).fetchone()
+                if row is not None:
+                    entry = {field: value for field, value in zip(ICAO_CACHE_FIELDS + ('cached_at',), row) if value is not None}
+                    self._remember(icao, entry)
+                source = 'icao_cache_disk_hits'
+            if entry is not None and now - entry['cached_at'] >= self.max_age:
+                self.hot.pop(icao, None)
+                entry = None
+                self._inc('icao_cache_expired')
+        self._inc(source if entry is not None else 'icao_cache_misses')
+        if self.registry is not None:
+            self.registry.observe('icao_cache_lookup_ms', (time.perf_counter() - started) * 1000)
+        return entry
+
+    def _remember(self, icao, entry):
+        self.hot[icao] = entry
+        self.hot.move_to_end(icao)
+        while len(self.hot) > self.hot_size:
+            self.hot.popitem(last=False)
+
+    def put(self, icao, data, now=None):
+        entry = {field: data[field] for field in ICAO_CACHE_FIELDS if field in data}
+        entry['cached_at'] = now or time.time()
+        try:
+            with self.lock:
+                with self.conn:
+                    self.conn.execute(
+                        f"INSERT OR REPLACE INTO aircraft (icao, {', '.join(ICAO_CACHE_FIELDS)}, cached_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (icao,) + tuple(entry.get(field) for field in ICAO_CACHE_FIELDS) + (entry['cached_at'],),
+                    )
+                    if icao in self.unknown:
+                        self.conn.execute('DELETE FROM unknown WHERE icao = ?', (icao,))
+                self._remember(icao, entry)
+                self.unknown.pop(icao, None)
+                evict = entry['cached_at'] - self.last_evicted >= _EVICT_INTERVAL
+        except sqlite3.Error as e:
+            print(f"ICAO cache error: {e}")
+            self._inc('icao_cache_errors')
+            return
+        self._inc('icao_cache_writes')
+        if evict:
+            self.evict_expired(entry['cached_at'])
+
+    def evict_expired(self, now=None):
+        # Deletes entries past max_age off the cached_at index, returns how many
+        now = now or time.time()
+        with self.lock:
+            with self.conn:
+                removed = self.conn.execute('DELETE FROM aircraft WHERE cached_at < ?', (now - self.max_age,)).rowcount
+                #Unknowns are forgotten (failure count and all) once overdue for re-check by max_age
+                self.conn.execute('DELETE FROM unknown WHERE recheck_at < ?', (now - self.max_age,))
+            for icao in [icao for icao, (_, recheck_at) in self.unknown.items() if recheck_at < now - self.max_age]:
+                del self.unknown[icao]
+            for icao in [icao for icao, entry in self.hot.items() if now - entry['cached_at'] >= self.max_age]:
+                del self.hot[icao]
+            self.last_evicted = now
+        self._inc('icao_cache_evicted', removed)
+        return removed
+
+    def unknown_until(self, icao, now=None):
+        # The re-check time of an ICAO hexdb didn't know, None when it may be looked up
+        remembered = self.unknown.get(icao)
+        if remembered is None or (now or time.time()) >= remembered[1]:
+            return None
+        self._inc('icao_unknown_skips')
+        return remembered[1]
+
+    def record_unknown(self, icao, reason='not_found', now=None):
+        # Remembers a failed lookup, each further miss doubles the delay up to
+        # the reason's cap. Returns the re-check time.
+        now = now or time.time()
+        base, cap = self.unknown_recheck[reason]
+        with self.lock:
+            failures = self.unknown.get(icao, (0, 0))[0] + 1
+            recheck_at = now + min(base * 2 ** (failures - 1), cap)
+            self.unknown[icao] = (failures, recheck_at)
+            try:
+                with self.conn:
+                    self.conn.execute('INSERT OR REPLACE INTO unknown (icao, reason, failures, checked_at, recheck_at) VALUES (?, ?, ?, ?, ?)',
+                                      (icao, reason, failures, now, recheck_at))
+            except sqlite3.Error as e:
+                print(f"ICAO cache error: {e}")
+                self._inc('icao_cache_errors')
+        self._inc(f'icao_unknown_{reason}')
+        return recheck_at
+
+    def import_json(self, json_path):
+        # One-off import of the old {icao: entry} JSON file, renamed afterwards so it only happens once
+        try:
+            with open(json_path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not import ICAO cache {json_path}: {e}")
+            return 0
+        rows = [(icao,) + tuple(entry.get(field) for field in ICAO_CACHE_FIELDS) + (float(entry.get('cached_at', 0)),)
+                for icao, entry in entries.items() if isinstance(entry, dict)]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO aircraft (icao, {', '.join(ICAO_CACHE_FIELDS)}, cached_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        os.replace(json_path, json_path + '.imported')
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
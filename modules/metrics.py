@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+HISTOGRAM_WINDOW = 1024
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list, shared with frame_timing and the benchmarks
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Histogram:
+    # Timing histogram: percentiles over the last HISTOGRAM_WINDOW
+    # observations, count and sum over the whole run
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.values.append(value)
+            self.count += 1
+            self.total += value
+
+    def summary(self):
+        with self.lock:
+            values = sorted(self.values)
+            count = self.count
+            total = self.total
+        return {
+            'count': count,
+            'sum': round(total, 3),
+            'p50': round(percentile(values, 0.50), 3),
+            'p90': round(percentile(values, 0.90), 3),
+            'p99': round(percentile(values, 0.99), 3),
+            'max': round(values[-1], 3) if values else 0.0,
+        }
+
+
+class MetricsRegistry:
+    # Counters only go up, gauges hold the latest value, histograms take
+    # timings in milliseconds. Names are created on first use.
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = dict(self.histograms)
+        return {
+            'time': time.time(),
+            'uptime': round(time.time() - self.started, 1),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': {name: histogram.summary() for name, histogram in sorted(histograms.items())},
+        }
+
+
+class TimedLock:
+    # Drop-in for threading.Lock that records how long callers waited for it
+    # (<name>_wait_ms) and how long it was held (<name>_hold_ms)
+    def __init__(self, name, registry):
+        self._lock = threading.Lock()
+        self._wait = registry.histogram(f"{name}_wait_ms")
+        self._hold = registry.histogram(f"{name}_hold_ms")
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            self._wait.observe((self._acquired_at - started) * 1000)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self._hold.observe(held * 1000)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+#Process-wide registry used by the tracker
+registry = MetricsRegistry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+timer = registry.timer
+snapshot = registry.snapshot
@@ -5,9 +5,11 @@ from time import localtime, strftime
 
 import requests
 
-from .core_utils import clean_string
+from .providers import PROVIDERS, ProviderRouter
 from collections import deque
 
+_default_router = None
+
 
 def make_json_safe(value):
     if isinstance(value, deque):
@@ -20,14 +22,54 @@ def make_json_safe(value):
 
 
 
-def connect(server):
-    while True:
+def connect(server, retry_delay=3, max_retry_delay=None, timeout=None, should_retry=None, on_error=print):
+    #Retries forever; with max_retry_delay set the wait doubles after every failure
+    delay = retry_delay
+    while should_retry is None or should_retry():
         try:
-            sock = socket.create_connection(server)
+            sock = socket.create_connection(server, timeout=timeout)
             return sock
         except Exception as error:
-            print(f"Failed to connect: {error}. Attempting to reconnect")
-            time.sleep(3)
+            on_error(f"Failed to connect: {error}. Attempting to reconnect in {delay}s")
+            time.sleep(delay)
+            if max_retry_delay is not None:
+                delay = min(max_retry_delay, delay * 2)
+    return None
+
+
+def stream_from_server(server, handle_chunk, should_run=lambda: True, on_status=None, name='feed', retry_delay=1, max_retry_delay=60, read_timeout=30, chunk_size=4096):
+    #Persistent client for line/frame feeds: handle_chunk(bytes) returns how many messages it used,
+    #connection failures and feeds that accept then drop us both back off exponentially
+    status = on_status or print
+    idle_delay = retry_delay
+
+    while should_run():
+        sock = connect(server, retry_delay=retry_delay, max_retry_delay=max_retry_delay, timeout=read_timeout, should_retry=should_run, on_error=status)
+        if sock is None:
+            break
+        status(f"Connected to {name} at {server[0]}:{server[1]}")
+
+        received = 0
+        try:
+            while should_run():
+                chunk = sock.recv(chunk_size)
+                if not chunk:
+                    status(f"{name} at {server[0]}:{server[1]} closed the connection")
+                    break
+                received += handle_chunk(chunk) or 0
+        except OSError as error:
+            status(f"{name} error: {error}")
+        finally:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+        if received:
+            idle_delay = retry_delay
+        elif should_run():
+            time.sleep(idle_delay)
+            idle_delay = min(max_retry_delay, idle_delay * 2)
 
 
 def check_network(host='8.8.8.8', port=53, timeout=3):
@@ -40,46 +82,32 @@ def check_network(host='8.8.8.8', port=53, timeout=3):
 
 
 def can_retry_plane_api(plane_data, retry_delay):
+    #Set while every metadata provider's circuit is open
+    if plane_data.get('api_unavailable_until', 0) > time.time():
+        return False
     last_error = plane_data.get('last_api_error', 0)
     if last_error == 0:
         return True
     return (time.time() - last_error) >= retry_delay
 
 
-def fetch_plane_info(icao):
-    try:
-        url = f'https://hexdb.io/api/v1/aircraft/{icao}'
-        response = requests.get(url, timeout=5)
-
-        if response.status_code == 200:
-            api_data = response.json()
-            manufacturer = clean_string(str(api_data.get('Manufacturer', '-')))
-            if manufacturer == 'Avions de Transport Regional':
-                manufacturer = 'ATR'
-            elif manufacturer == 'Honda Aircraft Company':
-                manufacturer = 'Honda'
-
-            return {
-                'manufacturer': manufacturer,
-                'registration': clean_string(str(api_data.get('Registration', '-'))),
-                'owner': clean_string(str(api_data.get('RegisteredOwners', '-'))),
-                'model': clean_string(str(api_data.get('Type', '-'))),
-                'icao_type_code': clean_string(str(api_data.get('ICAOTypeCode', '-'))),
-                'operator_flag': clean_string(str(api_data.get('OperatorFlagCode', '-'))),
-                'last_api_error': 0,
-            }
-
-        if response.status_code == 404:
-            return None
-        if response.status_code == 429:
-            return {'last_api_error': time.time(), 'api_error_msg': '429 rate limited'}
-        return {'last_api_error': time.time(), 'api_error_msg': f'{response.status_code} server error'}
-    except requests.exceptions.Timeout as e:
-        return {'last_api_error': time.time(), 'api_error_msg': f'ReadTimeout: {e}'}
-    except requests.exceptions.ConnectionError as e:
-        return {'last_api_error': time.time(), 'api_error_msg': f'ConnectionError: {e}'}
-    except Exception as e:
-        return {'last_api_error': time.time(), 'api_error_msg': f'{type(e).__name__}: {e}'}
+def make_http_session(pool_size=4):
+    #Keep-alive connections reused across lookups, pool_size of them for the enrichment workers
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_plane_info(icao, session=None, router=None):
+    #hexdb alone unless a ProviderRouter over several metadata providers is passed in
+    global _default_router
+    if router is None:
+        if _default_router is None:
+            _default_router = ProviderRouter([PROVIDERS['hexdb']()])
+        router = _default_router
+    return router.fetch(icao, session or requests)
 
 
 def upload_to_firebase(plane_data):
@@ -0,0 +1,217 @@
+import threading
+import time
+
+from .core_utils import clean_manufacturer, clean_string
+
+# Aircraft metadata providers behind fetch_plane_info. Each provider is a URL
+# and a parser normalising its JSON into the hexdb-shaped fields the tracker
+# stores. The router asks the fastest healthy provider first (latency and
+# error rate are smoothed per provider) and falls through to the next one on
+# a miss or failure. A provider that keeps failing, or answers 429, has its
+# circuit opened: it is skipped for a cooldown that doubles while trial
+# requests keep failing, and one success closes it again.
+
+PLANE_INFO_FIELDS = ('manufacturer', 'registration', 'owner', 'model', 'icao_type_code', 'operator_flag')
+
+
+def _normalise(manufacturer, registration, owner, model, icao_type_code, operator_flag):
+    return {
+        'manufacturer': clean_manufacturer(str(manufacturer or '-')),
+        'registration': clean_string(str(registration or '-')),
+        'owner': clean_string(str(owner or '-')),
+        'model': clean_string(str(model or '-')),
+        'icao_type_code': clean_string(str(icao_type_code or '-')),
+        'operator_flag': clean_string(str(operator_flag or '-')),
+    }
+
+
+def parse_hexdb(data):
+    return _normalise(data.get('Manufacturer'), data.get('Registration'), data.get('RegisteredOwners'),
+                      data.get('Type'), data.get('ICAOTypeCode'), data.get('OperatorFlagCode'))
+
+
+def parse_adsbdb(data):
+    #{"response": {"aircraft": {...}}}, or {"response": "unknown aircraft"}
+    aircraft = (data.get('response') or {}).get('aircraft') if isinstance(data.get('response'), dict) else None
+    if not aircraft:
+        return None
+    return _normalise(aircraft.get('manufacturer'), aircraft.get('registration'), aircraft.get('registered_owner'),
+                      aircraft.get('type'), aircraft.get('icao_type'), aircraft.get('registered_owner_operator_flag_code'))
+
+
+def parse_opensky(data):
+    return _normalise(data.get('manufacturerName'), data.get('registration'), data.get('owner') or data.get('operator'),
+                      data.get('model'), data.get('typecode'), data.get('operatorIcao'))
+
+
+class Provider:
+    # url has an {icao} placeholder, parse(json) returns the normalised fields or None for unknown
+    def __init__(self, name, url, parse, timeout=5):
+        self.name = name
+        self.url = url
+        self.parse = parse
+        self.timeout = timeout
+
+
+PROVIDERS = {
+    'hexdb': lambda: Provider('hexdb', 'https://hexdb.io/api/v1/aircraft/{icao}', parse_hexdb),
+    'adsbdb': lambda: Provider('adsbdb', 'https://api.adsbdb.com/v0/aircraft/{icao}', parse_adsbdb),
+    'opensky': lambda: Provider('opensky', 'https://opensky-network.org/api/metadata/aircraft/icao/{icao}', parse_opensky),
+}
+
+
+class _ProviderState:
+    def __init__(self):
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.trial = False
+        self.last_used = 0.0
+
+
+class ProviderRouter:
+    def __init__(self, providers, failure_threshold=3, cooldown=30.0, max_cooldown=600.0, smoothing=0.2, explore_every=50, registry=None):
+        self.providers = list(providers)
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.smoothing = smoothing
+        self.explore_every = explore_every
+        self.registry = registry
+        self.states = {provider.name: _ProviderState() for provider in self.providers}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def _inc(self, name, value=1):
+        if self.registry is not None:
+            self.registry.inc(name, value)
+
+    def _score(self, provider):
+        # Smoothed latency inflated by the error rate, untried providers first
+        state = self.states[provider.name]
+        if state.latency_ms is None:
+            return 0.0
+        return state.latency_ms / max(0.05, 1.0 - state.error_rate)
+
+    def route(self):
+        # Providers to ask in order, fastest first
+        with self.lock:
+            self.requests += 1
+            available = sorted(self.providers, key=self._score)
+            #Now and then the least recently used provider goes first so its latency stays current
+            if self.explore_every and self.requests % self.explore_every == 0 and len(available) > 1:
+                stale = min(available, key=lambda provider: self.states[provider.name].last_used)
+                available.remove(stale)
+                available.insert(0, stale)
+            return available
+
+    def _admit(self, provider, now=None):
+        # False while the circuit is open. Past the cooldown one trial request
+        # at a time is let through (half-open).
+        now = now or time.time()
+        with self.lock:
+            state = self.states[provider.name]
+            if not state.open_until:
+                return True
+            if state.open_until > now or state.trial:
+                return False
+            state.trial = True
+            return True
+
+    def record(self, provider, latency_ms, ok, rate_limited=False, retry_after=None, now=None):
+        now = now or time.time()
+        with self.lock:
+            state = self.states[provider.name]
+            state.last_used = now
+            state.trial = False
+            if ok:
+                state.latency_ms = latency_ms if state.latency_ms is None else state.latency_ms + self.smoothing * (latency_ms - state.latency_ms)
+            state.error_rate += self.smoothing * ((0.0 if ok else 1.0) - state.error_rate)
+            if ok:
+                if state.open_until:
+                    self._inc(f'provider_{provider.name}_closed')
+                state.failures = 0
+                state.open_until = 0.0
+                state.cooldown = 0.0
+                return
+            state.failures += 1
+            if rate_limited or state.failures >= self.failure_threshold or state.open_until:
+                #A failed trial doubles the cooldown, 429 waits at least as long as Retry-After asks
+                state.cooldown = min(self.max_cooldown, state.cooldown * 2 if state.cooldown else self.base_cooldown)
+                state.open_until = now + max(state.cooldown, retry_after or 0)
+                self._inc(f'provider_{provider.name}_opened')
+
+    def is_open(self, name, now=None):
+        return self.states[name].open_until > (now or time.time())
+
+    def status(self, now=None):
+        # {name: {latency_ms, error_rate, open}} for the status endpoint and tests
+        now = now or time.time()
+        with self.lock:
+            return {name: {'latency_ms': None if state.latency_ms is None else round(state.latency_ms, 1),
+                           'error_rate': round(state.error_rate, 3),
+                           'open': state.open_until > now}
+                    for name, state in self.states.items()}
+
+    def next_admit_time(self):
+        # Epoch at which the first open circuit lets a trial request through
+        with self.lock:
+            return min((state.open_until for state in self.states.values()), default=0.0)
+
+    def fetch(self, icao, session):
+        # The normalised fields plus last_api_error 0 from the first provider
+        # that knows the aircraft, None when every provider asked says unknown,
+        # an error dict like fetch_plane_info's when providers failed, and
+        # {'unavailable_until': epoch} when every circuit is open and nothing
+        # was asked
+        errors = []
+        answered = False
+        asked = False
+        for provider in self.route():
+            if not self._admit(provider):
+                continue
+            asked = True
+            started = time.perf_counter()
+            status = None
+            retry_after = None
+            try:
+                response = session.get(provider.url.format(icao=icao), timeout=provider.timeout)
+                status = response.status_code
+                if status == 200:
+                    result = provider.parse(response.json())
+                elif status == 429:
+                    retry_after = _retry_after(response.headers.get('Retry-After'))
+            except Exception as e:
+                errors.append(f'{provider.name} {type(e).__name__}: {e}')
+                result = None
+            latency_ms = (time.perf_counter() - started) * 1000
+            if self.registry is not None:
+                self.registry.observe(f'provider_{provider.name}_latency_ms', latency_ms)
+            if status in (200, 404):
+                answered = True
+                self.record(provider, latency_ms, ok=True)
+                self._inc(f'provider_{provider.name}_hits' if status == 200 and result else f'provider_{provider.name}_misses')
+                if status == 200 and result:
+                    return dict(result, last_api_error=0)
+                continue
+            self.record(provider, latency_ms, ok=False, rate_limited=status == 429, retry_after=retry_after)
+            self._inc(f'provider_{provider.name}_errors')
+            if status == 429:
+                errors.append(f'{provider.name} 429 rate limited')
+            elif status is not None:
+                errors.append(f'{provider.name} {status} server error')
+        if not asked:
+            self._inc('provider_unavailable')
+            return {'unavailable_until': self.next_admit_time()}
+        if answered and not errors:
+            return None
+        return {'last_api_error': time.time(), 'api_error_msg': '; '.join(errors)}
+
+
+def _retry_after(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
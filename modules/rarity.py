@@ -2,6 +2,10 @@ import bisect
 import csv
 import os
 
+from .history_archive import archive_value_counts
+from .history_db import count_models
+from .history_journal import journal_days, load_flight_history_day
+
 _COLOURS = [
     None,
     (255, 255, 255),  # 1  - white
@@ -26,20 +30,49 @@ def _percentile_to_rating(p):
     return 10                # magenta – bottom 10%
 
 
-def build_model_counts(history_dir='./flight_history'):
+def build_model_counts(history_dir='./flight_history', history_db=None):
+    #SQLite backend: one GROUP BY on the model index
+    if history_db:
+        return count_models(history_db)
+
     counts = {}
     if not os.path.isdir(history_dir):
         return counts
+
+    def count_row(row):
+        model = (row.get('model') or '').strip()
+        if model and model != '-':
+            counts[model] = counts.get(model, 0) + 1
+
+    #Days with uncompacted journal data are read merged with their CSV
+    pending_days = journal_days(history_dir)
+    for day in sorted(pending_days):
+        try:
+            for row in load_flight_history_day(history_dir, day, with_history=False).values():
+                count_row(row)
+        except Exception:
+            continue
+    #Archived days are counted from the model column's dictionary codes
+    archived_days = set()
+    for fname in sorted(os.listdir(history_dir)):
+        if not fname.endswith('.npz') or fname[:-len('.npz')] in pending_days:
+            continue
+        try:
+            for model, count in archive_value_counts(os.path.join(history_dir, fname), 'model').items():
+                model = model.strip()
+                if model and model != '-':
+                    counts[model] = counts.get(model, 0) + count
+            archived_days.add(fname[:-len('.npz')])
+        except Exception:
+            continue
     for fname in sorted(os.listdir(history_dir)):
-        if not fname.endswith('.csv'):
+        if not fname.endswith('.csv') or fname[:-len('.csv')] in pending_days or fname[:-len('.csv')] in archived_days:
             continue
         fpath = os.path.join(history_dir, fname)
         try:
             with open(fpath, 'r', newline='', encoding='utf-8') as f:
                 for row in csv.DictReader(f):
-                    model = (row.get('model') or '').strip()
-                    if model and model != '-':
-                        counts[model] = counts.get(model, 0) + 1
+                    count_row(row)
         except Exception:
             continue
     return counts
@@ -0,0 +1,122 @@
+import gzip
+import json
+import time
+
+from .data_utils import readsb_file_signature
+from .network_utils import stream_from_server
+
+# Replay logs are gzip'd JSON lines, one record per captured item:
+#   {"t": epoch, "kind": "json", "data": <aircraft.json snapshot>}
+#   {"t": epoch, "kind": "sbs", "line": "MSG,3,..."}
+REPLAY_KIND_JSON = 'json'
+REPLAY_KIND_SBS = 'sbs'
+
+
+def open_replay_log(path, mode='rt'):
+    return gzip.open(path, mode, encoding='utf-8')
+
+
+def write_replay_record(f, kind, payload, t=None):
+    record = {'t': t if t is not None else time.time(), 'kind': kind}
+    record['data' if kind == REPLAY_KIND_JSON else 'line'] = payload
+    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def read_replay_log(path):
+    with open_replay_log(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                #A recorder killed mid-write leaves a partial last line
+                continue
+
+
+def record_readsb_json(json_path, out_path, duration=None, poll_interval=0.25, should_run=lambda: True):
+    # Capture every new aircraft.json snapshot readsb writes, returns the number recorded
+    recorded = 0
+    signature = None
+    started = time.time()
+    with open_replay_log(out_path, 'wt') as f:
+        while should_run() and (duration is None or time.time() - started < duration):
+            try:
+                next_signature = readsb_file_signature(json_path)
+                if next_signature != signature:
+                    with open(json_path, 'r') as jf:
+                        data = json.load(jf)
+                    signature = next_signature
+                    write_replay_record(f, REPLAY_KIND_JSON, data)
+                    recorded += 1
+            except (OSError, ValueError) as e:
+                print(f"Record error: {e}")
+                signature = None
+            time.sleep(poll_interval)
+    return recorded
+
+
+def record_sbs(server, out_path, duration=None, should_run=lambda: True, on_status=print):
+    # Capture raw SBS lines from port 30003, returns the number recorded
+    started = time.time()
+    recorded = [0]
+    pending = [b'']
+
+    with open_replay_log(out_path, 'wt') as f:
+        def handle_chunk(chunk):
+            *lines, pending[0] = (pending[0] + chunk).split(b'\n')
+            now = time.time()
+            for line in lines:
+                text = line.decode('ascii', errors='ignore').strip()
+                if text:
+                    write_replay_record(f, REPLAY_KIND_SBS, text, now)
+                    recorded[0] += 1
+            return len(lines)
+
+        def keep_running():
+            return should_run() and (duration is None or time.time() - started < duration)
+
+        stream_from_server(server, handle_chunk, keep_running, on_status, 'SBS recorder', read_timeout=5)
+    return recorded[0]
+
+
+def replay_log(path, on_record, speed=1.0, should_run=lambda: True, loop=False):
+    # Feed a recorded log to on_record(record, replay_time). speed is a
+    # multiple of real time, 0 replays as fast as possible. replay_time keeps
+    # the recorded spacing on a timeline rebased to now (and carried on
+    # across loops), so seen_pos freshness and trails stay consistent at any
+    # speed. Returns the number of records replayed.
+    replayed = 0
+    timeline_end = None
+    while should_run():
+        wall_start = time.time()
+        base = wall_start if timeline_end is None else max(wall_start, timeline_end + 1)
+        first_t = None
+        for record in read_replay_log(path):
+            if not should_run():
+                return replayed
+            t = record.get('t')
+            if not isinstance(t, (int, float)):
+                continue
+            if first_t is None:
+                first_t = t
+            elapsed = t - first_t
+            if speed > 0:
+                delay = wall_start + elapsed / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            replay_time = base + elapsed
+            on_record(record, replay_time)
+            timeline_end = replay_time
+            replayed += 1
+        if not loop or first_t is None:
+            break
+    return replayed
+
+
+def rebase_snapshot(data, replay_time):
+    # Shallow copy of a recorded aircraft.json snapshot with 'now' moved onto the replay timeline
+    rebased = dict(data)
+    rebased['now'] = replay_time
+    return rebased
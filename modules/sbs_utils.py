@@ -0,0 +1,141 @@
+import time
+
+from .network_utils import stream_from_server
+
+# SBS-1 / BaseStation columns (readsb and dump1090 serve this on port 30003)
+SBS_FIELD_HEX = 4
+SBS_FIELD_CALLSIGN = 10
+SBS_FIELD_ALTITUDE = 11
+SBS_FIELD_SPEED = 12
+SBS_FIELD_TRACK = 13
+SBS_FIELD_LAT = 14
+SBS_FIELD_LON = 15
+SBS_FIELD_VERTICAL_RATE = 16
+SBS_FIELD_SQUAWK = 17
+SBS_FIELD_EMERGENCY = 19
+
+SBS_STATE_MAX_AGE_SECONDS = 300
+
+
+def _sbs_number(fields, index, cast=float):
+    if index >= len(fields):
+        return None
+    value = fields[index].strip()
+    if not value:
+        return None
+    try:
+        return cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_sbs_line(line):
+    fields = line.strip().split(',')
+    if len(fields) < 11 or fields[0] != 'MSG':
+        return None
+
+    hex_code = fields[SBS_FIELD_HEX].strip().lower()
+    if not hex_code:
+        return None
+
+    message = {'hex': hex_code, 'msg_type': _sbs_number(fields, 1, int)}
+
+    callsign = fields[SBS_FIELD_CALLSIGN].strip() if len(fields) > SBS_FIELD_CALLSIGN else ''
+    if callsign:
+        message['flight'] = callsign
+
+    altitude = _sbs_number(fields, SBS_FIELD_ALTITUDE, int)
+    if altitude is not None:
+        message['alt_baro'] = altitude
+
+    speed = _sbs_number(fields, SBS_FIELD_SPEED)
+    if speed is not None:
+        message['gs'] = speed
+
+    track = _sbs_number(fields, SBS_FIELD_TRACK)
+    if track is not None:
+        message['track'] = track
+
+    lat = _sbs_number(fields, SBS_FIELD_LAT)
+    lon = _sbs_number(fields, SBS_FIELD_LON)
+    if lat is not None and lon is not None:
+        message['lat'] = lat
+        message['lon'] = lon
+
+    vertical_rate = _sbs_number(fields, SBS_FIELD_VERTICAL_RATE, int)
+    if vertical_rate is not None:
+        message['baro_rate'] = vertical_rate
+
+    squawk = fields[SBS_FIELD_SQUAWK].strip() if len(fields) > SBS_FIELD_SQUAWK else ''
+    if squawk:
+        message['squawk'] = squawk
+
+    emergency = fields[SBS_FIELD_EMERGENCY].strip() if len(fields) > SBS_FIELD_EMERGENCY else ''
+    if emergency in ('-1', '1'):
+        message['emergency'] = 'general'
+
+    return message
+
+
+def apply_sbs_message(aircraft_state, message, now=None):
+    # Merge one parsed MSG line into a readsb-style aircraft dict so the
+    # result can go straight through parse_aircraft
+    now = now or time.time()
+    aircraft = aircraft_state.get(message['hex'])
+    if aircraft is None:
+        aircraft = {'hex': message['hex'], 'messages': 0}
+        aircraft_state[message['hex']] = aircraft
+
+    for key, value in message.items():
+        if key not in ('hex', 'msg_type'):
+            aircraft[key] = value
+
+    aircraft['messages'] += 1
+    aircraft['last_message_time'] = now
+    if 'lat' in message:
+        aircraft['last_position_time'] = now
+
+    aircraft['seen'] = 0.0
+    if 'last_position_time' in aircraft:
+        aircraft['seen_pos'] = round(now - aircraft['last_position_time'], 1)
+    return aircraft
+
+
+def prune_sbs_state(aircraft_state, max_age_seconds=SBS_STATE_MAX_AGE_SECONDS, now=None):
+    now = now or time.time()
+    cutoff = now - max_age_seconds
+    for hex_code in [h for h, a in aircraft_state.items() if a.get('last_message_time', 0) < cutoff]:
+        del aircraft_state[hex_code]
+
+
+def sbs_stream(server, on_aircraft, should_run=lambda: True, on_status=None, retry_delay=1, max_retry_delay=60, read_timeout=30):
+    # Keep a persistent connection to the SBS port, reconnecting with
+    # exponential backoff. on_aircraft(aircraft, message) is called for
+    # every MSG line once it has been merged into the aircraft state.
+    aircraft_state = {}
+    pending = [b'']
+    last_prune = [time.time()]
+
+    def handle_chunk(chunk):
+        *lines, pending[0] = (pending[0] + chunk).split(b'\n')
+        handled = 0
+        for line in lines:
+            message = parse_sbs_line(line.decode('ascii', errors='ignore'))
+            if message is None:
+                continue
+            handled += 1
+            now = time.time()
+            aircraft = apply_sbs_message(aircraft_state, message, now)
+            on_aircraft(aircraft, message)
+
+            if now - last_prune[0] >= 10:
+                prune_sbs_state(aircraft_state, now=now)
+                last_prune[0] = now
+        return handled
+
+    def on_connection_status(text):
+        pending[0] = b''
+        (on_status or print)(text)
+
+    stream_from_server(server, handle_chunk, should_run, on_connection_status, 'SBS feed', retry_delay, max_retry_delay, read_timeout)
+    return aircraft_state
@@ -0,0 +1,160 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Fields readsb never reports; they come from the API/ICAO cache and must
+# survive the in-place merge of each new position
+ENRICHMENT_FIELDS = ('manufacturer', 'registration', 'owner', 'model', 'icao_type_code', 'code_mode_s', 'operator_flag')
+
+
+def _column_value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def haversine_km(lat, lon, lats, lons):
+    # Vectorised haversine from (lat, lon), same formula as calculate_distance
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons - lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return np.round(EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), 1)
+
+
+def project_xy(lats, lons, range_km, centre_lat, centre_lon, center_x, center_y):
+    # Vectorised coords_to_xy with the same operation order, so pixels match; positions must be finite
+    km_per_px = (range_km * 2) / 1024
+    dx = (lons - centre_lon) * 111 * math.cos(math.radians(centre_lat))
+    dy = (lats - centre_lat) * 111
+    return center_x + (dx / km_per_px).astype(int), center_y - (dy / km_per_px).astype(int)
+
+
+def altitude_mask(altitudes, threshold, above):
+    # plane_matches_altitude_filter for a column, NaN altitudes compare False
+    return altitudes >= threshold if above else altitudes <= threshold
+
+
+def distance_mask(distances, threshold_km, outside):
+    # plane_matches_distance_filter for a column: no threshold passes everything, with one NaN never passes
+    if threshold_km <= 0:
+        return np.ones(len(distances), dtype=bool)
+    return distances >= threshold_km if outside else distances <= threshold_km
+
+
+class AircraftStateTable:
+    # Struct-of-arrays store for tracked aircraft: numeric columns hold what
+    # the render loop filters and projects on (NaN for '-'; the UI snapshot
+    # copies them for the displayed slots), each slot's plane
+    # dict keeps the metadata and histories. Behaves like the old
+    # {icao: plane_data} dict so existing readers keep working. Every change
+    # bumps `revision` and stamps the slot, so readers can tell what moved.
+    COLUMNS = ('lat', 'lon', 'altitude', 'speed', 'track', 'last_update', 'display_until')
+
+    def __init__(self, capacity=256):
+        self.slots = {}
+        self.icaos = [None] * capacity
+        self.records = [None] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.used = np.zeros(capacity, dtype=bool)
+        self.revision = 0
+        self.revisions = np.zeros(capacity, dtype=np.int64)
+        for name in self.COLUMNS:
+            setattr(self, name, np.full(capacity, np.nan))
+
+    def _grow(self):
+        capacity = len(self.icaos)
+        self.icaos.extend([None] * capacity)
+        self.records.extend([None] * capacity)
+        self.free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+        self.used = np.concatenate([self.used, np.zeros(capacity, dtype=bool)])
+        self.revisions = np.concatenate([self.revisions, np.zeros(capacity, dtype=np.int64)])
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), np.full(capacity, np.nan)]))
+
+    def upsert(self, icao, plane_data, display_until):
+        # Stores plane_data as the slot's record (callers merge into the
+        # existing record first) and refreshes its columns
+        slot = self.slots.get(icao)
+        if slot is None:
+            if not self.free_slots:
+                self._grow()
+            slot = self.free_slots.pop()
+            self.slots[icao] = slot
+            self.icaos[slot] = icao
+            self.used[slot] = True
+        self.records[slot] = plane_data
+        self.lat[slot] = _column_value(plane_data.get('last_lat'))
+        self.lon[slot] = _column_value(plane_data.get('last_lon'))
+        self.altitude[slot] = _column_value(plane_data.get('altitude'))
+        self.speed[slot] = _column_value(plane_data.get('speed'))
+        self.track[slot] = _column_value(plane_data.get('track'))
+        self.last_update[slot] = _column_value(plane_data.get('last_update_time'))
+        self.display_until[slot] = display_until
+        self.touch(icao)
+        return slot
+
+    def touch(self, icao):
+        # Mark a record changed after it was edited outside upsert
+        slot = self.slots.get(icao)
+        if slot is not None:
+            self.revision += 1
+            self.revisions[slot] = self.revision
+
+    def remove(self, icao):
+        slot = self.slots.pop(icao)
+        self.icaos[slot] = None
+        self.records[slot] = None
+        self.used[slot] = False
+        self.revisions[slot] = 0
+        self.revision += 1
+        for name in self.COLUMNS:
+            getattr(self, name)[slot] = np.nan
+        self.free_slots.append(slot)
+
+    def prune(self, cutoff):
+        # Drop aircraft not updated since cutoff, returns {icao: plane_data} of the removed ones
+        stale = np.flatnonzero(self.used & (self.last_update < cutoff))
+        removed = {self.icaos[slot]: self.records[slot] for slot in stale}
+        for icao in removed:
+            self.remove(icao)
+        return removed
+
+    def is_displayed(self, icao, now):
+        slot = self.slots.get(icao)
+        return slot is not None and self.display_until[slot] >= now
+
+    def displayed_slots(self, now):
+        return np.flatnonzero(self.used & (self.display_until >= now))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, icao):
+        return icao in self.slots
+
+    def __iter__(self):
+        return iter(list(self.slots))
+
+    def __getitem__(self, icao):
+        return self.records[self.slots[icao]]
+
+    def __delitem__(self, icao):
+        self.remove(icao)
+
+    def get(self, icao, default=None):
+        slot = self.slots.get(icao)
+        return default if slot is None else self.records[slot]
+
+    def keys(self):
+        return list(self.slots)
+
+    def values(self):
+        return [self.records[slot] for slot in self.slots.values()]
+
+    def items(self):
+        return [(icao, self.records[slot]) for icao, slot in self.slots.items()]
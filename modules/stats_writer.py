@@ -0,0 +1,105 @@
+import threading
+import time
+
+from .data_utils import STATS_CSV_PATH, stats_csv_ready, stats_csv_row, write_stats_csv
+
+# Write-behind for stats_history/stats.csv. Callers hand over snapshots of
+# enriched planes (nothing else may change them or their location_history
+# afterwards) and return at once; one background thread coalesces them per
+# icao (the newest wins), builds the rows and folds each batch into the
+# file with a single locked rewrite, every flush_interval seconds or as soon
+# as flush_size aircraft are pending. At most max_pending aircraft wait:
+# past that submit drops the update without waiting and counts it.
+
+
+class StatsCsvWriter:
+    def __init__(self, csv_path=STATS_CSV_PATH, flush_interval=10.0, flush_size=50, max_pending=2000, registry=None):
+        self.csv_path = csv_path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.registry = registry
+        self.pending = {}
+        self.condition = threading.Condition()
+        #Held for a whole flush so close() and the writer thread never write at once
+        self.flush_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.errors = 0
+
+    def _inc(self, name, value=1):
+        if self.registry is not None:
+            self.registry.inc(name, value)
+
+    def submit(self, icao, plane_data):
+        # False when the plane isn't fully enriched yet or the queue is full
+        if not stats_csv_ready(plane_data):
+            return False
+        with self.condition:
+            if icao not in self.pending and len(self.pending) >= self.max_pending:
+                self.condition.notify_all()
+                self._inc('stats_csv_dropped')
+                return False
+            if icao in self.pending:
+                self._inc('stats_csv_coalesced')
+            self.pending[icao] = plane_data
+            if len(self.pending) >= self.flush_size:
+                self.condition.notify_all()
+        return True
+
+    def flush(self):
+        # Writes everything pending now, returns the number of rows written
+        with self.flush_lock:
+            with self.condition:
+                batch, self.pending = self.pending, {}
+                self.condition.notify_all()
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                #Trails (spill files included) are read here, off the caller's thread
+                rows = {icao: stats_csv_row(icao, plane_data) for icao, plane_data in batch.items()}
+                write_stats_csv(rows, self.csv_path)
+            except Exception as e:
+                print(f"CSV error: {e}")
+                self.errors += 1
+                self._inc('stats_csv_flush_errors')
+                #Retried with the next batch unless a newer snapshot arrived meanwhile
+                with self.condition:
+                    for icao, plane_data in batch.items():
+                        self.pending.setdefault(icao, plane_data)
+                return 0
+            if self.registry is not None:
+                self.registry.observe('stats_csv_flush_ms', (time.perf_counter() - started) * 1000)
+            self._inc('stats_csv_rows_written', len(rows))
+            return len(rows)
+
+    def run(self):
+        while True:
+            errors = self.errors
+            with self.condition:
+                self.condition.wait_for(lambda: not self.running or len(self.pending) >= self.flush_size, self.flush_interval)
+                running = self.running
+            self.flush()
+            if not running:
+                return
+            #A failing write backs off for a full interval instead of retrying on every submit
+            if self.errors != errors:
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running, self.flush_interval)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='stats-csv-writer', daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        # Stops the thread and writes whatever is still pending
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(10)
+            self.thread = None
+        self.flush()
@@ -0,0 +1,86 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = 'planetracker_'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _metric_name(name):
+    return METRIC_PREFIX + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _metric_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value))
+
+
+def format_prometheus(metrics_snapshot):
+    # Prometheus text exposition: counters get a _total suffix, histograms are
+    # exported as summaries (p50/p90/p99 over the rolling window, lifetime count/sum)
+    lines = []
+    for name, value in sorted(metrics_snapshot.get('counters', {}).items()):
+        metric = _metric_name(name) + '_total'
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {_metric_value(value)}")
+    for name, value in sorted(metrics_snapshot.get('gauges', {}).items()):
+        if not isinstance(value, (int, float)):
+            continue
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {_metric_value(value)}")
+    for name, stats in sorted(metrics_snapshot.get('histograms', {}).items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} summary")
+        for quantile, key in (('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99')):
+            lines.append(f'{metric}{{quantile="{quantile}"}} {_metric_value(stats[key])}')
+        lines.append(f"{metric}_sum {_metric_value(stats['sum'])}")
+        lines.append(f"{metric}_count {_metric_value(stats['count'])}")
+    if 'uptime' in metrics_snapshot:
+        lines.append(f"# TYPE {METRIC_PREFIX}uptime_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}uptime_seconds {_metric_value(metrics_snapshot['uptime'])}")
+    return '\n'.join(lines) + '\n'
+
+
+def _make_handler(metrics_provider, status_provider):
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/') or '/'
+            try:
+                if path == '/metrics':
+                    self._send(200, PROMETHEUS_CONTENT_TYPE, format_prometheus(metrics_provider()))
+                elif path in ('/', '/status'):
+                    self._send(200, 'application/json', json.dumps(status_provider(), indent=2, default=str))
+                else:
+                    self._send(404, 'text/plain; charset=utf-8', 'not found: use /metrics or /status\n')
+            except Exception as e:
+                self._send(500, 'text/plain; charset=utf-8', f"error: {e}\n")
+
+        def _send(self, code, content_type, body):
+            data = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            #Scrapes every few seconds would flood the tracker log
+            pass
+
+    return StatusHandler
+
+
+def start_status_server(host, port, metrics_provider, status_provider):
+    # Serves GET /metrics (Prometheus) and GET /status (JSON) on a daemon
+    # thread. Providers are called on the request thread and must not block
+    # on the render loop. Returns the server, server.server_address has the
+    # bound port when port is 0.
+    server = ThreadingHTTPServer((host, int(port)), _make_handler(metrics_provider, status_provider))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='status_server', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,164 @@
+import math
+import random
+from datetime import datetime
+
+EARTH_RADIUS_KM = 6371
+KNOTS_TO_KMS = 1.852 / 3600
+
+_AIRLINE_PREFIXES = ['RYR', 'EZY', 'BAW', 'KLM', 'DLH', 'AFR', 'UAE', 'WZZ', 'TOM', 'EIN', 'SAS', 'IBE', 'TAP', 'AAL', 'UAL']
+_CATEGORIES = ['A1', 'A2', 'A3', 'A3', 'A3', 'A4', 'A5', 'A7']
+
+
+def great_circle_step(lat, lon, track, distance_km):
+    # Move distance_km along the great circle starting at track, returns the
+    # new position and the track at the new position
+    lat1 = math.radians(lat)
+    lon1 = math.radians(lon)
+    bearing = math.radians(track)
+    angular = distance_km / EARTH_RADIUS_KM
+    lat2 = math.asin(math.sin(lat1) * math.cos(angular) + math.cos(lat1) * math.sin(angular) * math.cos(bearing))
+    lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(angular) * math.cos(lat1), math.cos(angular) - math.sin(lat1) * math.sin(lat2))
+    y = math.sin(lon1 - lon2) * math.cos(lat1)
+    x = math.cos(lat2) * math.sin(lat1) - math.sin(lat2) * math.cos(lat1) * math.cos(lon1 - lon2)
+    final_track = (math.degrees(math.atan2(y, x)) + 180) % 360
+    return math.degrees(lat2), (math.degrees(lon2) + 540) % 360 - 180, final_track
+
+
+class SyntheticTraffic:
+    # Generates readsb-like traffic around a centre point: aircraft fly great
+    # circles, climb and descend between levels, and respawn once they leave
+    # radius_km. dropout_rate is the chance per aircraft per step of losing
+    # the signal for 5-60s (either vanishing or freezing the last fix with a
+    # growing seen_pos); bad_position_rate is the chance of one corrupt fix.
+    def __init__(self, centre_lat, centre_lon, count=200, radius_km=400, seed=1090, dropout_rate=0.002, bad_position_rate=0.001, now=0.0):
+        self.centre_lat = centre_lat
+        self.centre_lon = centre_lon
+        self.radius_km = radius_km
+        self.dropout_rate = dropout_rate
+        self.bad_position_rate = bad_position_rate
+        self.rng = random.Random(seed)
+        self.now = now
+        self.next_address = 0x400000 + self.rng.randrange(0x10000)
+        self.aircraft = [self._spawn() for _ in range(count)]
+
+    def _spawn(self):
+        rng = self.rng
+        distance = self.radius_km * math.sqrt(rng.random())
+        lat, lon, _ = great_circle_step(self.centre_lat, self.centre_lon, rng.uniform(0, 360), distance)
+        altitude = rng.randrange(2000, 41000, 100)
+        self.next_address = (self.next_address + rng.randrange(1, 4000)) & 0xFFFFFF
+        return {
+            'hex': f"{self.next_address:06x}",
+            'flight': f"{rng.choice(_AIRLINE_PREFIXES)}{rng.randrange(1, 9999)}",
+            'squawk': ''.join(str(rng.randrange(8)) for _ in range(4)),
+            'category': rng.choice(_CATEGORIES),
+            'lat': lat,
+            'lon': lon,
+            'track': rng.uniform(0, 360),
+            'altitude': float(altitude),
+            'target_altitude': float(rng.choice([altitude, rng.randrange(3000, 41000, 1000)])),
+            'baro_rate': 0,
+            'gs': 0.0,
+            'messages': rng.randrange(10, 500),
+            'last_fix_time': self.now,
+            'fix': (lat, lon),
+            'dropout_until': 0.0,
+            'hidden': False,
+            'rssi': rng.uniform(-30, -3),
+        }
+
+    def step(self, dt):
+        # Advance every aircraft by dt seconds
+        rng = self.rng
+        self.now += dt
+        for i, plane in enumerate(self.aircraft):
+            plane['gs'] = 180 + min(plane['altitude'], 36000) / 36000 * 300
+            plane['lat'], plane['lon'], plane['track'] = great_circle_step(plane['lat'], plane['lon'], plane['track'], plane['gs'] * KNOTS_TO_KMS * dt)
+
+            climb = plane['target_altitude'] - plane['altitude']
+            if abs(climb) < 50:
+                plane['altitude'] = plane['target_altitude']
+                plane['baro_rate'] = 0
+                if rng.random() < 0.002 * dt:
+                    plane['target_altitude'] = float(rng.randrange(3000, 41000, 1000))
+            else:
+                rate = math.copysign(rng.choice([1000, 1500, 2000, 2500]) if plane['baro_rate'] == 0 else abs(plane['baro_rate']), climb)
+                plane['baro_rate'] = int(rate)
+                plane['altitude'] += math.copysign(min(abs(climb), abs(rate) / 60 * dt), climb)
+
+            plane['messages'] += rng.randrange(2, 13) * max(1, int(dt))
+
+            if plane['dropout_until'] <= self.now and rng.random() < self.dropout_rate * dt:
+                plane['dropout_until'] = self.now + rng.uniform(5, 60)
+                plane['hidden'] = rng.random() < 0.5
+            if plane['dropout_until'] <= self.now:
+                plane['fix'] = (plane['lat'], plane['lon'])
+                plane['last_fix_time'] = self.now
+
+            if self._distance_from_centre(plane) > self.radius_km:
+                self.aircraft[i] = self._spawn()
+
+    def _distance_from_centre(self, plane):
+        dlat = math.radians(plane['lat'] - self.centre_lat)
+        dlon = math.radians(plane['lon'] - self.centre_lon)
+        a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(self.centre_lat)) * math.cos(math.radians(plane['lat'])) * math.sin(dlon / 2) ** 2
+        return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    def _reported_fix(self, plane):
+        lat, lon = plane['fix']
+        if plane['last_fix_time'] == self.now and self.rng.random() < self.bad_position_rate:
+            #Corrupt fix: a CPR-style jump of several degrees
+            lat += self.rng.choice([-1, 1]) * self.rng.uniform(2, 8)
+            lon += self.rng.choice([-1, 1]) * self.rng.uniform(2, 8)
+        return round(lat, 6), round(lon, 6)
+
+    def snapshot(self):
+        # aircraft.json-style snapshot of the current state
+        aircraft_list = []
+        for plane in self.aircraft:
+            if plane['hidden'] and plane['dropout_until'] > self.now:
+                continue
+            lat, lon = self._reported_fix(plane)
+            aircraft_list.append({
+                'hex': plane['hex'],
+                'type': 'adsb_icao',
+                'flight': f"{plane['flight']:<8}",
+                'alt_baro': int(round(plane['altitude'] / 25) * 25),
+                'alt_geom': int(round((plane['altitude'] + 300) / 25) * 25),
+                'gs': round(plane['gs'], 1),
+                'track': round(plane['track'], 2),
+                'baro_rate': plane['baro_rate'],
+                'squawk': plane['squawk'],
+                'emergency': 'none',
+                'category': plane['category'],
+                'lat': lat,
+                'lon': lon,
+                'nic': 8,
+                'rc': 186,
+                'seen_pos': round(self.now - plane['last_fix_time'], 1),
+                'version': 2,
+                'messages': plane['messages'],
+                'seen': 0.0 if plane['dropout_until'] <= self.now else round(self.now - plane['last_fix_time'], 1),
+                'rssi': round(plane['rssi'], 1),
+            })
+        return {'now': self.now, 'messages': sum(p['messages'] for p in self.aircraft), 'aircraft': aircraft_list}
+
+    def sbs_lines(self):
+        # SBS-1 MSG lines (identification, position, velocity) for aircraft with a fix this step
+        stamp = datetime.fromtimestamp(self.now)
+        date_text = stamp.strftime('%Y/%m/%d')
+        time_text = stamp.strftime('%H:%M:%S.%f')[:-3]
+        prefix_tail = f"1,{date_text},{time_text},{date_text},{time_text}"
+        lines = []
+        for plane in self.aircraft:
+            if plane['last_fix_time'] != self.now:
+                continue
+            hex_code = plane['hex'].upper()
+            lat, lon = self._reported_fix(plane)
+            if self.rng.random() < 0.1:
+                lines.append(f"MSG,1,1,1,{hex_code},{prefix_tail},{plane['flight']},,,,,,,,,,,")
+            lines.append(f"MSG,3,1,1,{hex_code},{prefix_tail},,{int(plane['altitude'])},,,{lat:.5f},{lon:.5f},,,0,,0,0")
+            lines.append(f"MSG,4,1,1,{hex_code},{prefix_tail},,,{plane['gs']:.1f},{plane['track']:.1f},,,{plane['baro_rate']},,,,,0")
+            if self.rng.random() < 0.05:
+                lines.append(f"MSG,6,1,1,{hex_code},{prefix_tail},,,,,,,,{plane['squawk']},0,0,0,0")
+        return lines
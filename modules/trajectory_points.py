@@ -0,0 +1,213 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+from .trajectory_store import TrajectoryStore
+
+# Per-day trail points next to the daily CSV, YYYY-MM-DD.points: an 8 byte
+# magic followed by fixed 20 byte records sorted by (icao, ts), so one
+# aircraft's trail is a contiguous slice found with searchsorted and a time
+# window is a vectorised mask. Files are memory-mapped for reading and only
+# ever replaced whole (temp file + rename).
+
+POINTS_MAGIC = b'PTPTS\x00\x01\x00'
+POINT_DTYPE = np.dtype([('icao', '<u4'), ('ts', '<f8'), ('lat', '<f4'), ('lon', '<f4')])
+_NON_ICAO_FLAG = 1 << 24
+
+
+def points_path(history_dir, day):
+    return os.path.join(history_dir, f'{day}.points')
+
+
+def encode_icao(icao):
+    # 24-bit address, readsb's '~' prefix for non-ICAO (TIS-B) addresses sets bit 24. None if not hex.
+    text = str(icao).strip().upper()
+    flag = 0
+    if text.startswith('~'):
+        text = text[1:]
+        flag = _NON_ICAO_FLAG
+    try:
+        value = int(text, 16)
+    except ValueError:
+        return None
+    if not text or value >= _NON_ICAO_FLAG:
+        return None
+    return value | flag
+
+
+def decode_icao(value):
+    value = int(value)
+    prefix = '~' if value & _NON_ICAO_FLAG else ''
+    return f"{prefix}{value & 0xFFFFFF:06X}"
+
+
+def timestamp_keys(timestamps):
+    # Integer microseconds, the same digits f"{ts:.6f}" writes: ts * 1e6 is
+    # itself rounded (to a quarter at today's epochs) so a product landing on
+    # exactly .5 is settled by the sign of its rounding error (Dekker's exact
+    # product), true ties round half to even like the formatting does
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    product = timestamps * 1e6
+    keys = np.rint(product)
+    halves = np.abs(product - keys) == 0.5
+    if halves.any():
+        values = timestamps[halves]
+        split = 134217729.0 * values
+        high = split - (split - values)
+        error = (high * 1e6 - product[halves]) + (values - high) * 1e6
+        keys[halves] = np.where(error > 0, np.ceil(product[halves]),
+                                np.where(error < 0, np.floor(product[halves]), keys[halves]))
+    return keys.astype(np.int64)
+
+
+def empty_points():
+    return np.empty(0, dtype=POINT_DTYPE)
+
+
+def points_from_lists(points_by_icao, scale=1):
+    # {icao: [(epoch, lat, lon), ...]} -> unsorted point array, unencodable
+    # icaos are dropped. scale is what the values were multiplied by, 1e6 for
+    # the journal's integer points.
+    total = sum(len(points) for points in points_by_icao.values())
+    array = np.empty(total, dtype=POINT_DTYPE)
+    filled = 0
+    for icao, points in points_by_icao.items():
+        code = encode_icao(icao)
+        if code is None or not points:
+            continue
+        count = len(points)
+        block = np.asarray(points, dtype=np.float64).reshape(count, 3)
+        if scale != 1:
+            block /= scale
+        array['icao'][filled:filled + count] = code
+        array['ts'][filled:filled + count] = block[:, 0]
+        array['lat'][filled:filled + count] = block[:, 1]
+        array['lon'][filled:filled + count] = block[:, 2]
+        filled += count
+    return array[:filled]
+
+
+def trail_array(icao, location_history):
+    # One aircraft's whole trail (spilled points included) as an unsorted
+    # point array, straight from a TrajectoryStore's buffers when it is one
+    code = encode_icao(icao)
+    if code is None or not location_history:
+        return empty_points()
+    if not isinstance(location_history, TrajectoryStore):
+        return points_from_lists({icao: history_points(location_history, datetime.now().strftime('%Y-%m-%d'))})
+    spilled = location_history.spilled_points()
+    array = np.empty(len(spilled) + len(location_history), dtype=POINT_DTYPE)
+    array['icao'] = code
+    if spilled:
+        block = np.asarray(spilled, dtype=np.float64)
+        array['ts'][:len(spilled)] = block[:, 0]
+        array['lat'][:len(spilled)] = block[:, 1]
+        array['lon'][:len(spilled)] = block[:, 2]
+    array['ts'][len(spilled):] = np.frombuffer(location_history.times, dtype=np.float64)
+    array['lat'][len(spilled):] = np.frombuffer(location_history.lats, dtype=np.float32)
+    array['lon'][len(spilled):] = np.frombuffer(location_history.lons, dtype=np.float32)
+    return array
+
+
+def sort_points(points):
+    # Sorted by (icao, ts) with one point per icao and microsecond, the last one given wins
+    if not len(points):
+        return empty_points()
+    keys = timestamp_keys(points['ts'])
+    order = np.lexsort((np.arange(len(points)), keys, points['icao']))
+    points = points[order]
+    keys = keys[order]
+    keep = np.ones(len(points), dtype=bool)
+    keep[:-1] = (points['icao'][1:] != points['icao'][:-1]) | (keys[1:] != keys[:-1])
+    return points[keep]
+
+
+def read_points(path):
+    # Memory-mapped sorted points, empty when the file is missing or unreadable
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            if f.read(len(POINTS_MAGIC)) != POINTS_MAGIC:
+                return empty_points()
+    except OSError:
+        return empty_points()
+    count = (size - len(POINTS_MAGIC)) // POINT_DTYPE.itemsize
+    if count <= 0:
+        return empty_points()
+    return np.memmap(path, dtype=POINT_DTYPE, mode='r', offset=len(POINTS_MAGIC), shape=(count,))
+
+
+def write_points(path, points):
+    # points must already be sorted (sort_points)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(POINTS_MAGIC)
+            np.ascontiguousarray(points, dtype=POINT_DTYPE).tofile(f)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def merge_points_file(path, new_points):
+    # Folds new (unsorted) points into the file, returns the number of points now stored
+    if not len(new_points):
+        return len(read_points(path))
+    merged = sort_points(np.concatenate([np.asarray(read_points(path)), new_points]))
+    write_points(path, merged)
+    return len(merged)
+
+
+def query_points(points, icao=None, start=None, end=None):
+    # One aircraft's slice (binary search) and/or start <= ts < end
+    if icao is not None:
+        code = encode_icao(icao)
+        if code is None:
+            return points[:0]
+        begin, stop = np.searchsorted(points['icao'], [code, code + 1])
+        points = points[begin:stop]
+    if start is not None or end is not None:
+        mask = np.ones(len(points), dtype=bool)
+        if start is not None:
+            mask &= points['ts'] >= start
+        if end is not None:
+            mask &= points['ts'] < end
+        points = points[mask]
+    return points
+
+
+def points_to_histories(points):
+    # {icao: {'epoch': [lat, lon]}} in the form location_history dicts use, for sorted points
+    histories = {}
+    if not len(points):
+        return histories
+    codes, starts = np.unique(points['icao'], return_index=True)
+    stops = list(starts[1:]) + [len(points)]
+    for code, begin, stop in zip(codes, starts, stops):
+        block = points[begin:stop]
+        histories[decode_icao(code)] = {
+            f"{timestamp:.6f}": [round(lat, 6), round(lon, 6)]
+            for timestamp, lat, lon in zip(block['ts'].tolist(), block['lat'].tolist(), block['lon'].tolist())
+        }
+    return histories
+
+
+def history_points(location_history, day):
+    # [(epoch, lat, lon)] from a location_history dict, old HH:MM:SS keys are placed on `day`
+    points = []
+    for time_key, coords in location_history.items():
+        if not isinstance(coords, (list, tuple)) or len(coords) < 2:
+            continue
+        try:
+            key_text = str(time_key)
+            if key_text.replace('.', '', 1).isdigit():
+                timestamp = float(key_text)
+            else:
+                sample_time = datetime.strptime(key_text, '%H:%M:%S').time()
+                timestamp = datetime.combine(datetime.strptime(day, '%Y-%m-%d').date(), sample_time).timestamp()
+            points.append((round(timestamp, 6), float(coords[0]), float(coords[1])))
+        except (ValueError, TypeError):
+            continue
+    return points
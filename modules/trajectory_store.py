@@ -0,0 +1,153 @@
+import os
+import struct
+from array import array
+
+TRAJECTORY_MAX_POINTS = 2048
+TRAJECTORY_SPILL_BATCH = 256
+_SPILL_RECORD = struct.Struct('<dff')
+
+
+class TrajectoryStore:
+    # Per-plane position history: float64 epoch times and float32 lat/lon in
+    # parallel arrays. They grow up to max_points and then wrap as a ring;
+    # each spill_batch block is appended to spill_path (when set) just before
+    # it gets overwritten, so memory per aircraft stays bounded.
+    def __init__(self, max_points=TRAJECTORY_MAX_POINTS, spill_path=None, spill_batch=TRAJECTORY_SPILL_BATCH):
+        self.spill_batch = max(1, min(spill_batch, max_points))
+        self.max_points = -(-max_points // self.spill_batch) * self.spill_batch
+        self.spill_path = spill_path
+        self.spilled_count = 0
+        self.start = 0
+        self.times = array('d')
+        self.lats = array('f')
+        self.lons = array('f')
+
+    def __len__(self):
+        return len(self.times)
+
+    def __bool__(self):
+        return len(self.times) > 0
+
+    def append(self, timestamp, lat, lon):
+        if len(self.times) < self.max_points:
+            self.times.append(timestamp)
+            self.lats.append(lat)
+            self.lons.append(lon)
+            return
+
+        if self.start % self.spill_batch == 0:
+            self._spill(self.start, self.start + self.spill_batch)
+        self.times[self.start] = timestamp
+        self.lats[self.start] = lat
+        self.lons[self.start] = lon
+        self.start = (self.start + 1) % self.max_points
+
+    def _spill(self, begin, end):
+        if not self.spill_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+            with open(self.spill_path, 'ab') as f:
+                f.write(b''.join(_SPILL_RECORD.pack(self.times[i], self.lats[i], self.lons[i]) for i in range(begin, end)))
+            self.spilled_count += end - begin
+        except OSError as e:
+            print(f"Trajectory spill error: {e}")
+
+    def points(self):
+        # In-memory points, oldest first, as (epoch, lat, lon)
+        order = list(range(self.start, len(self.times))) + list(range(self.start))
+        return [(self.times[i], self.lats[i], self.lons[i]) for i in order]
+
+    def _first_after(self, after):
+        # Ring offset of the oldest in-memory point newer than `after`, by bisection
+        count = len(self.times)
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[(self.start + middle) % count] > after:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def points_after(self, after):
+        # In-memory points newer than `after`, oldest first
+        count = len(self.times)
+        order = [(self.start + offset) % count for offset in range(self._first_after(after), count)]
+        return [(self.times[i], self.lats[i], self.lons[i]) for i in order]
+
+    def tail_after(self, after=None):
+        # Copies of the in-memory times, lats and lons newer than `after` (all
+        # of them when None), oldest first, sliced out of the ring without a
+        # tuple per point
+        count = len(self.times)
+        begin = self.start + (0 if after is None else self._first_after(after))
+        if begin < count:
+            return tuple(column[begin:] + column[:self.start] for column in (self.times, self.lats, self.lons))
+        return tuple(column[begin - count:self.start] for column in (self.times, self.lats, self.lons))
+
+    def spilled_points(self):
+        if not self.spill_path or not self.spilled_count:
+            return []
+        try:
+            with open(self.spill_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return []
+        #The newest spilled block is written before it is overwritten, skip what is still in memory
+        still_in_memory = (self.spill_batch - self.start % self.spill_batch) % self.spill_batch
+        usable = min(len(data) // _SPILL_RECORD.size, self.spilled_count - still_in_memory) * _SPILL_RECORD.size
+        return list(_SPILL_RECORD.iter_unpack(data[:max(0, usable)]))
+
+    def to_dict(self, include_spilled=False):
+        # The {"epoch": [lat, lon]} shape the flight history CSVs use
+        points = self.spilled_points() + self.points() if include_spilled else self.points()
+        return {f"{timestamp:.6f}": [round(lat, 6), round(lon, 6)] for timestamp, lat, lon in points}
+
+    def copy(self):
+        clone = TrajectoryStore.__new__(TrajectoryStore)
+        clone.__dict__.update(self.__dict__)
+        clone.times = array('d', self.times)
+        clone.lats = array('f', self.lats)
+        clone.lons = array('f', self.lons)
+        return clone
+
+    def spill_view(self):
+        # The spill state alone, detached: spilled_points() on it reads what had
+        # been spilled when it was taken, while the store itself keeps moving
+        view = TrajectoryStore.__new__(TrajectoryStore)
+        view.__dict__.update(self.__dict__)
+        view.times = array('d')
+        view.lats = array('f')
+        view.lons = array('f')
+        return view
+
+    def discard(self):
+        # Forget the spilled segments once the plane is no longer tracked
+        if self.spill_path:
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+        self.spilled_count = 0
+
+
+def trajectory_to_dict(location_history, include_spilled=True):
+    # Accepts both a TrajectoryStore and the legacy dict form
+    if isinstance(location_history, TrajectoryStore):
+        return location_history.to_dict(include_spilled)
+    if isinstance(location_history, dict):
+        return location_history
+    return {}
+
+
+def clear_spill_dir(spill_dir):
+    # Spill files only make sense for the run that wrote them
+    if not spill_dir or not os.path.isdir(spill_dir):
+        return
+    for entry_name in os.listdir(spill_dir):
+        if entry_name.endswith('.traj'):
+            try:
+                os.remove(os.path.join(spill_dir, entry_name))
+            except OSError:
+                pass
@@ -314,3 +314,30 @@ def draw_radar_heatmap(surface, radar_rect, hit_points, pygame_module):
         )
 
     surface.blit(heatmap_surface, radar_rect.topleft)
+
+
+def draw_metrics_overlay(surface, rect, metrics_snapshot, draw_text_module, text_font, pygame_module, line_height=12):
+    # Live p50/p99 for every timing histogram, then the gauges, over a translucent panel
+    overlay = pygame_module.Surface((rect.width, rect.height), pygame_module.SRCALPHA)
+    overlay.fill((0, 0, 0, 190))
+    surface.blit(overlay, rect.topleft)
+    pygame_module.draw.rect(surface, (100, 100, 100), rect, 1)
+
+    x = rect.left + 6
+    y = rect.top + 4
+    draw_text_module.normal(surface, f"{'TIMING ms':<24}{'p50':>8}{'p99':>8}{'max':>8}", text_font, (0, 255, 255), x, y)
+    y += line_height
+    for name, stats in metrics_snapshot.get('histograms', {}).items():
+        if y > rect.bottom - line_height:
+            return
+        name = name[:-3] if name.endswith('_ms') else name
+        draw_text_module.normal(surface, f"{name[:24]:<24}{stats['p50']:>8.2f}{stats['p99']:>8.2f}{stats['max']:>8.1f}", text_font, (255, 255, 255), x, y)
+        y += line_height
+
+    y += line_height // 2
+    for name, value in sorted(metrics_snapshot.get('gauges', {}).items()):
+        if y > rect.bottom - line_height:
+            return
+        value_text = f"{value:.2f}" if isinstance(value, float) else str(value)
+        draw_text_module.normal(surface, f"{name[:24]:<24}{value_text:>8}", text_font, (200, 200, 200), x, y)
+        y += line_height
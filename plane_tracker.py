@@ -1,3 +1,5 @@
+import argparse
+import atexit
 import json
 import socket
 import time
@@ -16,11 +18,33 @@ import os
 import threading
 import math
 import fcntl
+import resource
 import sys
 import subprocess
+import sqlite3
+import tempfile
+import numpy as np
 from collections import deque
 from concurrent.futures import ProcessPoolExecutor
 
+#Headless mode renders the real UI offscreen against a replay or synthetic feed for a fixed number of frames
+_arg_parser = argparse.ArgumentParser(description='ADS-B plane tracker')
+_arg_parser.add_argument('--headless', action='store_true', help='Render offscreen (SDL dummy driver) and exit after --frames')
+_arg_parser.add_argument('--frames', type=int, default=600, help='Frames to render in headless mode')
+_arg_parser.add_argument('--warmup', type=int, default=30, help='Frames left out of the headless timing summary')
+_arg_parser.add_argument('--source', choices=['synthetic', 'replay'], default='synthetic', help='Feed used in headless mode')
+_arg_parser.add_argument('--count', type=int, default=None, help='Synthetic aircraft count in headless mode (default syntheticCount)')
+_arg_parser.add_argument('--timings', default='logs/frame_timings.csv', help='Per-frame section timings, .csv or .json')
+_arg_parser.add_argument('--dump-frames', default=None, help='Directory to save rendered frames to as PNG')
+_arg_parser.add_argument('--dump-every', type=int, default=1, help='Save every Nth frame when --dump-frames is set')
+_arg_parser.add_argument('--scratch-dir', default=None, help='Where headless mode keeps history and spill files (default a temp dir)')
+_arg_parser.add_argument('--metrics', default=None, help='Write the metrics snapshot as JSON here when a headless run ends')
+_args = _arg_parser.parse_args()
+HEADLESS = _args.headless
+if HEADLESS:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
 _log_dir = Path("logs")
 _log_dir.mkdir(exist_ok=True)
 log = logging.getLogger("plane_tracker")
@@ -31,11 +55,38 @@ _log_handler = logging.handlers.RotatingFileHandler(
 _log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
 log.addHandler(_log_handler)
 
-from modules import draw_text, functions, airport_db
-from modules.data_utils import append_directional_hit, append_sample, clear_top_graph_history, load_today_heatmap_hits, load_top_graph_history, persist_top_graph_sample, prune_history, save_plane_to_csv, save_flight_history
-from modules.network_utils import can_retry_plane_api, check_network, fetch_plane_info, upload_to_firebase
+#Metrics snapshots go to their own file as one JSON object per line
+metrics_log = logging.getLogger("plane_tracker.metrics")
+metrics_log.setLevel(logging.INFO)
+metrics_log.propagate = False
+_metrics_handler = logging.handlers.RotatingFileHandler(
+    _log_dir / "metrics.jsonl", maxBytes=2 * 1024 * 1024, backupCount=3
+)
+_metrics_handler.setFormatter(logging.Formatter("%(message)s"))
+metrics_log.addHandler(_metrics_handler)
+
+from modules import draw_text, functions, airport_db, metrics
+from modules.aircraft_registry import AircraftRegistry
+from modules.beast_utils import beast_stream
+from modules.bincraft_utils import bincraft_changed_rows, bincraft_path_error, bincraft_planes, is_bincraft_path, load_bincraft_columns
+from modules.data_utils import STATS_CSV_PATH, aircraft_position_time, aircraft_update_key, append_directional_hit, append_sample, clear_top_graph_history, load_today_heatmap_hits, load_top_graph_history, persist_top_graph_sample, prune_history, readsb_file_signature
+from modules.flight_stats import FlightStatsAggregate
+from modules.frame_timing import FrameTimer
+from modules.history_db import HistoryDatabase, history_db_path, save_plane_to_db
+from modules.history_journal import FlightHistoryJournal, compact_flight_history, compact_pending_days, seal_journal
+from modules.icao_cache import IcaoCache
+from modules.enrichment import EnrichmentService
+from modules.network_utils import can_retry_plane_api, check_network, fetch_plane_info, make_http_session, upload_to_firebase
+from modules.providers import PROVIDERS, ProviderRouter
 from modules.rarity import build_model_counts, compute_ratings, get_rarity_colour, get_rarity_rating
-from modules.ui_utils import draw_altitude_filter, draw_filter_action_buttons, draw_line_graph, draw_polar_coverage_plot, draw_radar_heatmap, draw_rarity_filter, plane_matches_altitude_filter, plane_matches_distance_filter
+from modules.replay_utils import REPLAY_KIND_JSON, REPLAY_KIND_SBS, rebase_snapshot, replay_log
+from modules.sbs_utils import apply_sbs_message, parse_sbs_line, sbs_stream
+from modules.state_table import ENRICHMENT_FIELDS, AircraftStateTable, altitude_mask, distance_mask, haversine_km, project_xy
+from modules.stats_writer import StatsCsvWriter
+from modules.status_server import start_status_server
+from modules.synthetic_traffic import SyntheticTraffic
+from modules.trajectory_store import TrajectoryStore, clear_spill_dir
+from modules.ui_utils import draw_altitude_filter, draw_filter_action_buttons, draw_line_graph, draw_metrics_overlay, draw_polar_coverage_plot, draw_radar_heatmap, draw_rarity_filter
 
 def _read_cpu_temp():
     try:
@@ -72,16 +123,87 @@ _config = functions.load_config()
 _config.setdefault('cameraHost', '192.168.0.157')
 _config.setdefault('cameraPort', 12345)
 _config.setdefault('flightHistoryDir', './flight_history')
+_config.setdefault('adsbSource', 'json')
+_config.setdefault('adsbHost', '127.0.0.1')
+_config.setdefault('adsbPort', 30003)
+_config.setdefault('beastPort', 30005)
+_config.setdefault('readsbPath', '/run/readsb/aircraft.json')
+_config.setdefault('replayPath', './recordings/readsb.jsonl.gz')
+_config.setdefault('replaySpeed', 1)
+_config.setdefault('replayLoop', True)
+_config.setdefault('syntheticCount', 200)
+_config.setdefault('syntheticRadiusKm', 400)
+_config.setdefault('trajectoryMaxPoints', 2048)
+_config.setdefault('trajectorySpillDir', './trajectory_spill')
+_config.setdefault('historyCompactInterval', 900)
+_config.setdefault('historyBackend', 'csv')
+_config.setdefault('historyDb', '')
+_config.setdefault('icaoCachePath', './config/icao_cache.db')
+_config.setdefault('icaoCacheMaxAgeDays', 30)
+_config.setdefault('icaoCacheHotSize', 4096)
+_config.setdefault('icaoUnknownRecheckHours', 24)
+_config.setdefault('icaoUnknownMaxDays', 30)
+_config.setdefault('registryPath', './config/aircraft_registry.idx')
+_config.setdefault('enrichmentWorkers', 4)
+_config.setdefault('enrichmentProviders', ['hexdb', 'adsbdb'])
+_config.setdefault('enrichmentBurst', 10)
+_config.setdefault('enrichmentMaxPending', 500)
+_config.setdefault('statsCsvFlushInterval', 10)
+_config.setdefault('statsCsvFlushSize', 50)
+_config.setdefault('statsCsvMaxPending', 2000)
+_config.setdefault('metricsOverlay', False)
+_config.setdefault('metricsDumpInterval', 300)
+_config.setdefault('statusServer', False)
+_config.setdefault('statusHost', '127.0.0.1')
+_config.setdefault('statusPort', 8754)
+
+#Headless runs never touch the real history, spill files or APIs
+HEADLESS_SCRATCH_DIR = None
+if HEADLESS:
+    HEADLESS_SCRATCH_DIR = _args.scratch_dir or tempfile.mkdtemp(prefix='planetracker_headless_')
+    _config['adsbSource'] = _args.source
+    _config['offlineMode'] = True
+    _config['flightHistoryDir'] = os.path.join(HEADLESS_SCRATCH_DIR, 'flight_history')
+    _config['historyDb'] = ''
+    _config['icaoCachePath'] = os.path.join(HEADLESS_SCRATCH_DIR, 'icao_cache.db')
+    _config['trajectorySpillDir'] = os.path.join(HEADLESS_SCRATCH_DIR, 'trajectory_spill')
+    if _args.count is not None:
+        _config['syntheticCount'] = _args.count
 
 FLIGHT_HISTORY_DIR = _config['flightHistoryDir']
-model_counts = build_model_counts(FLIGHT_HISTORY_DIR)
+HISTORY_COMPACT_INTERVAL = float(_config['historyCompactInterval'])
+#csv: daily CSV + journal, sqlite: sightings/positions tables in one WAL database
+HISTORY_BACKEND = str(_config['historyBackend']).lower()
+HISTORY_DB_PATH = (_config['historyDb'] or history_db_path(FLIGHT_HISTORY_DIR)) if HISTORY_BACKEND == 'sqlite' else None
+#Enriched planes for stats_history/stats.csv are batched by one background writer
+stats_csv_writer = None if HISTORY_DB_PATH else StatsCsvWriter(
+    csv_path=os.path.join(HEADLESS_SCRATCH_DIR, 'stats_history', 'stats.csv') if HEADLESS else STATS_CSV_PATH,
+    flush_interval=float(_config['statsCsvFlushInterval']),
+    flush_size=int(_config['statsCsvFlushSize']),
+    max_pending=int(_config['statsCsvMaxPending']),
+    registry=metrics.registry,
+)
+model_counts = build_model_counts(FLIGHT_HISTORY_DIR, HISTORY_DB_PATH)
 model_ratings = compute_ratings(model_counts)
 
 CAMERA_SERVER = (_config['cameraHost'], int(_config['cameraPort']))
-READSB_JSON_PATH = "/run/readsb/aircraft.json"
+READSB_JSON_PATH = _config['readsbPath']
+ADSB_SOURCE = str(_config['adsbSource']).lower()
+#Caught here rather than as an ImportError on every poll of the ingest loop
+_readsb_path_error = bincraft_path_error(READSB_JSON_PATH) if ADSB_SOURCE == 'json' else None
+if _readsb_path_error:
+    log.error(f"readsbPath {READSB_JSON_PATH}: {_readsb_path_error}")
+    print(f"readsbPath {READSB_JSON_PATH}: {_readsb_path_error}", file=sys.stderr)
+    sys.exit(1)
+ADSB_SERVER = (_config['adsbHost'], int(_config['adsbPort']))
+BEAST_SERVER = (_config['adsbHost'], int(_config['beastPort']))
+REPLAY_PATH = _config['replayPath']
+TRAJECTORY_MAX_POINTS = int(_config['trajectoryMaxPoints'])
+TRAJECTORY_SPILL_DIR = _config['trajectorySpillDir']
+clear_spill_dir(TRAJECTORY_SPILL_DIR)
 
 #Initialize Firebase
-if not firebase_admin._apps:
+if not HEADLESS and not firebase_admin._apps:
     cred = credentials.Certificate("./config/firebase.json")
     firebase_admin.initialize_app(cred, {
         "databaseURL": "https://rpi-flight-tracker-default-rtdb.europe-west1.firebasedatabase.app"
@@ -89,14 +211,20 @@ if not firebase_admin._apps:
 
 #Global variables
 offline = _config['offlineMode']
-active_planes = {}
-displayed_planes = {}
+active_planes = AircraftStateTable()
+published_planes = {"version": 0, "revision": -1, "planes": {}, "revisions": {}, "lat": np.empty(0), "lon": np.empty(0), "altitude": np.empty(0)}
+_ui_snapshot = published_planes
+_ui_distances = np.empty(0)
+_ui_distance_key = None
+_ui_view = {}
+_ui_view_key = None
 is_receiving = False
 is_processing = False
 network_available = True
 message_queue = []
 tracker_running = True
 display_duration = 30
+STREAM_PUBLISH_INTERVAL = 0.1
 fade_duration = 10
 
 #Per-plane API retry tracking
@@ -107,8 +235,8 @@ TRACKER_PREDICTION_SECONDS = 1.2
 TRACKER_MAX_EXTRAPOLATION_SECONDS = 2.0
 TRACKER_MAX_SAMPLE_AGE_SECONDS = 5.0
 
-#Thread lock for shared data
-data_lock = threading.Lock()
+#Thread lock for shared data, wait and hold times go into the metrics registry
+data_lock = metrics.TimedLock("data_lock", metrics.registry)
 tracker_request_lock = threading.Lock()
 
 #Graph history settings
@@ -119,7 +247,7 @@ PLANE_ALTITUDE_SAMPLE_INTERVAL = 0
 PLANE_HIT_SAMPLE_INTERVAL = 60
 DIRECTIONAL_HISTORY_SECONDS = 24 * 60 * 60
 DIRECTIONAL_SECTOR_COUNT = 8
-TOP_GRAPH_HISTORY_DIR = "stats_history"
+TOP_GRAPH_HISTORY_DIR = os.path.join(HEADLESS_SCRATCH_DIR, "stats_history") if HEADLESS else "stats_history"
 TRACKER_IMAGE_DIR = Path("images")
 #Rolling graph data
 active_count_history = deque()
@@ -154,7 +282,7 @@ pygame.init()
 
 width = _config['screenWidth']
 height = _config['screenHeight']
-window = pygame.display.set_mode((width, height), pygame.FULLSCREEN)
+window = pygame.display.set_mode((width, height), 0 if HEADLESS else pygame.FULLSCREEN)
 
 #Fonts
 text_font1 = pygame.font.Font(os.path.join("textures", "fonts", "NaturalMono-Bold.ttf"), 16)
@@ -225,6 +353,8 @@ clear_graph_rect = pygame.Rect(toolbar_start_x + (btn_w + btn_gap) * 6, height -
 
 #Global for plane selection
 selected_plane_icao = None
+#Closest displayed plane, looked up first by the enrichment workers
+closest_plane_icao = None
 plane_rects = {} 
 altitude_filter_threshold = 0
 altitude_filter_above = True
@@ -235,6 +365,8 @@ distance_filter_dragging = False
 rarity_filter_selected = set()
 radar_heatmap_enabled = False
 hide_planes_mode = 0
+metrics_overlay_enabled = bool(_config['metricsOverlay'])
+METRICS_DUMP_INTERVAL = float(_config['metricsDumpInterval'])
 distance_unit = "NM"
 tracker_status_connected = False
 tracker_device_stats = {"temp": None, "ram": None, "cpu": None, "disk": None}
@@ -260,11 +392,22 @@ AUTO_TRACK_POLYGON_KEYS = (("tlLat", "tlLon"), ("trLat", "trLon"), ("brLat", "br
 AUTO_TRACK_CONFIGURED = all(_config.get(lat_key) is not None and _config.get(lon_key) is not None for lat_key, lon_key in AUTO_TRACK_POLYGON_KEYS)
 instance_lock_file = None
 
-ICAO_CACHE_PATH = './config/icao_cache.json'
-ICAO_CACHE_MAX_AGE_DAYS = 30
-icao_cache = {}
-api_pending = set()
+#hexdb results across sessions, the old JSON cache is imported on first start
+icao_cache = IcaoCache(
+    _config['icaoCachePath'],
+    max_age_days=float(_config['icaoCacheMaxAgeDays']),
+    hot_size=int(_config['icaoCacheHotSize']),
+    legacy_json_path=None if HEADLESS else './config/icao_cache.json',
+    registry=metrics.registry,
+    unknown_recheck={'not_found': (float(_config['icaoUnknownRecheckHours']) * 3600, float(_config['icaoUnknownMaxDays']) * 86400)},
+)
+#Today's flight stats, updated as planes are seen and enriched
+flight_stats = FlightStatsAggregate(_config['myLat'], _config['myLon'])
+#Offline registry dump (scripts/import_registry.py), picked up again when the file is replaced
+aircraft_registry = AircraftRegistry(_config['registryPath'], registry=metrics.registry)
+#Appended by the enrichment workers, pruned by the status readers
 api_request_timestamps = deque()
+api_request_lock = threading.Lock()
 _recent_message_times = {}
 _DEDUP_WINDOW_SECONDS = 120
 API_RATE_LIMIT_WINDOW = 300
@@ -274,37 +417,11 @@ API_RATE_LIMIT_MAX = 900
 def get_api_request_count_5min(now=None):
     now = now or time.time()
     cutoff = now - API_RATE_LIMIT_WINDOW
-    while api_request_timestamps and api_request_timestamps[0] < cutoff:
-        api_request_timestamps.popleft()
-    return len(api_request_timestamps)
-
-
-def load_icao_cache():
-    global icao_cache
-    try:
-        if os.path.exists(ICAO_CACHE_PATH):
-            with open(ICAO_CACHE_PATH, 'r') as f:
-                icao_cache = json.load(f)
-            log.info(f"Loaded {len(icao_cache)} entries from ICAO cache")
-    except Exception as e:
-        log.warning(f"Could not load ICAO cache: {e}")
-        icao_cache = {}
-
+    with api_request_lock:
+        while api_request_timestamps and api_request_timestamps[0] < cutoff:
+            api_request_timestamps.popleft()
+        return len(api_request_timestamps)
 
-def save_icao_cache_entry(icao, data):
-    entry = {k: data[k] for k in ('manufacturer', 'model', 'owner', 'registration') if k in data}
-    entry['cached_at'] = time.time()
-    icao_cache[icao] = entry
-    try:
-        tmp = ICAO_CACHE_PATH + '.tmp'
-        with open(tmp, 'w') as f:
-            json.dump(icao_cache, f)
-        os.replace(tmp, ICAO_CACHE_PATH)
-    except Exception as e:
-        log.warning(f"Could not save ICAO cache: {e}")
-
-
-load_icao_cache()
 
 def acquire_instance_lock():
     global instance_lock_file
@@ -318,7 +435,9 @@ def acquire_instance_lock():
         log.error('Another plane_tracker.py instance is already running')
         sys.exit(1)
 
-acquire_instance_lock()
+#A headless benchmark can run next to the live tracker
+if not HEADLESS:
+    acquire_instance_lock()
 
 def add_message(message):
     body = " ".join(str(message).split())
@@ -358,8 +477,8 @@ def clone_plane_data_for_ui(plane_data):
     snapshot = dict(plane_data)
 
     location_history = plane_data.get("location_history")
-    if isinstance(location_history, dict):
-        snapshot["location_history"] = dict(location_history)
+    if isinstance(location_history, TrajectoryStore):
+        snapshot["location_history"] = location_history.copy()
 
     altitude_history = plane_data.get("altitude_history")
     if isinstance(altitude_history, deque):
@@ -372,15 +491,78 @@ def clone_plane_data_for_ui(plane_data):
     return snapshot
 
 
-def snapshot_displayed_planes():
+def publish_displayed_planes():
+    #Ingest side: build the next UI snapshot and swap it in with a single assignment.
+    #Published copies are never touched by ingest again, planes whose revision hasn't moved reuse the previous copy
+    global published_planes
+    previous = published_planes
+    started = time.perf_counter()
     with data_lock:
-        return {
-            icao: {
-                "plane_data": clone_plane_data_for_ui(display_data.get("plane_data", {})),
-                "display_until": display_data.get("display_until", 0),
-            }
-            for icao, display_data in displayed_planes.items()
+        slots = active_planes.displayed_slots(time.time())
+        if active_planes.revision == previous["revision"] and len(slots) == len(previous["planes"]):
+            return previous
+        planes = {}
+        revisions = {}
+        for slot in slots.tolist():
+            icao = active_planes.icaos[slot]
+            revision = int(active_planes.revisions[slot])
+            if previous["revisions"].get(icao) == revision:
+                planes[icao] = previous["planes"][icao]
+            else:
+                planes[icao] = {
+                    "plane_data": clone_plane_data_for_ui(active_planes.records[slot]),
+                    "display_until": float(active_planes.display_until[slot]),
+                }
+            revisions[icao] = revision
+        snapshot = {
+            "version": previous["version"] + 1,
+            "revision": active_planes.revision,
+            "planes": planes,
+            "revisions": revisions,
+            "lat": active_planes.lat[slots],
+            "lon": active_planes.lon[slots],
+            "altitude": active_planes.altitude[slots],
         }
+        metrics.set_gauge("planes_active", len(active_planes))
+    published_planes = snapshot
+    metrics.set_gauge("planes_displayed", len(planes))
+    metrics.observe("publish_ms", (time.perf_counter() - started) * 1000)
+    return snapshot
+
+
+def read_published_planes(view_lat, view_lon):
+    #UI side: no lock and no copy, distances are only recomputed when the version or the view centre moves
+    global _ui_snapshot, _ui_distances, _ui_distance_key
+    snapshot = published_planes
+    distance_key = (snapshot["version"], view_lat, view_lon)
+    if distance_key != _ui_distance_key:
+        _ui_distances = haversine_km(view_lat, view_lon, snapshot["lat"], snapshot["lon"])
+        for display_data, distance in zip(snapshot["planes"].values(), _ui_distances.tolist()):
+            display_data["plane_data"]["distance"] = distance
+        _ui_distance_key = distance_key
+    _ui_snapshot = snapshot
+    return snapshot["planes"]
+
+
+def read_plane_view(range_km, view_lat, view_lon, altitude_threshold, altitude_above, distance_threshold_km, distance_outside):
+    #UI side: the altitude and distance filters and screen positions of the snapshot last read, as array operations over
+    #its columns instead of per plane dict, redone only when it, the view or a filter changes.
+    #{icao: (x, y, distance)} of the planes passing both filters, x and y are None without a position.
+    global _ui_view, _ui_view_key
+    view_key = (_ui_distance_key, range_km, view_lat, view_lon, altitude_threshold, altitude_above, distance_threshold_km, distance_outside)
+    if view_key == _ui_view_key:
+        return _ui_view
+    snapshot = _ui_snapshot
+    keep = altitude_mask(snapshot["altitude"], altitude_threshold, altitude_above) & distance_mask(_ui_distances, distance_threshold_km, distance_outside)
+    placed = keep & np.isfinite(snapshot["lat"]) & np.isfinite(snapshot["lon"])
+    xs = np.zeros(len(keep), dtype=int)
+    ys = np.zeros(len(keep), dtype=int)
+    xs[placed], ys[placed] = project_xy(snapshot["lat"][placed], snapshot["lon"][placed], range_km, view_lat, view_lon, RADAR_CENTER_X, RADAR_CENTER_Y)
+    icaos = list(snapshot["planes"])
+    xs, ys, distances, placed = xs.tolist(), ys.tolist(), _ui_distances.tolist(), placed.tolist()
+    _ui_view = {icaos[i]: (xs[i], ys[i], distances[i]) if placed[i] else (None, None, distances[i]) for i in np.flatnonzero(keep).tolist()}
+    _ui_view_key = view_key
+    return _ui_view
 
 
 def prune_tracker_photo_cache_locked(preserve_icao=None):
@@ -412,50 +594,92 @@ def save_tracker_image(image_bytes, target_icao):
     output_path.write_bytes(image_bytes)
     return output_path
 
-#Helper thread for API fetches to avoid blocking the radar
-def api_worker_thread(icao, plane_data):
-    try:
+
+def plane_record_snapshot(plane_data):
+    #Detached copy for save_plane_record, taken under data_lock: ingest keeps appending to the live trail
+    snapshot = dict(plane_data)
+    if isinstance(snapshot.get("location_history"), TrajectoryStore):
+        snapshot["location_history"] = snapshot["location_history"].copy()
+    return snapshot
+
+
+def save_plane_record(icao, plane_data):
+    #Enriched planes go to stats_history/stats.csv, or the aircraft table with the SQLite backend.
+    #plane_data is a plane_record_snapshot, the CSV writer reads it later on its own thread
+    if HISTORY_DB_PATH:
+        save_plane_to_db(HISTORY_DB_PATH, icao, plane_data)
+    else:
+        stats_csv_writer.submit(icao, plane_data)
+
+#Keep-alive connections shared by the enrichment workers
+api_session = make_http_session(int(_config['enrichmentWorkers']))
+#Metadata providers, the fastest healthy one is asked first
+for _provider_name in _config['enrichmentProviders']:
+    if _provider_name not in PROVIDERS:
+        log.error(f"Unknown enrichment provider {_provider_name}, expected one of {', '.join(PROVIDERS)}")
+metadata_router = ProviderRouter([PROVIDERS[name]() for name in _config['enrichmentProviders'] if name in PROVIDERS] or [PROVIDERS['hexdb']()],
+                                 registry=metrics.registry)
+
+
+#One API lookup, run on an enrichment worker
+def enrich_plane(icao):
+    with api_request_lock:
         api_request_timestamps.append(time.time())
-        api_data = fetch_plane_info(icao)
-        if api_data is None:
-            # 404 - not in database, no point retrying
-            with data_lock:
-                if icao in active_planes:
+    metrics.inc("api_requests")
+    with metrics.timer("api_latency_ms"):
+        api_data = fetch_plane_info(icao, session=api_session, router=metadata_router)
+    if api_data is None:
+        # 404 - not in database, no point retrying until the re-check time
+        icao_cache.record_unknown(icao, 'not_found')
+        with data_lock:
+            if icao in active_planes:
+                active_planes[icao]['api_retries_exhausted'] = True
+    elif 'unavailable_until' in api_data:
+        # Every provider's circuit is open and nothing was asked, no retry is used up.
+        # Queued again once the first one lets a trial request through.
+        metrics.inc("api_unavailable")
+        with data_lock:
+            if icao in active_planes:
+                active_planes[icao]['api_unavailable_until'] = api_data['unavailable_until']
+    elif api_data.get('last_api_error'):
+        # Network/server error - increment retry count and stop after 3 total attempts
+        error_msg = api_data.get('api_error_msg', 'API error')
+        add_message(f"{error_msg}")
+        metrics.inc("api_errors")
+        with data_lock:
+            if icao in active_planes:
+                retry_count = active_planes[icao].get('api_retry_count', 0) + 1
+                active_planes[icao]['api_retry_count'] = retry_count
+                active_planes[icao]['last_api_error'] = api_data['last_api_error']
+                if retry_count >= 3:
                     active_planes[icao]['api_retries_exhausted'] = True
-        elif api_data.get('last_api_error'):
-            # Network/server error - increment retry count and stop after 3 total attempts
-            error_msg = api_data.get('api_error_msg', 'API error')
-            add_message(f"{error_msg}")
-            with data_lock:
-                if icao in active_planes:
-                    retry_count = active_planes[icao].get('api_retry_count', 0) + 1
-                    active_planes[icao]['api_retry_count'] = retry_count
-                    active_planes[icao]['last_api_error'] = api_data['last_api_error']
-                    if retry_count >= 3:
-                        active_planes[icao]['api_retries_exhausted'] = True
-                if icao in displayed_planes:
-                    displayed_planes[icao]['plane_data']['last_api_error'] = api_data['last_api_error']
-        else:
-            # Success
-            plane_snapshot = None
-            with data_lock:
-                if icao in active_planes:
-                    active_planes[icao].update(api_data)
-                    plane_snapshot = dict(active_planes[icao])
-                if icao in displayed_planes:
-                    displayed_planes[icao]["plane_data"].update(api_data)
-            if plane_snapshot and api_data.get("manufacturer") and api_data.get("manufacturer") != "-":
-                save_plane_to_csv(icao, plane_snapshot)
+                active_planes.touch(icao)
+            else:
+                retry_count = 0
+        if retry_count >= 3:
+            icao_cache.record_unknown(icao, 'error')
+    else:
+        # Success
+        plane_snapshot = None
+        with data_lock:
+            if icao in active_planes:
+                active_planes[icao].update(api_data)
+                active_planes.touch(icao)
+                plane_snapshot = plane_record_snapshot(active_planes[icao])
+        if plane_snapshot:
+            flight_stats.update(icao, plane_snapshot)
+        if plane_snapshot and api_data.get("manufacturer") and api_data.get("manufacturer") != "-":
+            with metrics.timer("stats_csv_save_ms"):
+                save_plane_record(icao, plane_snapshot)
+            with metrics.timer("firebase_upload_ms"):
                 upload_to_firebase(plane_snapshot)
-                save_icao_cache_entry(icao, api_data)
-                _model = api_data.get('model', '-')
-                if _model and _model != '-':
-                    model_counts[_model] = model_counts.get(_model, 0) + 1
-                    _new_ratings = compute_ratings(model_counts)
-                    model_ratings.clear()
-                    model_ratings.update(_new_ratings)
-    finally:
-        api_pending.discard(icao)
+            icao_cache.put(icao, api_data)
+            _model = api_data.get('model', '-')
+            if _model and _model != '-':
+                model_counts[_model] = model_counts.get(_model, 0) + 1
+                _new_ratings = compute_ratings(model_counts)
+                model_ratings.clear()
+                model_ratings.update(_new_ratings)
 
 
 _tracker_stats_link_ok = False
@@ -464,12 +688,14 @@ _tracker_stats_link_ok = False
 def fetch_tracker_stats(log_result=False):
     global tracker_device_stats, _tracker_stats_link_ok
     try:
+        started = time.perf_counter()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(3)
         sock.connect(CAMERA_SERVER)
         sock.sendall(b'stats')
         response = sock.recv(1024).decode().strip()
         sock.close()
+        metrics.observe("camera_stats_rtt_ms", (time.perf_counter() - started) * 1000)
 
         temp_text, ram_text, cpu_text, disk_text = response.split(',', 3)
         parsed_stats = {
@@ -650,6 +876,7 @@ def send_to_tracker(lat, lon, alt_ft, target_icao=None, add_message_callback=Non
     try:
         alt_m = alt_ft * 0.3048  # convert feet to meters
         logger(f'Sending position data to camera module at {CAMERA_SERVER[0]}:{CAMERA_SERVER[1]}')
+        capture_started = time.perf_counter()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(20)
         sock.connect(CAMERA_SERVER)
@@ -670,6 +897,7 @@ def send_to_tracker(lat, lon, alt_ft, target_icao=None, add_message_callback=Non
                     key, value = token.split('=', 1)
                     image_meta[key] = value
             image_bytes = receive_tracker_bytes(sock, image_size)
+            metrics.observe("camera_capture_ms", (time.perf_counter() - capture_started) * 1000)
             saved_image_path = None
             save_error = None
             try:
@@ -760,12 +988,11 @@ def begin_camera_tracking(target_icao, logger=None, auto_select=False):
                 logger('Camera module busy')
                 return False
 
-            display_data = displayed_planes.get(target_icao)
-            if not display_data:
+            plane_data = active_planes.get(target_icao)
+            if plane_data is None or not active_planes.is_displayed(target_icao, time.time()):
                 logger('No target plane available for tracking')
                 return False
 
-            plane_data = display_data.get('plane_data', {})
             predicted_target = predict_tracker_target(plane_data)
             if predicted_target is None:
                 logger('Target plane altitude unknown, cannot track')
@@ -779,7 +1006,7 @@ def begin_camera_tracking(target_icao, logger=None, auto_select=False):
 
         if auto_select:
             with data_lock:
-                _has_manual_selection = selected_plane_icao is not None and selected_plane_icao in displayed_planes
+                _has_manual_selection = selected_plane_icao is not None and active_planes.is_displayed(selected_plane_icao, time.time())
             if not _has_manual_selection:
                 selected_plane_icao = target_icao
 
@@ -821,6 +1048,183 @@ def build_auto_track_rect(range_km, centre_lat, centre_lon):
     rect_height = max(1, int(math.ceil(max(ys) - top)))
     return pygame.Rect(left, top, rect_width, rect_height)
 
+def enrichment_wanted(icao):
+    #Asked when a queued plane reaches a worker, it may have left or been identified meanwhile
+    with data_lock:
+        plane_data = active_planes.get(icao)
+        return (plane_data is not None and plane_data.get("manufacturer", "-") == "-" and not plane_data.get("api_retries_exhausted")
+                and not offline and network_available)
+
+
+def enrichment_priority(icao, plane_data):
+    #Selected or closest plane first, then planes inside the auto-track box, then the rest nearest first
+    if icao == selected_plane_icao or icao == closest_plane_icao:
+        tier = 0
+    elif icao in auto_track_inside_icaos:
+        tier = 1
+    else:
+        tier = 2
+    return (tier, functions.calculate_distance(_config['myLat'], _config['myLon'], plane_data["lat"], plane_data["lon"]))
+
+
+def ingest_aircraft(aircraft, snapshot_now=None):
+    #Merge one readsb-style aircraft dict into the shared plane state
+    plane_data = functions.parse_aircraft(aircraft)
+    if not plane_data or plane_data["lon"] == "-" or plane_data["lat"] == "-":
+        return
+    ingest_plane(plane_data, aircraft_position_time(aircraft, snapshot_now) or time.time())
+
+
+def ingest_plane(plane_data, position_time):
+    #Merge one parsed plane (parse_aircraft's fields, with a position) into the shared plane state
+    icao = plane_data['icao']
+    effective_offline = offline or not network_available
+
+    is_new_plane = False
+    with data_lock:
+        cached = active_planes.get(icao)
+        #readsb repeats the last fix with a growing seen_pos until a new one arrives, only new fixes are recorded
+        #(seen_pos is rounded to 0.1s so the same fix can drift by that much between snapshots)
+        fresh_position = cached is None or position_time > cached.get("last_position_time", 0) + 0.1
+        if cached is not None:
+            if fresh_position and "last_lat" in cached:
+                cached["prev_lat"] = cached["last_lat"]
+                cached["prev_lon"] = cached["last_lon"]
+                cached["prev_update_time"] = cached.get("last_update_time")
+                cached["prev_altitude"] = cached.get("altitude")
+
+            #Merge into the cached plane in place so enrichment and histories carry over without copying,
+            #last_update_time stays at the time of the last fix
+            for field, value in plane_data.items():
+                if field not in ENRICHMENT_FIELDS and field != "last_update_time":
+                    cached[field] = value
+            plane_data = cached
+        else:
+            is_new_plane = True
+            plane_data["last_api_error"] = 0
+            plane_data["api_retry_count"] = 0
+            plane_data["api_retries_exhausted"] = False
+            plane_data["location_history"] = TrajectoryStore(TRAJECTORY_MAX_POINTS, os.path.join(TRAJECTORY_SPILL_DIR, f"{icao}.traj"))
+            plane_data["altitude_history"] = deque()
+            plane_data["hit_history"] = deque()
+            plane_data["last_hit_bucket"] = None
+            plane_data["last_hit_count"] = 0
+            plane_data["total_hit_count"] = 0
+
+        current_epoch = time.time()
+        if fresh_position:
+            plane_data["last_lat"] = float(plane_data["lat"])
+            plane_data["last_lon"] = float(plane_data["lon"])
+            plane_data["last_position_time"] = position_time
+            plane_data["last_update_time"] = position_time
+            plane_data["history_timestamp"] = f"{position_time:.6f}"
+            bearing = functions.calculate_bearing(_config['myLat'], _config['myLon'], plane_data["last_lat"], plane_data["last_lon"])
+            append_directional_hit(directional_hit_history, bearing, PLANE_HIT_SAMPLE_INTERVAL, DIRECTIONAL_SECTOR_COUNT, position_time)
+            prune_history(directional_hit_history, DIRECTIONAL_HISTORY_SECONDS, current_epoch)
+            heatmap_hits.append((position_time, plane_data["last_lat"], plane_data["last_lon"]))
+            prune_history(heatmap_hits, DIRECTIONAL_HISTORY_SECONDS, current_epoch)
+            #Build location_history for ALL planes (not just ones with API data)
+            plane_data["location_history"].append(position_time, plane_data["last_lat"], plane_data["last_lon"])
+
+        altitude_value = plane_data.get("altitude")
+        if altitude_value not in (None, "-"):
+            try:
+                altitude_value = float(altitude_value)
+                append_sample(plane_data["altitude_history"], altitude_value, PLANE_ALTITUDE_SAMPLE_INTERVAL, current_epoch)
+                prune_history(plane_data["altitude_history"], PLANE_GRAPH_HISTORY_SECONDS, current_epoch)
+            except (TypeError, ValueError):
+                pass
+
+        if fresh_position:
+            hit_bucket = int(position_time // PLANE_HIT_SAMPLE_INTERVAL) * PLANE_HIT_SAMPLE_INTERVAL
+            if plane_data.get("last_hit_bucket") == hit_bucket:
+                plane_data["last_hit_count"] += 1
+                if plane_data["hit_history"] and plane_data["hit_history"][-1][0] == hit_bucket:
+                    plane_data["hit_history"][-1] = (hit_bucket, plane_data["last_hit_count"])
+                else:
+                    plane_data["hit_history"].append((hit_bucket, plane_data["last_hit_count"]))
+            else:
+                plane_data["last_hit_bucket"] = hit_bucket
+                plane_data["last_hit_count"] = 1
+            plane_data["total_hit_count"] = plane_data.get("total_hit_count", 0) + 1
+        prune_history(plane_data["hit_history"], PLANE_GRAPH_HISTORY_SECONDS, current_epoch)
+
+        active_planes.upsert(icao, plane_data, time.time() + display_duration)
+        #Under the lock, enrichment writes owner/model into this same dict
+        flight_stats.update(icao, plane_data)
+
+    if is_new_plane:
+        cache_entry = icao_cache.get(icao)
+        #Then the offline registry, hexdb is only asked about aircraft in neither
+        if not cache_entry:
+            cache_entry = aircraft_registry.lookup(icao)
+        #Known to hexdb as missing (or failing) since an earlier sighting, not asked again before its re-check time
+        if not cache_entry and icao_cache.unknown_until(icao):
+            with data_lock:
+                plane_data["api_retries_exhausted"] = True
+        if cache_entry:
+            with data_lock:
+                for field in ('manufacturer', 'model', 'owner', 'registration', 'icao_type_code'):
+                    if field in cache_entry:
+                        plane_data[field] = cache_entry[field]
+                active_planes.touch(icao)
+                flight_stats.update(icao, plane_data)
+                plane_snapshot = plane_record_snapshot(plane_data)
+            if plane_snapshot.get('manufacturer', '-') != '-' and plane_snapshot.get('owner', '-') != '-':
+                save_plane_record(icao, plane_snapshot)
+        add_message(f"NEW plane {icao}")
+
+    #Queued again on later snapshots, which only raises its priority while it waits
+    if not effective_offline and plane_data["manufacturer"] == "-" and not plane_data.get("api_retries_exhausted") and can_retry_plane_api(plane_data, PLANE_API_RETRY_DELAY):
+        enrichment.submit(icao, enrichment_priority(icao, plane_data))
+
+
+def ingest_readsb_snapshot(data, update_keys):
+    #Ingest one aircraft.json snapshot and publish it, returns the update keys to pass in with the next snapshot
+    started = time.perf_counter()
+    snapshot_now = data.get("now")
+    aircraft_list = data.get("aircraft", [])
+
+    #Only aircraft whose readsb counters moved since the last snapshot are re-processed
+    next_update_keys = {}
+    ingested = 0
+    for aircraft in aircraft_list:
+        update_key = aircraft_update_key(aircraft, snapshot_now)
+        hex_code = aircraft.get("hex")
+        next_update_keys[hex_code] = update_key
+        if update_key is not None and update_keys.get(hex_code) == update_key:
+            continue
+        ingest_aircraft(aircraft, snapshot_now)
+        ingested += 1
+    publish_displayed_planes()
+    record_snapshot_metrics(started, snapshot_now, len(aircraft_list), ingested)
+    return next_update_keys
+
+
+def ingest_bincraft_snapshot(snapshot_now, columns, update_keys):
+    #binCraft counterpart of ingest_readsb_snapshot: the changed rows are picked from the decoded columns
+    #and built into plane dicts directly, without aircraft.json dicts or parse_aircraft in between
+    started = time.perf_counter()
+    rows, next_update_keys = bincraft_changed_rows(snapshot_now, columns, update_keys)
+    planes, position_times = bincraft_planes(snapshot_now, columns, rows)
+    for plane_data, position_time in zip(planes, position_times):
+        ingest_plane(plane_data, position_time)
+    publish_displayed_planes()
+    record_snapshot_metrics(started, snapshot_now, len(columns['hex']), len(planes))
+    return next_update_keys
+
+
+def record_snapshot_metrics(started, snapshot_now, aircraft_count, ingested):
+    #How far behind readsb's clock the ingest runs, replay and synthetic snapshots are rebased to wall time
+    if snapshot_now is not None:
+        metrics.set_gauge("ingest_lag_seconds", round(time.time() - float(snapshot_now), 3))
+    metrics.inc("snapshots_ingested")
+    metrics.inc("aircraft_ingested", ingested)
+    metrics.set_gauge("aircraft_per_poll", aircraft_count)
+    metrics.set_gauge("aircraft_changed_per_poll", ingested)
+    metrics.observe("ingest_snapshot_ms", (time.perf_counter() - started) * 1000)
+
+
 #THREAD 2: ADSB Data Processing
 def adsb_processing_thread():
     global is_receiving, is_processing, tracker_running, offline, network_available
@@ -829,14 +1233,29 @@ def adsb_processing_thread():
     last_network_check = time.time()
     last_flight_history_save = time.time()
     readsb_connected = False
+    readsb_signature = None
+    readsb_snapshot_now = None
+    readsb_update_keys = {}
 
     #Heavy CSV/pandas work runs in a subprocess so it can't stall the render loop via the GIL
     bg_pool = ProcessPoolExecutor(max_workers=1)
-    flight_history_future = None
-    stats_future = None
+
+    #Flight history is appended to a journal every minute and folded into the daily CSV in the pool.
+    #Journals left by earlier runs are compacted first. The SQLite backend upserts instead and has nothing to compact.
+    if HISTORY_DB_PATH:
+        history_journal = HistoryDatabase(HISTORY_DB_PATH)
+        compaction_future = None
+    else:
+        history_journal = FlightHistoryJournal(FLIGHT_HISTORY_DIR)
+        compaction_future = bg_pool.submit(compact_pending_days, FLIGHT_HISTORY_DIR)
+    compaction_started = time.perf_counter()
+    compaction_days = []
+    last_history_compaction = time.time()
+    last_metrics_dump = time.time()
 
     while tracker_running:
         current_time = time.time()
+        iteration_started = time.perf_counter()
 
         #Check network every 30 seconds
         if current_time - last_network_check > 30:
@@ -846,181 +1265,105 @@ def adsb_processing_thread():
             last_network_check = current_time
 
         is_receiving = True
-        try:
-            with open(READSB_JSON_PATH, "r") as f:
-                data = json.load(f)
-
-            if not readsb_connected:
-                add_message(f"Connected to readsb at {READSB_JSON_PATH}")
-                readsb_connected = True
-
-            aircraft_list = data.get("aircraft", [])
-            current_api_count = get_api_request_count_5min()
-
-            for aircraft in aircraft_list:
-                plane_data = functions.parse_aircraft(aircraft)
-                if not plane_data or plane_data["lon"] == "-" or plane_data["lat"] == "-":
-                    continue
-
-                icao = plane_data['icao']
-                effective_offline = offline or not network_available
-
-                is_new_plane = False
-                with data_lock:
-                    if icao in active_planes:
-                        cached = active_planes[icao]
-                        plane_data["manufacturer"] = cached.get("manufacturer", "-")
-                        plane_data["registration"] = cached.get("registration", "-")
-                        plane_data["owner"] = cached.get("owner", "-")
-                        plane_data["model"] = cached.get("model", "-")
-                        plane_data["last_api_error"] = cached.get("last_api_error", 0)
-                        plane_data["api_retry_count"] = cached.get("api_retry_count", 0)
-                        plane_data["api_retries_exhausted"] = cached.get("api_retries_exhausted", False)
-                        if "last_lat" in cached:
-                            plane_data["prev_lat"] = cached["last_lat"]
-                            plane_data["prev_lon"] = cached["last_lon"]
-                            plane_data["prev_update_time"] = cached.get("last_update_time")
-                            plane_data["prev_altitude"] = cached.get("altitude")
-
-                        #Preserve existing location_history
-                        plane_data["location_history"] = cached.get("location_history", {})
-                        plane_data["altitude_history"] = cached.get("altitude_history", deque())
-                        plane_data["hit_history"] = cached.get("hit_history", deque())
-                        plane_data["last_hit_bucket"] = cached.get("last_hit_bucket")
-                        plane_data["last_hit_bucket"] = cached.get("last_hit_bucket")
-                        plane_data["last_hit_count"] = cached.get("last_hit_count", 0)
-                        plane_data["total_hit_count"] = cached.get("total_hit_count", 0)
+        #Streaming sources feed ingest_aircraft from their own thread, this loop only does housekeeping
+        if ADSB_SOURCE == 'json':
+            try:
+                #Skip the parse entirely when readsb hasn't rewritten the file since the last poll
+                signature = readsb_file_signature(READSB_JSON_PATH)
+                if signature != readsb_signature:
+                    #readsb's compact binCraft snapshot decodes in bulk into columns instead of going through json
+                    load_started = time.perf_counter()
+                    if is_bincraft_path(READSB_JSON_PATH):
+                        snapshot_now, bincraft_columns = load_bincraft_columns(READSB_JSON_PATH)
                     else:
-                        is_new_plane = True
-                        plane_data["manufacturer"] = "-"
-                        plane_data["registration"] = "-"
-                        plane_data["owner"] = "-"
-                        plane_data["model"] = "-"
-                        plane_data["last_api_error"] = 0
-                        plane_data["api_retry_count"] = 0
-                        plane_data["api_retries_exhausted"] = False
-                        plane_data["location_history"] = {}
-                        plane_data["altitude_history"] = deque()
-                        plane_data["hit_history"] = deque()
-                        plane_data["last_hit_bucket"] = None
-                        plane_data["last_hit_count"] = 0
-                        plane_data["total_hit_count"] = 0
-                    plane_data["last_lat"] = float(plane_data["lat"])
-                    plane_data["last_lon"] = float(plane_data["lon"])
-                    plane_data["last_update_time"] = time.time()
-                    current_timestamp = plane_data.get("spotted_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    current_epoch = time.time()
-                    history_timestamp = f"{current_epoch:.6f}"
-                    plane_data["history_timestamp"] = history_timestamp
-                    bearing = functions.calculate_bearing(_config['myLat'], _config['myLon'], plane_data["last_lat"], plane_data["last_lon"])
-                    append_directional_hit(directional_hit_history, bearing, PLANE_HIT_SAMPLE_INTERVAL, DIRECTIONAL_SECTOR_COUNT, current_epoch)
-                    prune_history(directional_hit_history, DIRECTIONAL_HISTORY_SECONDS, current_epoch)
-                    heatmap_hits.append((current_epoch, plane_data["last_lat"], plane_data["last_lon"]))
-                    prune_history(heatmap_hits, DIRECTIONAL_HISTORY_SECONDS, current_epoch)
-                    #Build location_history for ALL planes (not just ones with API data)
-                    if plane_data["lat"] != "-" and plane_data["lon"] != "-":
-                        plane_data["location_history"][history_timestamp] = [float(plane_data["lat"]), float(plane_data["lon"])]
-
-                    altitude_value = plane_data.get("altitude")
-                    if altitude_value not in (None, "-"):
-                        try:
-                            altitude_value = float(altitude_value)
-                            append_sample(plane_data["altitude_history"], altitude_value, PLANE_ALTITUDE_SAMPLE_INTERVAL, current_epoch)
-                            prune_history(plane_data["altitude_history"], PLANE_GRAPH_HISTORY_SECONDS, current_epoch)
-                        except (TypeError, ValueError):
-                            pass
-
-                    hit_bucket = int(current_epoch // PLANE_HIT_SAMPLE_INTERVAL) * PLANE_HIT_SAMPLE_INTERVAL
-                    if plane_data.get("last_hit_bucket") == hit_bucket:
-                        plane_data["last_hit_count"] += 1
-                        if plane_data["hit_history"] and plane_data["hit_history"][-1][0] == hit_bucket:
-                            plane_data["hit_history"][-1] = (hit_bucket, plane_data["last_hit_count"])
+                        with open(READSB_JSON_PATH, "r") as f:
+                            data = json.load(f)
+                        snapshot_now = data.get("now")
+                    metrics.observe("readsb_load_ms", (time.perf_counter() - load_started) * 1000)
+                    readsb_signature = signature
+
+                    if not readsb_connected:
+                        add_message(f"Connected to readsb at {READSB_JSON_PATH}")
+                        readsb_connected = True
+
+                    if snapshot_now is None or snapshot_now != readsb_snapshot_now:
+                        readsb_snapshot_now = snapshot_now
+                        if is_bincraft_path(READSB_JSON_PATH):
+                            readsb_update_keys = ingest_bincraft_snapshot(snapshot_now, bincraft_columns, readsb_update_keys)
                         else:
-                            plane_data["hit_history"].append((hit_bucket, plane_data["last_hit_count"]))
-                    else:
-                        plane_data["last_hit_bucket"] = hit_bucket
-                        plane_data["last_hit_count"] = 1
-                    plane_data["total_hit_count"] = plane_data.get("total_hit_count", 0) + 1
-                    prune_history(plane_data["hit_history"], PLANE_GRAPH_HISTORY_SECONDS, current_epoch)
-
-                    active_planes[icao] = plane_data
-                    displayed_planes[icao] = {
-                        "plane_data": plane_data,
-                        "display_until": time.time() + display_duration
-                    }
-
-                if is_new_plane:
-                    cache_entry = icao_cache.get(icao)
-                    if cache_entry and (time.time() - cache_entry.get('cached_at', 0)) < ICAO_CACHE_MAX_AGE_DAYS * 86400:
-                        for field in ('manufacturer', 'model', 'owner', 'registration'):
-                            if field in cache_entry:
-                                plane_data[field] = cache_entry[field]
-                        active_planes[icao] = plane_data
-                        displayed_planes[icao]["plane_data"] = plane_data
-                        if plane_data.get('manufacturer', '-') != '-' and plane_data.get('owner', '-') != '-':
-                            save_plane_to_csv(icao, plane_data)
-                    add_message(f"NEW plane {icao}")
-
-                if not effective_offline and plane_data["manufacturer"] == "-" and not plane_data.get("api_retries_exhausted") and icao not in api_pending and can_retry_plane_api(plane_data, PLANE_API_RETRY_DELAY) and current_api_count < API_RATE_LIMIT_MAX:
-                    api_pending.add(icao)
-                    current_api_count += 1
-                    threading.Thread(target=api_worker_thread, args=(icao, plane_data), daemon=True).start()
-
-        except FileNotFoundError:
-            if readsb_connected:
-                add_message(f"readsb unavailable: {READSB_JSON_PATH} not found")
+                            readsb_update_keys = ingest_readsb_snapshot(data, readsb_update_keys)
+
+            except FileNotFoundError:
+                if readsb_connected:
+                    add_message(f"readsb unavailable: {READSB_JSON_PATH} not found")
+                    readsb_connected = False
+                readsb_signature = None
+                time.sleep(3)
+                is_receiving = False
+                continue
+            except Exception as e:
+                log.error(f"ADSB loop error: {e}")
+                add_message(f"ADSB loop error: {str(e)[:40]}")
                 readsb_connected = False
-            time.sleep(3)
-            is_receiving = False
-            continue
-        except Exception as e:
-            log.error(f"ADSB loop error: {e}")
-            add_message(f"ADSB loop error: {str(e)[:40]}")
-            readsb_connected = False
-            time.sleep(1)
-            is_receiving = False
-            continue
+                readsb_signature = None
+                time.sleep(1)
+                is_receiving = False
+                continue
 
         #Periodically clean old planes and upload stats
         current_time = time.time()
         with data_lock:
-            old_planes = [icao for icao, d in displayed_planes.items() if d["display_until"] < current_time]
-            for icao in old_planes:
-                del displayed_planes[icao]
-
-            stale_active_planes = [
-                icao for icao, plane in active_planes.items()
-                if current_time - plane.get("last_update_time", current_time) > ACTIVE_PLANE_RETENTION_SECONDS
-            ]
-            for icao in stale_active_planes:
-                del active_planes[icao]
+            #Planes drop off the radar once display_until passes, the table only forgets them after the retention period
+            stale_active_planes = active_planes.prune(current_time - ACTIVE_PLANE_RETENTION_SECONDS)
+            for icao, stale_plane in stale_active_planes.items():
+                stale_plane["location_history"].discard()
                 tracker_plane_photo_cache.pop(icao, None)
                 tracker_plane_photo_meta_cache.pop(icao, None)
                 planecam_auto_capture_last_time.pop(icao, None)
+        #Also picks up API enrichment and planes whose display time ran out
+        publish_displayed_planes()
 
-        if flight_history_future is not None and flight_history_future.done():
-            _fh_error = flight_history_future.exception()
-            if _fh_error is not None:
-                add_message(f"Flight history save error: {str(_fh_error)[:60]}")
-            flight_history_future = None
-
-        if current_time - last_flight_history_save >= 60 and flight_history_future is None:
+        if current_time - last_flight_history_save >= 60:
+            flush_started = time.perf_counter()
             with data_lock:
-                planes_snapshot = {icao: dict(plane) for icao, plane in active_planes.items()}
-            for _plane in planes_snapshot.values():
-                _plane['rating'] = get_rarity_rating(_plane.get('model', '-'), model_ratings)
-            flight_history_future = bg_pool.submit(save_flight_history, planes_snapshot, FLIGHT_HISTORY_DIR)
+                #Rows and the trail points added since the last flush, diffed and spill files read after the lock
+                journal_snapshot = history_journal.snapshot(active_planes, rating_for=lambda plane: get_rarity_rating(plane.get('model', '-'), model_ratings))
+            journal_day, journal_records = history_journal.collect(journal_snapshot)
+            try:
+                history_journal.write(journal_day, journal_records)
+            except (OSError, sqlite3.Error) as e:
+                add_message(f"Flight history save error: {str(e)[:60]}")
+                metrics.inc("flight_history_save_errors")
+            metrics.observe("flight_history_save_ms", (time.perf_counter() - flush_started) * 1000)
+            metrics.inc("flight_history_journal_lines", len(journal_records))
             last_flight_history_save = current_time
 
-        if stats_future is not None and stats_future.done():
-            try:
-                new_stats = stats_future.result()
-            except Exception as e:
-                new_stats = None
-                log.error(f"Stats upload error: {e}")
-                add_message(f"Stats upload error: {str(e)[:30]}")
-            stats_future = None
+            finished_day = history_journal.take_finished_day()
+            if finished_day is not None:
+                compaction_days.append(finished_day)
+            elif not HISTORY_DB_PATH and HISTORY_COMPACT_INTERVAL > 0 and current_time - last_history_compaction >= HISTORY_COMPACT_INTERVAL:
+                compaction_days.append(journal_day)
+                last_history_compaction = current_time
+
+        if compaction_future is not None and compaction_future.done():
+            _compact_error = compaction_future.exception()
+            if _compact_error is not None:
+                add_message(f"Flight history compaction error: {str(_compact_error)[:60]}")
+                metrics.inc("flight_history_compaction_errors")
+            else:
+                metrics.observe("flight_history_compact_ms", (time.perf_counter() - compaction_started) * 1000)
+            compaction_future = None
+
+        if compaction_future is None and compaction_days:
+            compact_day = compaction_days.pop(0)
+            seal_journal(FLIGHT_HISTORY_DIR, compact_day)
+            compaction_started = time.perf_counter()
+            compaction_future = bg_pool.submit(compact_flight_history, FLIGHT_HISTORY_DIR, compact_day)
 
+        #Today's stats come from the running aggregate, nothing is re-read for the upload
+        if current_time - last_stats_upload > 60 and not offline and network_available:
+            last_stats_upload = current_time
+            new_stats = flight_stats.stats()
             try:
                 total = new_stats.get('total', 0) if new_stats else 0
                 if total > 0:
@@ -1046,13 +1389,81 @@ def adsb_processing_thread():
                 log.error(f"Stats upload error: {e}")
                 add_message(f"Stats upload error: {str(e)[:30]}")
 
-        if current_time - last_stats_upload > 60 and not offline and network_available and stats_future is None:
-            stats_future = bg_pool.submit(functions.get_stats, _config['myLat'], _config['myLon'], FLIGHT_HISTORY_DIR)
-            last_stats_upload = current_time
+        metrics.set_gauge("api_pending", len(enrichment))
+        metrics.set_gauge("api_requests_5min", get_api_request_count_5min())
+        if current_time - last_metrics_dump >= METRICS_DUMP_INTERVAL:
+            metrics_log.info(json.dumps(metrics.snapshot()))
+            last_metrics_dump = current_time
 
+        #One whole iteration without the sleep, the benchmark suite reads it from a headless run
+        metrics.observe("adsb_iteration_ms", (time.perf_counter() - iteration_started) * 1000)
         is_receiving = False
         time.sleep(1)
 
+def replay_recording(on_aircraft, on_status):
+    #Feed a recorded log through the same ingest paths as the live sources
+    update_keys = {}
+    sbs_state = {}
+
+    def on_record(record, replay_time):
+        nonlocal update_keys
+        if record.get("kind") == REPLAY_KIND_JSON:
+            update_keys = ingest_readsb_snapshot(rebase_snapshot(record.get("data", {}), replay_time), update_keys)
+        elif record.get("kind") == REPLAY_KIND_SBS:
+            message = parse_sbs_line(record.get("line", ""))
+            if message is not None:
+                on_aircraft(apply_sbs_message(sbs_state, message, replay_time), message)
+
+    speed = float(_config['replaySpeed'])
+    on_status(f"Replaying {REPLAY_PATH} at {f'{speed:g}x' if speed > 0 else 'full speed'}")
+    try:
+        replayed = replay_log(REPLAY_PATH, on_record, speed=speed, should_run=lambda: tracker_running, loop=bool(_config['replayLoop']))
+        on_status(f"Replay finished after {replayed} records")
+    except OSError as e:
+        on_status(f"Replay error: {str(e)[:40]}")
+    publish_displayed_planes()
+
+
+def run_synthetic_traffic(on_status):
+    #Generated aircraft.json snapshots around the home location, once a second on the wall clock
+    traffic = SyntheticTraffic(_config['myLat'], _config['myLon'], count=int(_config['syntheticCount']), radius_km=float(_config['syntheticRadiusKm']), now=time.time())
+    on_status(f"Synthetic traffic: {len(traffic.aircraft)} aircraft within {traffic.radius_km:g}km")
+    update_keys = {}
+    while tracker_running:
+        traffic.step(time.time() - traffic.now)
+        update_keys = ingest_readsb_snapshot(traffic.snapshot(), update_keys)
+        time.sleep(max(0.0, 1.0 - (time.time() - traffic.now)))
+
+
+#THREAD 3: Streaming ingest (adsbSource: sbs, beast, replay or synthetic)
+def stream_ingest_thread():
+    last_publish = [0.0]
+
+    def on_aircraft(aircraft, fields):
+        #Only position updates are merged into the planes, the rest just update the decoder state
+        if 'lat' in fields:
+            metrics.inc("stream_positions")
+            ingest_aircraft(aircraft)
+            #Publishing per message would rebuild the UI snapshot hundreds of times a second
+            now = time.time()
+            if now - last_publish[0] >= STREAM_PUBLISH_INTERVAL:
+                publish_displayed_planes()
+                last_publish[0] = now
+
+    def on_status(status_message):
+        log.info(status_message)
+        add_message(status_message)
+
+    if ADSB_SOURCE == 'synthetic':
+        run_synthetic_traffic(on_status)
+    elif ADSB_SOURCE == 'replay':
+        replay_recording(on_aircraft, on_status)
+    elif ADSB_SOURCE == 'beast':
+        beast_stream(BEAST_SERVER, on_aircraft, should_run=lambda: tracker_running, on_status=on_status, reference=(_config['myLat'], _config['myLon']))
+    else:
+        sbs_stream(ADSB_SERVER, on_aircraft, should_run=lambda: tracker_running, on_status=on_status)
+
+
 def convert_distance_from_km(distance_km, unit):
     if distance_km in (None, '-'):
         return None
@@ -1089,76 +1500,117 @@ def clamp_distance_threshold(distance_km):
     return max(0.0, min(1000.0, float(distance_km)))
 
 
-_flight_stats_cache = {
-    'total': 0,
-    'top_model': {'name': None, 'count': 0},
-    'top_manufacturer': {'name': None, 'count': 0},
-    'top_aircraft': {'name': None, 'count': 0},
-    'top_airline': {'name': None, 'count': 0},
-    'manufacturer_breakdown': {},
-    'furthest_detected': None,
-    'highest_detected': None,
-    'unique_airlines': 0,
-    'unique_models': 0,
-    'unique_manufacturers': 0,
-    'emergencies_count': 0,
-    'avg_altitude': None,
-    'avg_speed': None,
-    'max_speed': None,
-    'avg_mach': None,
-    'last_updated': None,
-}
-_flight_stats_lock = threading.Lock()
-
-
-def _load_flight_stats():
-    global _flight_stats_cache
+def load_flight_stats_history():
+    #Today's aircraft from earlier runs, once at startup. Aircraft seen live since keep their live row.
+    started = time.perf_counter()
     try:
-        new_stats = functions.get_stats(
-            _config['myLat'], _config['myLon'],
-            flight_history_dir=FLIGHT_HISTORY_DIR,
-        )
-        if new_stats and new_stats.get('total', 0) > 0:
-            with _flight_stats_lock:
-                _flight_stats_cache = new_stats
-        else:
-            log.warning(f"Flight stats: get_stats returned empty (total={new_stats.get('total') if new_stats else None})")
+        added = flight_stats.load_history(FLIGHT_HISTORY_DIR, HISTORY_DB_PATH)
     except Exception as e:
-        log.warning(f"Flight stats refresh error: {e}", exc_info=True)
-
-
-def flight_stats_refresh_thread():
-    _load_flight_stats()
-    while tracker_running:
-        time.sleep(60)
-        _load_flight_stats()
-
+        log.warning(f"Flight stats history error: {e}", exc_info=True)
+        return
+    log.info(f"Flight stats: {added} aircraft from today's history in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+PERSISTENCE_METRICS = ("flight_history_save_ms", "flight_history_compact_ms", "stats_csv_save_ms", "stats_csv_flush_ms", "firebase_upload_ms")
+
+
+def build_status_document():
+    #JSON served on /status, only reads globals and the metrics registry so it never waits on the render loop
+    snapshot = metrics.snapshot()
+    gauges = snapshot["gauges"]
+    histograms = snapshot["histograms"]
+    return {
+        "host": socket.gethostname(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "uptime_seconds": snapshot["uptime"],
+        "source": ADSB_SOURCE,
+        "offline": offline,
+        "network_available": network_available,
+        "aircraft": {
+            "active": gauges.get("planes_active", 0),
+            "displayed": gauges.get("planes_displayed", 0),
+            "per_poll": gauges.get("aircraft_per_poll"),
+        },
+        "ingest": {
+            "lag_seconds": gauges.get("ingest_lag_seconds"),
+            "snapshots": snapshot["counters"].get("snapshots_ingested", 0),
+            "stream_positions": snapshot["counters"].get("stream_positions", 0),
+            "snapshot_ms": histograms.get("ingest_snapshot_ms"),
+        },
+        "api": {
+            "requests_5min": get_api_request_count_5min(),
+            "limit_5min": API_RATE_LIMIT_MAX,
+            "pending": len(enrichment),
+            "latency_ms": histograms.get("api_latency_ms"),
+            "providers": metadata_router.status(),
+        },
+        "camera": {
+            "reachable": tracker_status_connected,
+            "stats_link": _tracker_stats_link_ok,
+            "stats_rtt_ms": histograms.get("camera_stats_rtt_ms"),
+        },
+        "persistence": {name: histograms.get(name) for name in PERSISTENCE_METRICS},
+        "render": {
+            "frame_rate": gauges.get("frame_rate"),
+            "frame_ms": histograms.get("frame_ms"),
+        },
+    }
+
+
+if _config['statusServer']:
+    try:
+        status_server = start_status_server(_config['statusHost'], _config['statusPort'], metrics.snapshot, build_status_document)
+        log.info(f"Status server on http://{_config['statusHost']}:{status_server.server_address[1]}/status")
+    except OSError as e:
+        log.error(f"Status server failed to start: {e}")
+        add_message(f"Status server failed: {e}")
+
+#Fixed pool of API workers, API_RATE_LIMIT_MAX requests per API_RATE_LIMIT_WINDOW with short bursts
+enrichment = EnrichmentService(
+    enrich_plane,
+    workers=int(_config['enrichmentWorkers']),
+    rate=API_RATE_LIMIT_MAX / API_RATE_LIMIT_WINDOW,
+    burst=int(_config['enrichmentBurst']),
+    max_pending=int(_config['enrichmentMaxPending']),
+    wanted=enrichment_wanted,
+    registry=metrics.registry,
+).start()
+atexit.register(enrichment.close)
+
+if stats_csv_writer is not None:
+    stats_csv_writer.start()
+    #Runs on exit() from the UI loop and after a headless run, pending planes are written out
+    atexit.register(stats_csv_writer.close)
 
 #Start ADSB processing thread
 processing_thread = threading.Thread(target=adsb_processing_thread, daemon=True)
 processing_thread.start()
 
+if ADSB_SOURCE in ('sbs', 'beast', 'replay', 'synthetic'):
+    stream_worker = threading.Thread(target=stream_ingest_thread, daemon=True)
+    stream_worker.start()
+
 tracker_stats_worker = threading.Thread(target=tracker_stats_thread, daemon=True)
 tracker_stats_worker.start()
 
 tracker_ping_worker = threading.Thread(target=tracker_ping_thread, daemon=True)
 tracker_ping_worker.start()
 
-flight_stats_worker = threading.Thread(target=flight_stats_refresh_thread, daemon=True)
+flight_stats_worker = threading.Thread(target=load_flight_stats_history, daemon=True)
 flight_stats_worker.start()
 
 #THREAD 1: Main UI Thread
 def main():
-    global tracker_running, offline, selected_plane_icao, heatmap_hits
+    global tracker_running, offline, selected_plane_icao, closest_plane_icao, heatmap_hits
     global altitude_filter_threshold, altitude_filter_above, altitude_filter_dragging
     global distance_filter_threshold_km, distance_filter_outside, distance_filter_dragging
     global radar_heatmap_enabled, hide_planes_mode, distance_unit, rarity_filter_selected
     global tracker_capture_in_progress, tracker_photo_status, tracker_photo_plane_icao, tracking_mode_auto
-    global camera_scroll_offset, planecam_auto_capture_last_time
+    global camera_scroll_offset, planecam_auto_capture_last_time, metrics_overlay_enabled
 
     start_time = time.time()
     top_graph_last_bucket = load_top_graph_history(active_count_history, total_seen_history, TOP_GRAPH_HISTORY_DIR, TOP_GRAPH_HISTORY_SECONDS, start_time)
-    heatmap_hits = deque(load_today_heatmap_hits(FLIGHT_HISTORY_DIR, start_time))
+    heatmap_hits = deque(load_today_heatmap_hits(FLIGHT_HISTORY_DIR, start_time, HISTORY_DB_PATH))
     range_km = 50
     last_health_log = start_time
     last_system_stats_refresh = 0
@@ -1179,9 +1631,18 @@ def main():
     log_scroll_drag_start_offset = 0
     _prev_target_icao_for_scroll = None
     closest_plane = None
+    frame_timer = FrameTimer(keep_frames=HEADLESS)
+    last_frame_start = None
+    clock_rect = pygame.Rect(SIDEBAR_X, 0, SIDEBAR_WIDTH, 75)
+    if HEADLESS and _args.dump_frames:
+        os.makedirs(_args.dump_frames, exist_ok=True)
 
     while True:
+        frame_timer.start_frame()
         current_time = time.time()
+        if last_frame_start is not None and current_time > last_frame_start:
+            metrics.set_gauge("frame_rate", round(1.0 / (current_time - last_frame_start), 1))
+        last_frame_start = current_time
 
         _today = datetime.today().strftime('%Y-%m-%d')
         if _today != current_graph_date:
@@ -1251,7 +1712,7 @@ def main():
             disk_free = functions.get_disk_free()
             last_system_stats_refresh = current_time
 
-        displayed_planes_snapshot = snapshot_displayed_planes()
+        displayed_planes_snapshot = read_published_planes(view_center_lat, view_center_lon)
 
         #Handle events
         for event in pygame.event.get():
@@ -1309,6 +1770,9 @@ def main():
                         # drag down → newer (lower offset); drag up → older (higher offset)
                         log_scroll_offset = max(0, min(max_scroll_drag, log_scroll_drag_start_offset - delta))
 
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                metrics_overlay_enabled = not metrics_overlay_enabled
+
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 #Only process left mouse button (button 1), ignore middle/right clicks and scroll buttons
                 if event.button != 1:
@@ -1317,6 +1781,11 @@ def main():
                 last_tap_time = time.time()
                 mouse_x, mouse_y = pygame.mouse.get_pos()
 
+                #Tapping the clock toggles the metrics overlay
+                if clock_rect.collidepoint(mouse_x, mouse_y):
+                    metrics_overlay_enabled = not metrics_overlay_enabled
+                    continue
+
                 if log_scrollbar_thumb_rect.collidepoint(mouse_x, mouse_y):
                     log_scroll_dragging = True
                     log_scroll_drag_start_y = mouse_y
@@ -1439,20 +1908,11 @@ def main():
                     target_icao = selected_plane_icao if (selected_plane_icao in displayed_planes_snapshot) else None
                     if not target_icao:
                         min_track_dist = float("inf")
-                        for icao, display_data in displayed_planes_snapshot.items():
-                            plane = display_data.get("plane_data", {})
-                            if not plane_matches_altitude_filter(plane, altitude_filter_threshold, altitude_filter_above):
+                        plane_view = read_plane_view(range_km, view_center_lat, view_center_lon, altitude_filter_threshold, altitude_filter_above,
+                                                     distance_filter_threshold_km, distance_filter_outside)
+                        for icao, (_x, _y, dist) in plane_view.items():
+                            if dist != dist:
                                 continue
-                            lat = plane.get("last_lat")
-                            lon = plane.get("last_lon")
-                            if lat is None or lon is None:
-                                continue
-                            dist = functions.calculate_distance(view_center_lat, view_center_lon, float(lat), float(lon))
-                            if distance_filter_threshold_km > 0:
-                                if distance_filter_outside and dist < distance_filter_threshold_km:
-                                    continue
-                                if not distance_filter_outside and dist > distance_filter_threshold_km:
-                                    continue
                             if dist < min_track_dist:
                                 min_track_dist = dist
                                 target_icao = icao
@@ -1516,9 +1976,10 @@ def main():
                     if RADAR_RECT.collidepoint(mouse_x, mouse_y):
                         selected_plane_icao = None
         
-        displayed_planes_snapshot = snapshot_displayed_planes()
+        displayed_planes_snapshot = read_published_planes(view_center_lat, view_center_lon)
 
         refresh_tracker_photo_surface()
+        frame_timer.mark('input')
 
         #Clear screen
         pygame.draw.rect(window, (0, 0, 0), (0, 0, width, height))
@@ -1578,36 +2039,31 @@ def main():
             x, y = functions.coords_to_xy(airport["lat"], airport["lon"], range_km, view_center_lat, view_center_lon, width, height, RADAR_CENTER_X, RADAR_CENTER_Y)
             pygame.draw.polygon(window, (0, 0, 255), [(x, y - 2), (x + 2, y), (x, y + 2), (x - 2, y)])
             draw_text.center(window, airport["airport_name"], text_font3, (255, 255, 255), x, y - 10)
+        frame_timer.mark('map')
         
         displayed_count = 0
         closest_plane = None
         min_dist = float('inf')
         
         
-        #Calculate distances using view_center instead of config location
-        for icao, display_data in displayed_planes_snapshot.items():
-            plane = display_data.get("plane_data", {})
-            if not plane_matches_altitude_filter(plane, altitude_filter_threshold, altitude_filter_above):
-                continue
+        #Filters, distances from view_center and screen positions come from the snapshot's columns
+        plane_view = read_plane_view(range_km, view_center_lat, view_center_lon, altitude_filter_threshold, altitude_filter_above,
+                                     distance_filter_threshold_km, distance_filter_outside)
+        for icao, (_x, _y, dist) in plane_view.items():
+            plane = displayed_planes_snapshot[icao]["plane_data"]
             if rarity_filter_selected:
                 _r = get_rarity_rating(plane.get('model', '-'), model_ratings)
                 _t = 10 if _r >= 10 else (8 if _r >= 8 else (6 if _r >= 6 else (4 if _r >= 4 else 1)))
                 if _t not in rarity_filter_selected:
                     continue
-            lat = plane.get("last_lat")
-            lon = plane.get("last_lon")
-            if lat is not None and lon is not None:
-                dist = functions.calculate_distance(view_center_lat, view_center_lon, float(lat), float(lon))
-                plane["distance"] = dist
-                if distance_filter_threshold_km > 0:
-                    if distance_filter_outside and dist < distance_filter_threshold_km:
-                        continue
-                    if not distance_filter_outside and dist > distance_filter_threshold_km:
-                        continue
+            #NaN when the plane has no position
+            if dist == dist:
                 if dist < min_dist:
                     min_dist = dist
                     closest_plane = icao
                 displayed_count += 1
+        closest_plane_icao = closest_plane
+        frame_timer.mark('planes')
 
         heatmap_points = []
         if radar_heatmap_enabled:
@@ -1643,6 +2099,7 @@ def main():
                 label_value = convert_distance_from_km(circle_distance_km, distance_unit)
                 label_text = str(round(label_value)) if label_value is not None else '-'
                 draw_text.normal(window, label_text, text_font3, (225, 225, 225), int(label_x), int(label_y))
+        frame_timer.mark('heatmap')
 
         #Draw radar elements with clipping
         window.set_clip(RADAR_RECT)
@@ -1652,12 +2109,9 @@ def main():
         current_auto_track_icaos = set()
         target_icao = selected_plane_icao if (selected_plane_icao in displayed_planes_snapshot) else closest_plane
 
-        for icao, display_data in displayed_planes_snapshot.items():
+        for icao, (x, y, _dist) in plane_view.items():
+            display_data = displayed_planes_snapshot[icao]
             plane = display_data["plane_data"]
-            if not plane_matches_altitude_filter(plane, altitude_filter_threshold, altitude_filter_above):
-                continue
-            if not plane_matches_distance_filter(plane, distance_filter_threshold_km, distance_filter_outside):
-                continue
             if rarity_filter_selected:
                 _r = get_rarity_rating(plane.get('model', '-'), model_ratings)
                 _t = 10 if _r >= 10 else (8 if _r >= 8 else (6 if _r >= 6 else (4 if _r >= 4 else 1)))
@@ -1665,7 +2119,7 @@ def main():
                     continue
             lat = plane.get("last_lat")
             lon = plane.get("last_lon")
-            if lat is None or lon is None:
+            if x is None or lat is None or lon is None:
                 continue
 
             #Calculate fade
@@ -1678,9 +2132,6 @@ def main():
                 if hide_planes_mode == 2:
                     continue
 
-                #NOW using view_center instead of config location
-                x, y = functions.coords_to_xy(float(lat), float(lon), range_km, view_center_lat, view_center_lon, width, height, RADAR_CENTER_X, RADAR_CENTER_Y)
-
                 #Calculate Heading
                 track = plane.get("track")
                 if track != "-" and track is not None:
@@ -1705,10 +2156,11 @@ def main():
                 rarity_col = get_rarity_colour(rating)
 
                 if icao == target_icao:
-                    location_history = plane.get("location_history", {})
-                    if location_history and isinstance(location_history, dict) and len(location_history) > 1:
-                        #Sort coordinates by timestamp to get chronological order
-                        sorted_coords = sorted(location_history.items())
+                    frame_timer.mark('planes')
+                    location_history = plane.get("location_history")
+                    if isinstance(location_history, TrajectoryStore) and len(location_history) > 1:
+                        #The store keeps points in chronological order, spilled segments are not drawn
+                        sorted_coords = location_history.points()
 
                         #Get current position to exclude it from trajectory
                         current_lat = plane.get("last_lat")
@@ -1719,9 +2171,8 @@ def main():
                         last_valid_lat = None
                         last_valid_lon = None
 
-                        for timestamp, coords in sorted_coords:
+                        for timestamp, hist_lat, hist_lon in sorted_coords:
                             try:
-                                hist_lat, hist_lon = coords
 
                                 #Skip the current position (it's drawn as the plane icon)
                                 if current_lat is not None and current_lon is not None:
@@ -1761,6 +2212,7 @@ def main():
 
                             for i in trajectory_points[:-1]:
                                 pygame.draw.circle(window, (0, 255, 255), i, 1)
+                    frame_timer.mark('trajectories')
 
                 coloured = plane_icon_white.copy()
                 coloured.fill((*rarity_col, fade_value), special_flags=pygame.BLEND_RGBA_MULT)
@@ -1831,6 +2283,8 @@ def main():
             camera_scroll_offset = 0
             _prev_target_icao_for_scroll = _scroll_target_icao
 
+        frame_timer.mark('planes')
+
         #Reset clip for UI elements outside radar
         window.set_clip(None)
         
@@ -1876,8 +2330,7 @@ def main():
         active_graph_rect = pygame.Rect(SIDEBAR_X + 300, sys_y, 240, 130)
         total_graph_rect = pygame.Rect(SIDEBAR_X + 580, sys_y, 240, 130)
 
-        with _flight_stats_lock:
-            stats = dict(_flight_stats_cache)
+        stats = flight_stats.stats()
         total_seen = stats.get('total', 0)
 
         if displayed_count > 0 or (current_time - start_time) >= GRAPH_SAMPLE_INTERVAL:
@@ -1887,12 +2340,8 @@ def main():
         active_y_max = max(10, ((active_peak + 10 + 9) // 10) * 10)
 
         rarity_counts = {10: 0, 8: 0, 6: 0, 4: 0, 1: 0}
-        for _icao, _display_data in displayed_planes_snapshot.items():
-            _plane = _display_data.get("plane_data", {})
-            if not plane_matches_altitude_filter(_plane, altitude_filter_threshold, altitude_filter_above):
-                continue
-            if not plane_matches_distance_filter(_plane, distance_filter_threshold_km, distance_filter_outside):
-                continue
+        for _icao in plane_view:
+            _plane = displayed_planes_snapshot[_icao]["plane_data"]
             _rating = get_rarity_rating(_plane.get('model', '-'), model_ratings)
             if _rating >= 10:
                 rarity_counts[10] += 1
@@ -1905,10 +2354,12 @@ def main():
             else:
                 rarity_counts[1] += 1
 
+        frame_timer.mark('sidebar')
         draw_line_graph(window, active_graph_rect, list(active_count_history), active_y_max, draw_text, text_font3, pygame, active_peak, current_time, TOP_GRAPH_HISTORY_SECONDS, "ACTIVE")
         total_peak = max((sample[1] for sample in total_seen_history), default=0)
         total_y_max = max(100, ((total_peak + 100 + 99) // 100) * 100)
         draw_line_graph(window, total_graph_rect, list(total_seen_history), total_y_max, draw_text, text_font3, pygame, total_peak, current_time, TOP_GRAPH_HISTORY_SECONDS, "TOTAL")
+        frame_timer.mark('graphs')
 
         #Flight stats
         furthest_detected = stats.get('furthest_detected')
@@ -1970,11 +2421,13 @@ def main():
             prune_history(hit_history, PLANE_GRAPH_HISTORY_SECONDS, current_time)
             hit_samples = list(hit_history)
 
+        frame_timer.mark('sidebar')
         draw_line_graph(window, altitude_graph_rect, altitude_samples, 50000, draw_text, text_font3, pygame, 50000, current_time, PLANE_GRAPH_HISTORY_SECONDS, "ALTITUDE")
         hits_peak = max((sample[1] for sample in hit_samples), default=0)
         hits_y_max = max(10, ((hits_peak + 10 + 9) // 10) * 10)
         selected_total_hits = graph_plane_data.get("total_hit_count", 0) if graph_plane_data else 0
         draw_line_graph(window, hits_graph_rect, hit_samples, hits_y_max, draw_text, text_font3, pygame, selected_total_hits, current_time, PLANE_GRAPH_HISTORY_SECONDS, "HITS")
+        frame_timer.mark('graphs')
         
         if p_data:
             mfg = p_data.get('manufacturer', '-')
@@ -2075,10 +2528,12 @@ def main():
 
         polar_size = info_box_rect.height
         polar_plot_rect = pygame.Rect(info_box_rect.right - polar_size, info_box_rect.top, polar_size, polar_size)
+        frame_timer.mark('sidebar')
         draw_polar_coverage_plot(
             window, polar_plot_rect, directional_plot_history, draw_text, text_font3, graph_time_font,
             pygame, current_time, DIRECTIONAL_HISTORY_SECONDS, DIRECTIONAL_SECTOR_COUNT
         )
+        frame_timer.mark('graphs')
 
         sx = info_box_rect.left + 8
         sy = info_box_rect.top + 3
@@ -2103,6 +2558,7 @@ def main():
         pygame.draw.circle(window, tracker_status_colour, (sx + 5, dot_y + sp * 2 + 9), 5)
         draw_text.normal(window, "Camera", stat_font, (255, 255, 255), sx + 14, dot_y + sp * 2)
 
+        frame_timer.mark('sidebar')
         _LOG_SCROLLBAR_W = 6
         log_scrollbar_track_rect = pygame.Rect(filter_panel_rect.right - _LOG_SCROLLBAR_W - 1, bottom_row_y + 1, _LOG_SCROLLBAR_W, log_h - 2)
         log_max_w = filter_panel_rect.width - 10 - _LOG_SCROLLBAR_W - 2
@@ -2136,6 +2592,7 @@ def main():
             pygame.draw.rect(window, (140, 140, 140), log_scrollbar_thumb_rect)
         else:
             log_scrollbar_thumb_rect = pygame.Rect(0, 0, 0, 0)
+        frame_timer.mark('logs')
 
         #CAMERA IMAGE
         cam_w = int((SIDEBAR_WIDTH / 2) - 10)
@@ -2211,10 +2668,38 @@ def main():
             scaled_icon = pygame.transform.smoothscale(icon, (rect.width - 8, rect.height - 8))
             icon_rect = scaled_icon.get_rect(center=rect.center)
             window.blit(scaled_icon, icon_rect)
+        frame_timer.mark('sidebar')
+
+        if metrics_overlay_enabled:
+            draw_metrics_overlay(window, pygame.Rect(10, 10, 430, 520), metrics.snapshot(), draw_text, text_font3, pygame)
+            frame_timer.mark('overlay')
 
         pygame.display.update()
+        frame_timer.mark('present')
+
+        row = frame_timer.end_frame(planes_displayed=displayed_count, planes_active=len(active_planes))
+        metrics.observe("frame_ms", row['total_ms'])
+        for section in frame_timer.sections:
+            metrics.observe(f"frame_{section}_ms", row[section])
+
+        if HEADLESS:
+            if _args.dump_frames and row['frame'] % max(1, _args.dump_every) == 0:
+                pygame.image.save(window, os.path.join(_args.dump_frames, f"frame_{row['frame']:05d}.png"))
+            if len(frame_timer.frames) >= _args.frames:
+                break
         time.sleep(0.05)
 
+    #Only reached in headless mode
+    tracker_running = False
+    frame_timer.write(_args.timings, skip=_args.warmup)
+    print(f"Rendered {len(frame_timer.frames)} frames ({ADSB_SOURCE}), timings written to {_args.timings}")
+    if _args.metrics:
+        metrics.set_gauge("peak_rss_kb", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        with open(_args.metrics, 'w') as f:
+            json.dump(metrics.snapshot(), f, indent=2)
+    print(frame_timer.format_summary(skip=_args.warmup))
+    pygame.quit()
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.history_archive import archive_path
+from modules.history_journal import archive_flight_history_day, compact_pending_days, flight_history_days, history_csv_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert finished daily flight history CSVs into columnar archives (YYYY-MM-DD.npz).')
+    parser.add_argument('history_dir', nargs='?', default='./flight_history', help='Flight history directory (flightHistoryDir)')
+    parser.add_argument('--remove-csv', action='store_true', help='Delete each CSV once its archive is written and checked')
+    parser.add_argument('--force', action='store_true', help='Rewrite archives that are already newer than their CSV')
+    args = parser.parse_args()
+
+    started = time.time()
+    today = datetime.now().strftime('%Y-%m-%d')
+    #Finished days with journal data are folded into their CSV first, today is left to the tracker
+    compact_pending_days(args.history_dir, today=today)
+    archived = 0
+    for day in flight_history_days(args.history_dir):
+        csv_path = history_csv_path(args.history_dir, day)
+        if day >= today or not os.path.exists(csv_path):
+            continue
+        target = archive_path(args.history_dir, day)
+        up_to_date = os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(csv_path)
+        if up_to_date and not args.force and not args.remove_csv:
+            continue
+        day_started = time.time()
+        csv_size = os.path.getsize(csv_path)
+        try:
+            rows = archive_flight_history_day(args.history_dir, day, remove_csv=args.remove_csv)
+        except ValueError as e:
+            print(f'{day}: not archived, {e}')
+            continue
+        if rows:
+            archived += 1
+            print(f'{day}: {rows} rows, {csv_size // 1024} KB CSV -> {os.path.getsize(target) // 1024} KB archive in {time.time() - day_started:.1f}s')
+    print(f'Archived {archived} day(s) in {time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.history_journal import compact_pending_days
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fold flight history journals into the daily CSVs.')
+    parser.add_argument('history_dir', nargs='?', default='./flight_history', help='Flight history directory (flightHistoryDir)')
+    parser.add_argument('--today', action='store_true', help="Also compact today's journal (safe while the tracker runs)")
+    args = parser.parse_args()
+
+    started = time.time()
+    compacted = compact_pending_days(args.history_dir, include_today=args.today)
+    for day, records in sorted(compacted.items()):
+        print(f'{day}: {records} journal records folded in')
+    print(f'Compacted {len(compacted)} day(s) in {time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.replay_utils import REPLAY_KIND_JSON, REPLAY_KIND_SBS, open_replay_log, write_replay_record
+from modules.synthetic_traffic import SyntheticTraffic
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic traffic as a replay log for adsbSource: replay.')
+    parser.add_argument('output', help='Replay log to write (gzip JSON lines)')
+    parser.add_argument('--count', type=int, default=200, help='Aircraft in the air at any time (10-5000)')
+    parser.add_argument('--duration', type=int, default=600, help='Seconds of traffic to generate')
+    parser.add_argument('--lat', type=float, required=True, help='Centre latitude (your myLat)')
+    parser.add_argument('--lon', type=float, required=True, help='Centre longitude (your myLon)')
+    parser.add_argument('--radius', type=float, default=400, help='Radius in km the traffic stays within')
+    parser.add_argument('--format', choices=['json', 'sbs'], default='json', help='Record aircraft.json snapshots or SBS lines')
+    parser.add_argument('--dropout-rate', type=float, default=0.002, help='Chance per aircraft per second of a 5-60s dropout')
+    parser.add_argument('--bad-position-rate', type=float, default=0.001, help='Chance per fix of a corrupt position')
+    parser.add_argument('--seed', type=int, default=1090)
+    args = parser.parse_args()
+
+    started = time.time()
+    traffic = SyntheticTraffic(args.lat, args.lon, count=args.count, radius_km=args.radius, seed=args.seed,
+                               dropout_rate=args.dropout_rate, bad_position_rate=args.bad_position_rate, now=started)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    records = 0
+    with open_replay_log(args.output, 'wt') as f:
+        for _ in range(args.duration):
+            traffic.step(1.0)
+            if args.format == 'json':
+                write_replay_record(f, REPLAY_KIND_JSON, traffic.snapshot(), traffic.now)
+                records += 1
+            else:
+                for line in traffic.sbs_lines():
+                    write_replay_record(f, REPLAY_KIND_SBS, line, traffic.now)
+                    records += 1
+
+    print(f'Wrote {records} records ({args.duration}s of {args.count} aircraft) to {args.output} in {time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.aircraft_registry import build_registry, read_registry_source, registry_record
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the offline aircraft registry (registryPath) from downloaded registry dumps.')
+    parser.add_argument('sources', nargs='+', help='CSV, JSON or JSON lines dumps (optionally .gz), later files win for the same icao')
+    parser.add_argument('--output', default='./config/aircraft_registry.idx', help='Registry file (registryPath)')
+    args = parser.parse_args()
+
+    started = time.time()
+    counts = {}
+
+    def records():
+        for source in args.sources:
+            counts[source] = 0
+            for row in read_registry_source(source):
+                record = registry_record(row)
+                if record is not None:
+                    counts[source] += 1
+                    yield record
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    total = build_registry(records(), args.output)
+    for source, count in counts.items():
+        print(f'{source}: {count} aircraft')
+    print(f'Wrote {total} aircraft to {args.output} ({os.path.getsize(args.output) // 1024} KB) in {time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.history_db import connect_history_db, history_db_path, import_flight_history_rows
+from modules.history_journal import flight_history_days, load_flight_history_day
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import the daily flight history CSVs (and any pending journals) into the SQLite history database.')
+    parser.add_argument('history_dir', nargs='?', default='./flight_history', help='Flight history directory (flightHistoryDir)')
+    parser.add_argument('--db', default=None, help='Database path (historyDb, default <history_dir>/history.db)')
+    parser.add_argument('--stats-csv', default='./stats_history/stats.csv', help='Enriched aircraft CSV written by save_plane_to_csv')
+    args = parser.parse_args()
+
+    db_path = args.db or history_db_path(args.history_dir)
+    conn = connect_history_db(db_path)
+    started = time.time()
+    total = 0
+    try:
+        #Safe to re-run: sightings are upserted and positions already stored are skipped
+        for day in flight_history_days(args.history_dir):
+            day_started = time.time()
+            #CSV summary rows with their trails and any journal records not yet compacted
+            rows = load_flight_history_day(args.history_dir, day)
+            imported = import_flight_history_rows(conn, day, rows)
+            total += imported
+            print(f'{day}: {imported} aircraft in {time.time() - day_started:.1f}s')
+
+        if os.path.exists(args.stats_csv):
+            csv.field_size_limit(10 * 1024 * 1024)
+            with open(args.stats_csv, 'r', newline='', encoding='utf-8') as f:
+                rows = [row for row in csv.DictReader(f) if row.get('icao')]
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO aircraft (icao, manufacturer, model, full_model, airline, altitude, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(row['icao'], row.get('manufacturer'), row.get('model'), row.get('full_model'), row.get('airline'), row.get('altitude'), row.get('timestamp')) for row in rows],
+                )
+            print(f'{args.stats_csv}: {len(rows)} enriched aircraft')
+    finally:
+        conn.close()
+    print(f'Imported {total} sightings into {db_path} in {time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
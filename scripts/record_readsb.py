@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.replay_utils import record_readsb_json, record_sbs
+
+DEFAULT_JSON_PATH = '/run/readsb/aircraft.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record readsb output into a replay log for adsbSource: replay.')
+    parser.add_argument('output', help='Replay log to write (gzip JSON lines, e.g. recordings/readsb.jsonl.gz)')
+    parser.add_argument('--source', choices=['json', 'sbs'], default='json', help='Record aircraft.json snapshots or SBS lines')
+    parser.add_argument('--path', default=DEFAULT_JSON_PATH, help='aircraft.json to poll for --source json')
+    parser.add_argument('--host', default='127.0.0.1', help='readsb host for --source sbs')
+    parser.add_argument('--port', type=int, default=30003, help='SBS port for --source sbs')
+    parser.add_argument('--duration', type=float, default=None, help='Seconds to record (default: until Ctrl+C)')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    try:
+        if args.source == 'json':
+            recorded = record_readsb_json(args.path, args.output, duration=args.duration)
+        else:
+            recorded = record_sbs((args.host, args.port), args.output, duration=args.duration)
+    except KeyboardInterrupt:
+        print('Stopped')
+        return
+    print(f'Recorded {recorded} records to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
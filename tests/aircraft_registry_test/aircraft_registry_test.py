@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# Builds the offline aircraft registry from a CSV dump in the OpenSky
+# aircraftDatabase layout and a gzipped tar1090-style JSON dump, then checks
+# lookups (later dumps win, names cleaned like hexdb's), that misses and
+# invalid icaos return None, that a registry file dropped in place of the
+# old one is picked up and that lookups during a reload never mix two files. Prints build time, file size and lookup cost.
+
+import csv
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.aircraft_registry import AircraftRegistry, build_registry, read_registry_source, registry_record
+from modules.metrics import MetricsRegistry
+
+AIRCRAFT = 200000
+LOOKUPS = 20000
+_TYPES = [('Airbus', 'A320 214', 'A320'), ('Boeing', '737-8AS', 'B738'), ('Avions de Transport Regional', 'ATR 72-600', 'AT76'), ('Embraer', 'ERJ 190-100', 'E190')]
+
+
+def write_csv_dump(path):
+    rng = random.Random(5)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['icao24', 'registration', 'manufacturername', 'model', 'typecode', 'owner', 'operator'])
+        writer.writeheader()
+        for n in range(AIRCRAFT):
+            manufacturer, model, typecode = rng.choice(_TYPES)
+            writer.writerow({'icao24': f"{n * 83 % 0xFFFFFF:06x}", 'registration': f"G-{n:05d}", 'manufacturername': manufacturer,
+                             'model': model, 'typecode': typecode, 'owner': '' if n % 5 == 0 else f"Owner {n % 300}", 'operator': 'Op Air'})
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'aircraftDatabase.csv')
+        json_path = os.path.join(tmp, 'tar1090.json.gz')
+        registry_path = os.path.join(tmp, 'aircraft_registry.idx')
+        write_csv_dump(csv_path)
+        with gzip.open(json_path, 'wt', encoding='utf-8') as f:
+            json.dump({'000053': {'r': 'EI-NEW', 't': 'A21N', 'desc': 'A321neo', 'ownOp': 'Aer Lingus'}, '~ABC123': {'r': 'TISB'}}, f)
+
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(_PROJECT_ROOT, 'scripts', 'import_registry.py'), csv_path, json_path, '--output', registry_path],
+                                capture_output=True, text=True, check=True)
+        build_time = time.perf_counter() - started
+        assert f'Wrote {AIRCRAFT + 1} aircraft' in result.stdout, result.stdout
+
+        metrics_registry = MetricsRegistry()
+        registry = AircraftRegistry(registry_path, registry=metrics_registry)
+        assert len(registry) == AIRCRAFT + 1
+        entry = registry.lookup(f"{7 * 83:06X}")
+        assert entry == {'registration': 'G-00007', 'manufacturer': entry['manufacturer'], 'model': entry['model'], 'owner': 'Owner 7', 'icao_type_code': entry['icao_type_code']}
+        assert registry.lookup(f"{5 * 83:06x}")['owner'] == 'Op Air'
+        #The JSON dump came later and replaces the CSV row
+        assert registry.lookup('000053') == {'registration': 'EI-NEW', 'manufacturer': '-', 'model': 'A321neo', 'owner': 'Aer Lingus', 'icao_type_code': 'A21N'}
+        assert registry.lookup('~ABC123')['registration'] == 'TISB'
+        assert registry.lookup('FFFFFE') is None and registry.lookup('nothex') is None
+        assert {registry_record(row)['manufacturer'] for row in read_registry_source(csv_path)} == {'Airbus', 'Boeing', 'ATR', 'Embraer'}
+
+        rng = random.Random(9)
+        wanted = [f"{rng.randrange(AIRCRAFT * 2) * 83 % 0xFFFFFF:06X}" for _ in range(LOOKUPS)]
+        started = time.perf_counter()
+        hits = sum(1 for icao in wanted if registry.lookup(icao))
+        lookup_time = (time.perf_counter() - started) / LOOKUPS
+        counters = metrics_registry.snapshot()['counters']
+        assert 0 < hits < LOOKUPS and counters['registry_hits'] >= hits
+
+        #A new dump dropped in place is mapped on the next check
+        build_registry([{'icao': '123456', 'registration': 'N1', 'manufacturer': 'Cessna', 'model': '172', 'owner': 'Private'}], registry_path)
+        assert registry.lookup('000053') is not None
+        registry.checked_at = 0
+        assert registry.lookup('000053') is None and registry.lookup('123456')['manufacturer'] == 'Cessna'
+        assert AircraftRegistry(os.path.join(tmp, 'missing.idx')).lookup('123456') is None
+
+        #Lookups while another thread keeps replacing the file only ever see one file's strings
+        other_path = os.path.join(tmp, 'other.idx')
+        build_registry([{'icao': '123456', 'registration': 'G-OTHER', 'manufacturer': 'Piper', 'model': 'PA-28', 'owner': 'Flying Club',
+                         'icao_type_code': 'P28A'}, {'icao': '000001', 'registration': 'X'}], other_path)
+        answers = {registry.lookup('123456')['registration'], AircraftRegistry(other_path).lookup('123456')['registration']}
+        swapping = threading.Event()
+        swapping.set()
+
+        def swap():
+            while swapping.is_set():
+                for path in (other_path, registry_path):
+                    registry.path = path
+                    registry.reload()
+
+        swapper = threading.Thread(target=swap)
+        swapper.start()
+        seen = set()
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            seen.add(registry.lookup('123456')['registration'])
+        swapping.clear()
+        swapper.join()
+        assert seen <= answers, seen
+
+        print(f"{AIRCRAFT} aircraft")
+        print(f"import:  {build_time:8.2f} s, {os.path.getsize(os.path.join(tmp, 'aircraftDatabase.csv')) // 1024} KB CSV")
+        print(f"lookup:  {lookup_time * 1e6:8.2f} us")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
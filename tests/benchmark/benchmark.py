@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+# Times the tracker's hot paths on fixed synthetic inputs at several scales and
+# compares them with the committed baselines in baselines.json.
+#
+#   python tests/benchmark/benchmark.py                      run and compare
+#   python tests/benchmark/benchmark.py --check              exit 1 on a regression
+#   python tests/benchmark/benchmark.py --update-baselines   record new baselines
+#   python tests/benchmark/benchmark.py --only save_flight_history --scales 500
+#
+# Each benchmark reports per-call p50/p90/p99/max latency and the peak
+# Python heap allocated by one call (tracemalloc). Baselines are only
+# comparable on the machine they were recorded on; the platform is stored
+# with them and a mismatch is reported rather than failing --check.
+#
+# Whole-frame and ingest costs come from the real tracker: each scale also
+# runs plane_tracker.py --headless against that many synthetic aircraft and
+# reports one main() frame (headless_frame), one adsb_processing_thread
+# iteration (adsb_iteration) and one snapshot ingest (ingest_snapshot). Their
+# peak KB is the tracker process's peak RSS rather than one call's heap.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from modules import draw_text
+from modules.bincraft_utils import bincraft_changed_rows, bincraft_planes, decode_bincraft, encode_bincraft
+from modules.data_utils import get_stats, load_today_heatmap_hits, parse_aircraft, save_flight_history, save_plane_to_csv
+from modules.metrics import percentile
+from modules.rarity import build_model_counts, compute_ratings
+from modules.synthetic_traffic import SyntheticTraffic
+from modules.trajectory_store import TrajectoryStore
+from modules.ui_utils import draw_line_graph, draw_radar_heatmap
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_SCALES = [50, 500, 2000]
+CENTRE = (51.5, -0.12)
+TRAIL_SECONDS = 300
+REGRESSION_RATIO = 1.3
+MIN_CALLS = 3
+MAX_CALLS = 200
+TIME_BUDGET_SECONDS = 2.0
+HEADLESS_FRAMES = 150
+HEADLESS_WARMUP = 30
+HEADLESS_TIMEOUT_SECONDS = 600
+
+_MODELS = [('Airbus', 'A320-214'), ('Airbus', 'A321-251NX'), ('Boeing', '737-8AS'), ('Boeing', '787-9'),
+           ('Embraer', 'ERJ-190'), ('ATR', '72-600'), ('Airbus', 'A350-941'), ('Boeing', '777-36N')]
+_OWNERS = ['Ryanair', 'easyJet', 'British Airways', 'KLM', 'Lufthansa', 'Wizz Air', 'Emirates']
+
+
+def build_planes(count, now):
+    # Tracker-shaped plane dicts with enrichment and TRAIL_SECONDS of trail each
+    traffic = SyntheticTraffic(*CENTRE, count=count, radius_km=400, seed=count, dropout_rate=0, bad_position_rate=0, now=now - TRAIL_SECONDS)
+    trails = {}
+    for _ in range(TRAIL_SECONDS):
+        traffic.step(1.0)
+        for aircraft in traffic.aircraft:
+            trail = trails.setdefault(aircraft['hex'], TrajectoryStore())
+            trail.append(traffic.now, aircraft['lat'], aircraft['lon'])
+
+    rng = random.Random(count)
+    planes = {}
+    for aircraft in traffic.snapshot()['aircraft']:
+        plane = parse_aircraft(aircraft)
+        manufacturer, model = rng.choice(_MODELS)
+        plane.update({
+            'manufacturer': manufacturer, 'model': model, 'owner': rng.choice(_OWNERS),
+            'registration': f"G-{rng.randrange(26 ** 4):05d}", 'rating': rng.randrange(1, 11),
+            'last_lat': plane['lat'], 'last_lon': plane['lon'],
+            'location_history': trails.get(aircraft['hex'], TrajectoryStore()),
+        })
+        plane['history_timestamp'] = f"{now:.6f}"
+        planes[plane['icao']] = plane
+    return planes, traffic.snapshot()
+
+
+class Fixture:
+    # Per-scale inputs, built once and shared by every benchmark at that scale
+    def __init__(self, scale):
+        self.scale = scale
+        self.now = time.time()
+        self.workdir = tempfile.mkdtemp(prefix='planetracker_bench_')
+        self.history_dir = os.path.join(self.workdir, 'flight_history')
+        self.planes, self.snapshot = build_planes(scale, self.now)
+        save_flight_history(self.planes, self.history_dir)
+        self.heatmap_points = [(random.Random(i).randrange(0, 1080), random.Random(i + 1).randrange(0, 1080)) for i in range(scale * 50)]
+        self.graph_samples = [(self.now - 24 * 3600 + i * 60, (i * 7919) % max(10, scale)) for i in range(24 * 60)]
+
+    def close(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def bench_parse_aircraft(fixture):
+    aircraft_list = fixture.snapshot['aircraft']
+
+    def call():
+        for aircraft in aircraft_list:
+            parse_aircraft(aircraft)
+    return call
+
+
+def bench_bincraft_snapshot(fixture):
+    # The same snapshot as readsb's binCraft: decoded into columns, changed rows picked, plane dicts built
+    snapshot = fixture.snapshot
+    data = encode_bincraft(snapshot['now'], snapshot['aircraft'])
+
+    def call():
+        now, columns = decode_bincraft(data)
+        rows, _keys = bincraft_changed_rows(now, columns)
+        bincraft_planes(now, columns, rows)
+    return call
+
+
+def bench_save_flight_history(fixture):
+    return lambda: save_flight_history(fixture.planes, fixture.history_dir)
+
+
+def bench_save_plane_to_csv(fixture):
+    # save_plane_to_csv writes ./stats_history/stats.csv relative to the cwd
+    os.chdir(fixture.workdir)
+    planes = list(fixture.planes.items())
+    for icao, plane in planes:
+        save_plane_to_csv(icao, plane)
+    counter = [0]
+
+    def call():
+        icao, plane = planes[counter[0] % len(planes)]
+        counter[0] += 1
+        save_plane_to_csv(icao, plane)
+    return call
+
+
+def bench_get_stats(fixture):
+    return lambda: get_stats(*CENTRE, fixture.history_dir)
+
+
+def bench_load_today_heatmap_hits(fixture):
+    return lambda: load_today_heatmap_hits(fixture.history_dir, now=fixture.now)
+
+
+def bench_build_model_counts(fixture):
+    return lambda: build_model_counts(fixture.history_dir)
+
+
+def bench_compute_ratings(fixture):
+    model_counts = build_model_counts(fixture.history_dir)
+    return lambda: compute_ratings(model_counts)
+
+
+def bench_draw_radar_heatmap(fixture):
+    surface = pygame.Surface((1920, 1080))
+    radar_rect = pygame.Rect(0, 0, 1080, 1080)
+    return lambda: draw_radar_heatmap(surface, radar_rect, fixture.heatmap_points, pygame)
+
+
+def bench_draw_line_graph(fixture):
+    surface = pygame.Surface((1920, 1080))
+    rect = pygame.Rect(1400, 800, 240, 130)
+    font = pygame.font.Font(None, 14)
+    return lambda: draw_line_graph(surface, rect, fixture.graph_samples, max(10, fixture.scale), draw_text, font, pygame,
+                                   max(10, fixture.scale), now=fixture.now, time_window_seconds=24 * 3600, title='Active')
+
+
+BENCHMARKS = [
+    ('parse_aircraft', bench_parse_aircraft),
+    ('bincraft_snapshot', bench_bincraft_snapshot),
+    ('save_flight_history', bench_save_flight_history),
+    ('save_plane_to_csv', bench_save_plane_to_csv),
+    ('get_stats', bench_get_stats),
+    ('load_today_heatmap_hits', bench_load_today_heatmap_hits),
+    ('build_model_counts', bench_build_model_counts),
+    ('compute_ratings', bench_compute_ratings),
+    ('draw_radar_heatmap', bench_draw_radar_heatmap),
+    ('draw_line_graph', bench_draw_line_graph),
+]
+
+
+#Read from one headless tracker run per scale: name -> metrics histogram, None for the frame totals
+HEADLESS_BENCHMARKS = [
+    ('headless_frame', None),
+    ('adsb_iteration', 'adsb_iteration_ms'),
+    ('ingest_snapshot', 'ingest_snapshot_ms'),
+]
+
+
+def run_headless(fixture):
+    # Renders HEADLESS_FRAMES frames of the real UI against fixture.scale
+    # synthetic aircraft, returns {name: result} like measure() does
+    headless_dir = os.path.join(fixture.workdir, 'headless')
+    timings_path = os.path.join(headless_dir, 'frame_timings.json')
+    metrics_path = os.path.join(headless_dir, 'metrics.json')
+    os.makedirs(headless_dir, exist_ok=True)
+    command = [sys.executable, os.path.join(_PROJECT_ROOT, 'plane_tracker.py'), '--headless', '--source', 'synthetic',
+               '--frames', str(HEADLESS_FRAMES), '--warmup', str(HEADLESS_WARMUP), '--count', str(fixture.scale),
+               '--scratch-dir', headless_dir, '--timings', timings_path, '--metrics', metrics_path]
+    completed = subprocess.run(command, cwd=_PROJECT_ROOT, capture_output=True, text=True, timeout=HEADLESS_TIMEOUT_SECONDS)
+    if completed.returncode != 0:
+        output = (completed.stderr or completed.stdout).strip().splitlines()
+        raise RuntimeError(output[-1] if output else f'exit code {completed.returncode}')
+    with open(timings_path, 'r') as f:
+        frames = json.load(f)['frames'][HEADLESS_WARMUP:]
+    with open(metrics_path, 'r') as f:
+        snapshot = json.load(f)
+
+    peak_kb = float(snapshot['gauges'].get('peak_rss_kb', 0))
+    durations = sorted(frame['total_ms'] for frame in frames)
+    results = {'headless_frame': {
+        'calls': len(durations),
+        'p50_ms': round(percentile(durations, 0.50), 3),
+        'p90_ms': round(percentile(durations, 0.90), 3),
+        'p99_ms': round(percentile(durations, 0.99), 3),
+        'max_ms': round(durations[-1], 3) if durations else 0.0,
+        'peak_kb': peak_kb,
+    }}
+    for name, histogram_name in HEADLESS_BENCHMARKS:
+        histogram = snapshot['histograms'].get(histogram_name) if histogram_name else None
+        if histogram:
+            results[name] = {'calls': histogram['count'], 'p50_ms': histogram['p50'], 'p90_ms': histogram['p90'],
+                             'p99_ms': histogram['p99'], 'max_ms': histogram['max'], 'peak_kb': peak_kb}
+    return results
+
+
+def measure(call):
+    call()
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < MIN_CALLS or (len(durations) < MAX_CALLS and time.perf_counter() - started < TIME_BUDGET_SECONDS):
+        call_started = time.perf_counter()
+        call()
+        durations.append((time.perf_counter() - call_started) * 1000)
+
+    tracemalloc.start()
+    call()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations.sort()
+    return {
+        'calls': len(durations),
+        'p50_ms': round(percentile(durations, 0.50), 3),
+        'p90_ms': round(percentile(durations, 0.90), 3),
+        'p99_ms': round(percentile(durations, 0.99), 3),
+        'max_ms': round(durations[-1], 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def machine_id():
+    return f"{platform.system()} {platform.machine()} python {platform.python_version()}"
+
+
+def load_baselines():
+    try:
+        with open(BASELINE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'machine': None, 'results': {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the tracker hot paths against committed baselines.')
+    parser.add_argument('--scales', nargs='*', type=int, default=DEFAULT_SCALES, help='Aircraft counts to run at')
+    parser.add_argument('--only', nargs='*', default=None, help='Benchmark names to run')
+    parser.add_argument('--update-baselines', action='store_true', help='Write the results to baselines.json')
+    parser.add_argument('--check', action='store_true', help='Exit 1 if any p50 regressed past the threshold')
+    parser.add_argument('--output', default=None, help='Also write the results as JSON here')
+    args = parser.parse_args()
+
+    pygame.init()
+    baselines = load_baselines()
+    same_machine = baselines.get('machine') == machine_id()
+    original_cwd = os.getcwd()
+    results = {}
+    regressions = []
+
+    print(f"Machine: {machine_id()}" + ('' if same_machine else f" (baselines from {baselines.get('machine')})"))
+    print(f"{'benchmark':<28} {'scale':>6} {'calls':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak KB':>9} {'vs base':>8}")
+    print("=" * 104)
+
+    def report(name, scale, result):
+        key = f"{name}@{scale}"
+        results[key] = result
+        baseline = baselines.get('results', {}).get(key)
+        ratio_text = '-'
+        if baseline and baseline.get('p50_ms'):
+            ratio = result['p50_ms'] / baseline['p50_ms']
+            ratio_text = f"{ratio:.2f}x"
+            if ratio > REGRESSION_RATIO:
+                ratio_text += ' !'
+                regressions.append((key, ratio))
+        print(f"{name:<28} {scale:>6} {result['calls']:>6} {result['p50_ms']:>9.3f} {result['p90_ms']:>9.3f} "
+              f"{result['p99_ms']:>9.3f} {result['max_ms']:>9.3f} {result['peak_kb']:>9.1f} {ratio_text:>8}")
+
+    headless_names = [name for name, _ in HEADLESS_BENCHMARKS if not args.only or name in args.only]
+    for scale in args.scales:
+        fixture = Fixture(scale)
+        try:
+            for name, factory in BENCHMARKS:
+                if args.only and name not in args.only:
+                    continue
+                try:
+                    result = measure(factory(fixture))
+                finally:
+                    os.chdir(original_cwd)
+                report(name, scale, result)
+
+            if headless_names:
+                try:
+                    headless_results = run_headless(fixture)
+                except (OSError, ValueError, KeyError, RuntimeError, subprocess.TimeoutExpired) as e:
+                    print(f"{'headless run failed':<28} {scale:>6} {e}")
+                    headless_results = {}
+                for name in headless_names:
+                    if name in headless_results:
+                        report(name, scale, headless_results[name])
+        finally:
+            fixture.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'machine': machine_id(), 'recorded': datetime.now().isoformat(timespec='seconds'), 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.update_baselines:
+        merged = baselines.get('results', {}) if same_machine else {}
+        merged.update(results)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'machine': machine_id(), 'recorded': datetime.now().isoformat(timespec='seconds'), 'results': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaselines written to {BASELINE_PATH}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {REGRESSION_RATIO}x p50:")
+        for key, ratio in regressions:
+            print(f"  {key}: {ratio:.2f}x")
+        if args.check and same_machine:
+            sys.exit(1)
+    else:
+        print("\nOK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Decodes readsb_sample.binCraft, four aircraft packed field by field at the
+# offsets of readsb's binCraft struct (validity bitfields included), and
+# checks the planes against the values that went in. Round-trips synthetic
+# snapshots through the encoder and times the ingest path, json.load +
+# aircraft_update_key + parse_aircraft against decode + changed rows + plane
+# dicts from the columns, at 50, 500 and 5000 aircraft. Checks that a .zst
+# path without the optional zstandard package is reported up front.
+
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+import numpy as np
+
+from modules.bincraft_utils import (ZSTD_MISSING_MESSAGE, bincraft_changed_rows, bincraft_path_error, bincraft_planes, decode_bincraft, encode_bincraft,
+                                   load_bincraft_columns, read_bincraft_file, zstandard)
+from modules.data_utils import aircraft_update_key, parse_aircraft
+
+SIZES = [50, 500, 5000]
+REPEATS = 20
+NOW = 1_700_000_000.0
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'readsb_sample.binCraft')
+#What was packed into the sample, as parse_aircraft would give it for readsb's aircraft.json
+SAMPLE_PLANES = [
+    {'icao': '4CA7B5', 'flight': 'RYR4AB', 'squawk': '2317', 'category': 'A3', 'emergency': 'none', 'altitude': 36000, 'alt_geom': 36550,
+     'baro_rate': -832, 'geom_rate': -768, 'speed': 452.3, 'ias': 262, 'tas': 468, 'mach': 0.784, 'track': 123.4, 'track_rate': '-',
+     'mag_heading': 121.0, 'true_heading': 122.5, 'nav_heading': 270.0, 'nav_altitude_fms': '-', 'nav_altitude_mcp': 36000, 'nav_qnh': 1013.2,
+     'roll': -0.53, 'oat': -52, 'tat': -24, 'wd': 250, 'ws': 45, 'rssi': -6.5, 'seen': 0.1, 'seen_pos': 0.3, 'messages': 4711,
+     'lat': 51.470022, 'lon': -0.454295},
+    #No position; callsign bytes and a ground speed are there but marked invalid, nic_baro/alert/spi bits set
+    {'icao': '3C6586', 'flight': '-', 'squawk': '1000', 'category': 'A1', 'emergency': '-', 'altitude': 4000, 'alt_geom': '-', 'speed': '-',
+     'seen_pos': '-', 'messages': 52, 'lat': '-', 'lon': '-'},
+    {'icao': '~A1B2C3', 'flight': '-', 'squawk': '7700', 'category': '-', 'emergency': 'minfuel', 'altitude': 2500, 'speed': 120.0,
+     'track': 90.0, 'seen_pos': 1.2, 'messages': 900, 'lat': 51.123456, 'lon': -1.234567},
+    #Geometric altitude only, a raw alt_baro is there but invalid
+    {'icao': '406B90', 'flight': 'EZY12', 'squawk': '-', 'category': 'A2', 'emergency': '-', 'altitude': 1225, 'alt_geom': 1225, 'speed': '-',
+     'seen_pos': 0.0, 'messages': 77, 'lat': 51.9, 'lon': -0.201},
+]
+
+
+def make_aircraft(rng, index):
+    aircraft = {
+        'hex': f"{0x400000 + index:06x}",
+        'type': 'adsb_icao',
+        'flight': f"TST{index:04d} ",
+        'alt_baro': rng.randrange(0, 40000, 25),
+        'alt_geom': rng.randrange(0, 40000, 25),
+        'gs': round(rng.uniform(80, 520), 1),
+        'track': round(rng.uniform(0, 359), 2),
+        'baro_rate': rng.randrange(-2048, 2048, 8),
+        'squawk': f"{rng.randrange(0, 8):o}{rng.randrange(0, 8):o}{rng.randrange(0, 8):o}{rng.randrange(0, 8):o}",
+        'emergency': 'none',
+        'category': 'A3',
+        'nav_qnh': 1013.2,
+        'nav_altitude_mcp': rng.randrange(0, 40000, 4),
+        'nav_heading': round(rng.uniform(0, 359), 2),
+        'lat': round(rng.uniform(50, 54), 6),
+        'lon': round(rng.uniform(-3, 3), 6),
+        'nic': 8, 'rc': 186, 'seen_pos': round(rng.uniform(0, 5), 1),
+        'version': 2, 'nic_baro': 1, 'nac_p': 9, 'nac_v': 1, 'sil': 3, 'sil_type': 'perhour', 'gva': 2, 'sda': 2,
+        'alert': 0, 'spi': 0, 'mlat': [], 'tisb': [],
+        'messages': rng.randrange(1, 60000), 'seen': round(rng.uniform(0, 5), 1), 'rssi': round(rng.uniform(-30, -3), 1),
+    }
+    if index % 7 == 0:
+        for key in ('lat', 'lon', 'seen_pos', 'nic', 'rc'):
+            del aircraft[key]
+    return aircraft
+
+
+def time_it(fn):
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def check_readsb_sample():
+    now, columns = load_bincraft_columns(SAMPLE_PATH)
+    assert abs(now - 1718000000.123) < 1e-6, now
+    planes, position_times = bincraft_planes(now, columns, np.arange(len(columns['hex'])))
+    assert len(planes) == len(SAMPLE_PLANES)
+    for plane, expected in zip(planes, SAMPLE_PLANES):
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert isinstance(plane[key], float) and abs(plane[key] - value) < 1e-6, (plane['icao'], key, plane[key], value)
+            else:
+                assert plane[key] == value, (plane['icao'], key, plane[key], value)
+    assert abs(position_times[0] - (now - 0.3)) < 1e-6
+
+    #Only aircraft with a position are ingested, and only again once their counters move
+    rows, keys = bincraft_changed_rows(now, columns, {})
+    assert rows.tolist() == [0, 2, 3]
+    assert bincraft_changed_rows(now, columns, keys)[0].tolist() == []
+    columns['messages'] = columns['messages'].copy()
+    columns['messages'][2] += 1
+    assert bincraft_changed_rows(now, columns, keys)[0].tolist() == [2]
+    assert bincraft_changed_rows(now + 1, columns, keys)[0].tolist() == [0, 2, 3]
+
+
+def check_round_trip(aircraft_list):
+    _now, columns = decode_bincraft(encode_bincraft(NOW, aircraft_list))
+    rows, _keys = bincraft_changed_rows(NOW, columns)
+    planes, _times = bincraft_planes(NOW, columns, np.arange(len(aircraft_list)))
+    assert rows.tolist() == [i for i, aircraft in enumerate(aircraft_list) if 'lat' in aircraft]
+    for original, plane in zip(aircraft_list, planes):
+        expected = parse_aircraft(dict(original))
+        assert list(plane) == list(expected)
+        for key, value in expected.items():
+            if key in ('spotted_at', 'last_update_time', 'nav_modes'):
+                continue
+            if isinstance(value, float):
+                #rssi goes through an 8 bit signal level, whose steps reach ~1 dB for weak signals
+                assert abs(plane[key] - value) < (1.0 if key == 'rssi' else 0.05), (key, plane[key], value)
+            else:
+                assert plane[key] == value, (key, plane[key], value)
+
+
+def check_zstd_path():
+    assert bincraft_path_error('/run/readsb/aircraft.binCraft') is None and bincraft_path_error('aircraft.json') is None
+    if zstandard is not None:
+        assert bincraft_path_error('/run/readsb/aircraft.binCraft.zst') is None
+        return
+    assert bincraft_path_error('/run/readsb/aircraft.binCraft.zst') == ZSTD_MISSING_MESSAGE
+    with tempfile.NamedTemporaryFile(suffix='.binCraft.zst') as f:
+        try:
+            read_bincraft_file(f.name)
+        except ImportError as e:
+            assert str(e) == ZSTD_MISSING_MESSAGE
+        else:
+            raise AssertionError('read .zst without zstandard')
+
+
+def run():
+    check_zstd_path()
+    check_readsb_sample()
+    rng = random.Random(1090)
+    print(f"{'aircraft':>8} {'json KB':>8} {'bin KB':>8} {'json+parse ms':>14} {'bin+columns ms':>15}")
+    print("=" * 57)
+    for size in SIZES:
+        aircraft_list = [make_aircraft(rng, i) for i in range(size)]
+        check_round_trip(aircraft_list)
+
+        json_bytes = json.dumps({'now': NOW, 'messages': 0, 'aircraft': aircraft_list}).encode()
+        bin_bytes = encode_bincraft(NOW, aircraft_list)
+
+        #What each ingest_*_snapshot does before merging the planes, on a snapshot where everything changed
+        def json_path():
+            data = json.load(io.BytesIO(json_bytes))
+            for aircraft in data['aircraft']:
+                aircraft_update_key(aircraft, data['now'])
+                parse_aircraft(aircraft)
+
+        def bincraft_path():
+            now, columns = decode_bincraft(bin_bytes)
+            rows, _keys = bincraft_changed_rows(now, columns)
+            bincraft_planes(now, columns, rows)
+
+        print(f"{size:>8} {len(json_bytes) / 1024:>8.1f} {len(bin_bytes) / 1024:>8.1f} {time_it(json_path):>14.2f} {time_it(bincraft_path):>15.2f}")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# Sends a burst of 50 new aircraft through the enrichment pool against a
+# local HTTP stand-in for hexdb. Checks that the burst runs on the fixed
+# workers over a handful of keep-alive connections, that the token bucket
+# spaces requests at the configured rate after the burst allowance, that
+# urgent planes overtake queued ones, that repeats coalesce, that planes no
+# longer wanted are skipped and that a full queue refuses. Prints the burst
+# time against a thread and fresh connection per plane.
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.enrichment import EnrichmentService, TokenBucket
+from modules.metrics import MetricsRegistry
+from modules.network_utils import make_http_session
+
+BURST = 50
+LATENCY = 0.02
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connections = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with StandIn.lock:
+            StandIn.connections.add(self.client_address)
+        time.sleep(LATENCY)
+        body = json.dumps({'Manufacturer': 'Airbus', 'Type': 'A320', 'Registration': self.path[-6:]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}/api/v1/aircraft/'
+    icaos = [f'{0x400000 + n:06X}' for n in range(BURST)]
+
+    #Before: a thread and a fresh connection per plane
+    StandIn.connections.clear()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=requests.get, args=(base + icao,), kwargs={'timeout': 5}) for icao in icaos]
+    for thread in threads:
+        thread.start()
+    peak_threads = threading.active_count()
+    for thread in threads:
+        thread.join()
+    thread_time = time.perf_counter() - started
+    thread_connections = len(StandIn.connections)
+
+    #Pooled: 4 workers, one session, no rate limit in the way
+    StandIn.connections.clear()
+    session = make_http_session(4)
+    results = {}
+    done = threading.Event()
+
+    def handler(icao):
+        results[icao] = session.get(base + icao, timeout=5).json()['Registration']
+        if len(results) == BURST:
+            done.set()
+
+    registry = MetricsRegistry()
+    service = EnrichmentService(handler, workers=4, rate=1000, burst=BURST, registry=registry).start()
+    started = time.perf_counter()
+    for icao in icaos:
+        service.submit(icao, (2, 0))
+    pool_threads = sum(1 for thread in threading.enumerate() if thread.name.startswith('enrichment-'))
+    assert done.wait(10)
+    pool_time = time.perf_counter() - started
+    service.close()
+    assert results == {icao: icao for icao in icaos}
+    assert pool_threads == 4 and len(StandIn.connections) <= 4, (pool_threads, StandIn.connections)
+    assert registry.snapshot()['counters']['enrichment_requests'] == BURST
+
+    #Token bucket: the burst allowance at once, then rate per second
+    bucket = TokenBucket(rate=20, capacity=5)
+    started = time.monotonic()
+    taken = 0
+    while taken < 15:
+        wait = bucket.take()
+        if wait:
+            time.sleep(wait)
+        else:
+            taken += 1
+    assert 0.4 < time.monotonic() - started < 0.8
+
+    #One worker held up by the first plane: the rest wait and are served by priority
+    order = []
+    release = threading.Event()
+    wanted = set(icaos[:8])
+
+    def ordered(icao):
+        if not order:
+            release.wait(5)
+        order.append(icao)
+
+    registry = MetricsRegistry()
+    service = EnrichmentService(ordered, workers=1, rate=1000, burst=100, max_pending=6, wanted=lambda icao: icao in wanted, registry=registry).start()
+    service.submit(icaos[0], (2, 0))
+    while icaos[0] not in service.in_flight:
+        time.sleep(0.001)
+    for n, icao in enumerate(icaos[1:7], 1):
+        assert service.submit(icao, (2, float(n)))
+    #Selected plane jumps the queue, a repeat only ever raises priority, a full queue refuses
+    assert service.submit(icaos[5], (0, 5.0)) and service.submit(icaos[5], (2, 0.0))
+    assert service.submit(icaos[3], (1, 3.0))
+    assert not service.submit(icaos[8], (0, 0.0))
+    assert icaos[5] in service and len(service) == 7
+    wanted.discard(icaos[6])
+    release.set()
+    deadline = time.time() + 5
+    while len(service) and time.time() < deadline:
+        time.sleep(0.01)
+    service.close()
+    assert order == [icaos[0], icaos[5], icaos[3], icaos[1], icaos[2], icaos[4]], order
+    counters = registry.snapshot()['counters']
+    assert (counters['enrichment_coalesced'], counters['enrichment_dropped'], counters['enrichment_skipped']) == (3, 1, 1)
+    server.shutdown()
+
+    print(f"{BURST} new aircraft, {LATENCY * 1000:.0f} ms per lookup")
+    print(f"thread per plane: {thread_time * 1000:8.1f} ms, {peak_threads} threads, {thread_connections} connections")
+    print(f"worker pool:      {pool_time * 1000:8.1f} ms, {pool_threads} threads, {len(StandIn.connections)} connections")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
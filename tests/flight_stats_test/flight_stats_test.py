@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# Flies synthetic traffic with planes identified part way through, feeding
+# every update to the running stats aggregate while the flight history
+# journal is flushed every minute. Checks that the aggregate agrees with
+# get_stats over the written day (maxima can only be higher, they count
+# every update), that one rebuilt from history at startup matches get_stats
+# exactly, that aircraft already seen live keep their live row over history,
+# that a re-identified aircraft moves between the counters, that altitude
+# and speed changes leave the counters alone and that a new day starts
+# empty. Prints get_stats against an update and a read.
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import get_stats, parse_aircraft
+from modules.flight_stats import FlightStatsAggregate
+from modules.history_journal import FlightHistoryJournal
+from modules.synthetic_traffic import SyntheticTraffic
+from modules.trajectory_store import TrajectoryStore
+
+CENTRE = (51.5, -0.12)
+PLANES = 300
+SECONDS = 240
+#Well apart so the leaders never tie
+_TYPES = [('Airbus', 'A320', 'easyJet'), ('Boeing', '737-800', 'Ryanair'), ('Airbus', 'A321', 'British Airways'), ('Embraer', 'E190', 'KLM'), ('Boeing', '777', 'Emirates')]
+_WEIGHTS = [50, 27, 13, 7, 3]
+#Rows and maxima, compared separately
+_ROW_KEYS = ('total', 'top_model', 'top_manufacturer', 'top_aircraft', 'top_airline', 'manufacturer_breakdown', 'unique_airlines', 'unique_models',
+             'unique_manufacturers', 'emergencies_count', 'avg_altitude', 'avg_speed', 'avg_mach')
+_MAX_KEYS = ('highest_detected', 'max_speed', 'furthest_detected')
+
+
+def fly(traffic, planes, aggregate, seconds, rng, identities):
+    update_time = 0.0
+    updates = 0
+    for _ in range(seconds):
+        traffic.step(1.0)
+        for aircraft in traffic.snapshot()['aircraft']:
+            icao = aircraft['hex'].upper()
+            plane = planes.get(icao)
+            if plane is None:
+                plane = planes[icao] = parse_aircraft(aircraft)
+                plane['location_history'] = TrajectoryStore(64)
+                identities[icao] = (rng.randrange(20, 120), rng.choices(_TYPES, _WEIGHTS)[0] if rng.random() < 0.85 else None)
+            else:
+                plane.update(parse_aircraft(aircraft))
+            plane['last_lat'], plane['last_lon'] = plane['lat'], plane['lon']
+            plane['location_history'].append(traffic.now, plane['lat'], plane['lon'])
+            #Identified a while after it first shows up, like an API result arriving
+            identify_at, identity = identities[icao]
+            plane['emergency'] = 'general' if icao.endswith('7') else 'none'
+            if identity and len(plane['location_history']) >= identify_at // 10:
+                plane['manufacturer'], plane['model'], plane['owner'] = identity
+            started = time.perf_counter()
+            aggregate.update(icao, plane)
+            update_time += time.perf_counter() - started
+            updates += 1
+    return update_time, updates
+
+
+def compare(aggregate_stats, reference, keys):
+    for key in keys:
+        assert aggregate_stats[key] == reference[key], (key, aggregate_stats[key], reference[key])
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        history_dir = os.path.join(tmp, 'flight_history')
+        traffic = SyntheticTraffic(*CENTRE, count=PLANES, seed=11)
+        rng = random.Random(3)
+        planes = {}
+        identities = {}
+        aggregate = FlightStatsAggregate(*CENTRE)
+        journal = FlightHistoryJournal(history_dir)
+        update_time = 0.0
+        updates = 0
+        for _ in range(SECONDS // 60):
+            spent, count = fly(traffic, planes, aggregate, 60, rng, identities)
+            update_time += spent
+            updates += count
+            journal.flush(planes)
+
+        started = time.perf_counter()
+        reference = get_stats(*CENTRE, history_dir)
+        get_stats_time = time.perf_counter() - started
+        live = aggregate.stats()
+        assert reference['total'] == len(planes) and live['total'] == len(planes)
+        compare(live, reference, _ROW_KEYS)
+        for key in _MAX_KEYS:
+            assert live[key] >= reference[key], (key, live[key], reference[key])
+        assert live['furthest_plane']['distance_km'] == round(live['furthest_detected'], 2)
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            assert aggregate.stats() is live
+        read_time = (time.perf_counter() - started) / 1000
+
+        #Rebuilt at startup from the day written so far: the same rows, so the maxima match too
+        rebuilt = FlightStatsAggregate(*CENTRE)
+        assert rebuilt.load_history(history_dir) == len(planes)
+        compare(rebuilt.stats(), reference, _ROW_KEYS + _MAX_KEYS)
+
+        #Aircraft already seen live keep their live row, the rest come from history
+        restarted = FlightStatsAggregate(*CENTRE)
+        relabelled = sorted(planes)[:10]
+        for icao in relabelled:
+            restarted.update(icao, dict(planes[icao], manufacturer='Cessna', model='172', owner='Private'))
+        assert restarted.load_history(history_dir) == len(planes) - 10
+        restarted_stats = restarted.stats()
+        assert restarted_stats['total'] == len(planes)
+        assert restarted_stats['manufacturer_breakdown']['Cessna'] == 10 and restarted.counts['model']['172'] == 10
+
+        #Re-identified: out of the old counters and into the new
+        before = dict(restarted.counts['model'])
+        restarted.update(relabelled[0], dict(planes[relabelled[0]], manufacturer='Airbus', model='A320', owner='easyJet'))
+        assert restarted.counts['model']['172'] == 9 and restarted.counts['model']['A320'] == before.get('A320', 0) + 1
+        assert restarted.stats()['total'] == len(planes)
+        lone = FlightStatsAggregate(*CENTRE)
+        lone.update('AAAAAA', {'model': 'X', 'manufacturer': 'Y', 'owner': 'Z'})
+        lone.update('AAAAAA', {'model': 'W', 'manufacturer': 'Y', 'owner': 'Z'})
+        assert lone.stats()['top_model'] == {'name': 'W', 'count': 1} and lone.stats()['unique_models'] == 1
+
+        #Altitude and speed changes only move the sums, the counters and their leaders are left alone
+        bumps = []
+        bump = lone._bump
+        lone._bump = lambda *args: bumps.append(args) or bump(*args)
+        lone.update('AAAAAA', {'model': 'W', 'manufacturer': 'Y', 'owner': 'Z', 'altitude': 1000, 'speed': 300})
+        lone.update('AAAAAA', {'model': 'W', 'manufacturer': 'Y', 'owner': 'Z', 'altitude': 2000, 'speed': 400})
+        assert bumps == [] and lone.stats()['avg_altitude'] == 2000 and lone.stats()['avg_speed'] == 400
+
+        #Midnight: the new day starts with only what is seen after it
+        tomorrow = datetime.strptime(aggregate.day, '%Y-%m-%d') + timedelta(days=1, seconds=5)
+        aggregate.update('ABCDEF', {'lat': CENTRE[0], 'lon': CENTRE[1], 'altitude': 1000}, now=tomorrow.timestamp())
+        assert aggregate.day == tomorrow.strftime('%Y-%m-%d') and len(aggregate) == 1
+        assert aggregate.stats()['total'] == 1 and aggregate.stats()['highest_detected'] == 1000
+
+        print(f"{len(planes)} aircraft, {updates} updates")
+        print(f"get_stats:        {get_stats_time * 1000:8.2f} ms")
+        print(f"aggregate update: {update_time / updates * 1e6:8.2f} us")
+        print(f"aggregate read:   {read_time * 1e6:8.2f} us")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+# Writes a few finished days of flight history CSVs and converts them to
+# columnar archives. Checks that the archive keeps every row and value,
+# that get_stats, build_model_counts, stats.py and load_flight_history_day
+# give the same results once the CSVs are removed, that compacting
+# journal data into an archived day drops the stale archive, that a CSV
+# holding a value the archive can't is kept, that stats.py reads days
+# still in the journal and only reads history.db when it has the newer
+# data. Prints read time and peak memory of get_stats and stats.py for
+# both formats.
+
+import csv
+import importlib.util
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import get_stats
+from modules.history_archive import ARCHIVE_NUMERIC_FIELDS, archive_path, archive_value_counts, read_archive
+from modules.history_db import HistoryDatabase
+from modules.history_journal import (FLIGHT_HISTORY_FIELDS, FlightHistoryJournal, archive_flight_history_day, compact_flight_history,
+                                     flight_history_days, history_csv_path, journal_path, load_flight_history_day, seal_journal)
+from modules.rarity import build_model_counts
+
+CENTRE = (51.5, -0.12)
+DAYS = 3
+ROWS = 4000
+_MODELS = ['A320', 'B738', 'A321', 'E190', 'B77W', 'A388', 'C172', '-']
+_OWNERS = ['British Airways', 'easyJet', 'Ryanair', 'Lufthansa', 'KLM', '-']
+_MANUFACTURERS = {'A320': 'Airbus', 'A321': 'Airbus', 'A388': 'Airbus', 'B738': 'Boeing', 'B77W': 'Boeing', 'E190': 'Embraer', 'C172': 'Cessna', '-': '-'}
+
+
+def write_day(history_dir, day, seed):
+    rng = random.Random(seed)
+    with open(history_csv_path(history_dir, day), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FLIGHT_HISTORY_FIELDS)
+        writer.writeheader()
+        for n in range(ROWS):
+            model = rng.choice(_MODELS)
+            seen = datetime.strptime(day, '%Y-%m-%d') + timedelta(seconds=rng.randrange(86000))
+            row = {field: '-' for field in FLIGHT_HISTORY_FIELDS}
+            row.update({
+                'icao': f"{0x4CA000 + n:06X}", 'flight': f"TST{n % 900}" if n % 7 else '-', 'squawk': f"{rng.randrange(8):o}{n % 8}00",
+                'category': rng.choice(['A1', 'A3', 'A5', '-']), 'emergency': 'general' if n % 500 == 0 else '-',
+                'manufacturer': _MANUFACTURERS[model], 'registration': f"G-{n:04d}", 'model': model, 'owner': rng.choice(_OWNERS),
+                'rating': rng.randrange(1, 11), 'altitude': '-' if n % 97 == 0 else rng.randrange(0, 45000, 25),
+                'speed': round(rng.uniform(0, 550), 1), 'mach': round(rng.uniform(0.1, 0.9), 3) if n % 3 else '-',
+                'baro_rate': rng.randrange(-3000, 3000, 64), 'messages': rng.randrange(1, 5000), 'rssi': round(rng.uniform(-30, -2), 1),
+                'lat': round(CENTRE[0] + rng.uniform(-3, 3), 6), 'lon': round(CENTRE[1] + rng.uniform(-4, 4), 6),
+                'first_seen': seen.strftime('%Y-%m-%d %H:%M:%S'), 'last_seen': (seen + timedelta(seconds=300)).strftime('%Y-%m-%d %H:%M:%S'),
+            })
+            writer.writerow(row)
+
+
+def load_stats_script(history_dir):
+    spec = importlib.util.spec_from_file_location('flight_stats', os.path.join(_PROJECT_ROOT, 'flight_history', 'stats.py'))
+    stats = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(stats)
+    stats.HISTORY_DIR = history_dir
+    stats.HISTORY_DB = os.path.join(history_dir, 'history.db')
+    return stats
+
+
+def measure(function):
+    #Timed on its own, tracemalloc slows allocation-heavy readers unevenly
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def by_value(rows):
+    #Numbers come back from the archive as floats, 143.0 is written as 143
+    return {icao: {name: float(value) if name in ARCHIVE_NUMERIC_FIELDS and value != '-' else value for name, value in row.items()}
+            for icao, row in rows.items()}
+
+
+def without_time(stats):
+    return {key: value for key, value in stats.items() if key != 'last_updated'}
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        history_dir = os.path.join(tmp, 'flight_history')
+        os.makedirs(history_dir)
+        first_day = datetime.now() - timedelta(days=DAYS)
+        days = [(first_day + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(DAYS)]
+        for seed, day in enumerate(days):
+            write_day(history_dir, day, seed)
+        csv_rows = {day: load_flight_history_day(history_dir, day, with_history=False) for day in days}
+
+        stats_script = load_stats_script(history_dir)
+        csv_stats, csv_time, csv_peak = measure(lambda: get_stats(*CENTRE, history_dir))
+        csv_frame, csv_script_time, csv_script_peak = measure(lambda: stats_script.load_data(days))
+        csv_counts = build_model_counts(history_dir)
+        csv_size = sum(os.path.getsize(history_csv_path(history_dir, day)) for day in days)
+
+        #The newest day keeps its CSV next to the archive, the others are converted and removed
+        for day in days:
+            assert archive_flight_history_day(history_dir, day, remove_csv=day != days[-1]) == ROWS
+        assert [os.path.exists(history_csv_path(history_dir, day)) for day in days] == [False] * (DAYS - 1) + [True]
+        assert flight_history_days(history_dir) == days
+        archive_size = sum(os.path.getsize(archive_path(history_dir, day)) for day in days)
+
+        #Typed columns, projection only reads what was asked for
+        columns = read_archive(archive_path(history_dir, days[0]), ['altitude', 'model', 'first_seen', 'missing'])
+        assert list(columns) == ['model', 'altitude', 'first_seen']
+        assert columns['altitude'].dtype.kind == 'f' and columns['first_seen'].dtype.kind == 'M'
+        assert sum(archive_value_counts(archive_path(history_dir, days[0]), 'model').values()) == sum(1 for row in csv_rows[days[0]].values() if row['model'] != '-')
+
+        #Archived rows read back with the CSV's values
+        for day in days:
+            assert by_value(load_flight_history_day(history_dir, day, with_history=False)) == by_value(csv_rows[day]), day
+
+        archive_stats, archive_time, archive_peak = measure(lambda: get_stats(*CENTRE, history_dir))
+        archive_frame, archive_script_time, archive_script_peak = measure(lambda: stats_script.load_data(days))
+        assert [stats_script.day_file(day) for day in days] == [archive_path(history_dir, day) for day in days]
+        assert without_time(archive_stats) == without_time(csv_stats)
+        assert build_model_counts(history_dir) == csv_counts
+        assert archive_peak < csv_peak and archive_script_peak < csv_script_peak
+        assert len(archive_frame) == len(csv_frame)
+        assert set(archive_frame.columns) == set(csv_frame.columns) == set(stats_script.STATS_COLUMNS)
+        for col in ('owner', 'model', 'manufacturer', 'category'):
+            assert archive_frame[col].value_counts().to_dict() == csv_frame[col].value_counts().to_dict(), col
+        for col in set(stats_script.NUMERIC_COLS) & set(stats_script.STATS_COLUMNS):
+            assert archive_frame[col].isna().sum() == csv_frame[col].isna().sum(), col
+            assert archive_frame[col].dropna().sum() == csv_frame[col].dropna().sum(), col
+        assert archive_frame['first_seen'].dt.hour.value_counts().to_dict() == csv_frame['first_seen'].dt.hour.value_counts().to_dict()
+
+        #Journal data for an archived day goes into a new CSV and the archive is dropped
+        journal = FlightHistoryJournal(history_dir)
+        journal.write(days[0], [{'icao': 'ABCDEF', 't': f'{days[0]} 23:59:00', 'f': {'model': 'A320'}, 'p': []}])
+        seal_journal(history_dir, days[0])
+        compact_flight_history(history_dir, days[0])
+        assert not os.path.exists(archive_path(history_dir, days[0]))
+        rows = load_flight_history_day(history_dir, days[0], with_history=False)
+        assert len(rows) == ROWS + 1 and by_value({'4CA001': rows['4CA001']}) == by_value({'4CA001': csv_rows[days[0]]['4CA001']})
+
+        #Today only in the journal (just after midnight, before the first compaction): stats.py still shows it
+        today = datetime.now().strftime('%Y-%m-%d')
+        journal.write(today, [{'icao': 'ABCDEF', 't': f'{today} 00:05:00', 'f': {'model': 'A320', 'altitude': 1000}, 'u': []}])
+        assert stats_script.choose_source('daily') == ('files', [today])
+        today_frame = stats_script.load_data([today])
+        assert len(today_frame) == 1 and today_frame['model'].tolist() == ['A320'] and today_frame['altitude'].tolist() == [1000]
+        os.remove(journal_path(history_dir, today))
+
+        #history.db left behind by the SQLite backend is only read when it has the newer data
+        database = HistoryDatabase(stats_script.HISTORY_DB)
+        database.write(days[0], [{'icao': 'ABCDEF', 't': f'{days[0]} 12:00:00', 'f': {'model': 'A320'}, 'u': []}])
+        assert stats_script.choose_source('all_time') == ('files', days)
+        database.write(today, [{'icao': 'ABCDEF', 't': f'{today} 12:00:00', 'f': {'model': 'A320', 'altitude': 1000}, 'u': []}])
+        assert stats_script.choose_source('daily') == ('db', [today])
+        assert stats_script.choose_source('weekly') == ('db', [days[0], today])
+        database_frame = stats_script.load_db_data([today])
+        assert len(database_frame) == 1 and list(database_frame.columns) == ['day'] + stats_script.STATS_COLUMNS
+        database.conn.close()
+        shutil.rmtree(history_dir)
+
+        #A value its column can't hold: the CSV is kept and the lossy archive removed
+        os.makedirs(history_dir)
+        write_day(history_dir, days[0], 0)
+        csv_path = history_csv_path(history_dir, days[0])
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            lossy_rows = list(csv.DictReader(f))
+        lossy_rows[5]['rating'] = 'n/a'
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FLIGHT_HISTORY_FIELDS)
+            writer.writeheader()
+            writer.writerows(lossy_rows)
+        try:
+            archive_flight_history_day(history_dir, days[0], remove_csv=True)
+        except ValueError as e:
+            assert f"{lossy_rows[5]['icao']} rating: 'n/a'" in str(e), e
+        else:
+            raise AssertionError('removed a CSV the archive lost a value of')
+        assert os.path.exists(csv_path) and not os.path.exists(archive_path(history_dir, days[0]))
+
+        print(f"{DAYS} days x {ROWS} rows, {csv_size // 1024} KB CSV, {archive_size // 1024} KB archive")
+        print(f"get_stats csv:      {csv_time * 1000:8.2f} ms, peak {csv_peak // 1024} KB")
+        print(f"get_stats archive:  {archive_time * 1000:8.2f} ms, peak {archive_peak // 1024} KB")
+        print(f"stats.py csv:       {csv_script_time * 1000:8.2f} ms, peak {csv_script_peak // 1024} KB")
+        print(f"stats.py archive:   {archive_script_time * 1000:8.2f} ms, peak {archive_script_peak // 1024} KB")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Flies synthetic traffic and flushes it every minute to both history
+# backends: the CSV journal and the SQLite database. Checks that the
+# database returns the same rows, trails, stats, heatmap and model counts,
+# that a restarted writer keeps the day's sightings, that readers are not
+# blocked by a flush in progress, and that migrated CSVs give the same
+# stats. Prints flush and get_stats cost for both backends.
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import get_stats, load_today_heatmap_hits, parse_aircraft
+from modules.history_db import HistoryDatabase, connect_history_db, import_flight_history_rows, load_sightings_day, save_plane_to_db, sightings_cache
+from modules.history_journal import FlightHistoryJournal, compact_pending_days, load_flight_history_day
+from modules.rarity import build_model_counts
+from modules.synthetic_traffic import SyntheticTraffic
+from modules.trajectory_store import TrajectoryStore
+
+CENTRE = (51.5, -0.12)
+PLANES = 100
+MINUTES = 6
+_MODELS = ['A320', 'B738', 'A321', 'E190']
+
+
+def fly(traffic, planes, seconds):
+    for _ in range(seconds):
+        traffic.step(1.0)
+        for aircraft in traffic.snapshot()['aircraft']:
+            icao = aircraft['hex'].upper()
+            plane = planes.get(icao)
+            if plane is None:
+                plane = planes[icao] = parse_aircraft(aircraft)
+                plane['location_history'] = TrajectoryStore(256)
+            else:
+                plane.update(parse_aircraft(aircraft))
+            plane['model'] = _MODELS[int(icao, 16) % len(_MODELS)]
+            plane['owner'] = 'Test Air'
+            plane['last_lat'], plane['last_lon'] = plane['lat'], plane['lon']
+            plane['location_history'].append(traffic.now, plane['lat'], plane['lon'])
+
+
+def without_time(stats):
+    #Synthetic planes at the edge of the radius tie on distance, which one is reported depends on row order
+    stats = {key: value for key, value in stats.items() if key != 'last_updated'}
+    if stats.get('furthest_plane'):
+        stats['furthest_plane'] = stats['furthest_plane']['distance_km']
+    return stats
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir = os.path.join(tmp, 'csv')
+        db_path = os.path.join(tmp, 'db', 'history.db')
+        traffic = SyntheticTraffic(*CENTRE, count=PLANES, radius_km=300, seed=11, dropout_rate=0, bad_position_rate=0, now=time.time() - MINUTES * 60)
+        planes = {}
+        journal = FlightHistoryJournal(csv_dir)
+        database = HistoryDatabase(db_path)
+        day = datetime.now().strftime('%Y-%m-%d')
+        journal_time = db_time = 0.0
+
+        for minute in range(MINUTES):
+            fly(traffic, planes, 60)
+            now = datetime.now()
+            started = time.perf_counter()
+            journal.flush(planes, now)
+            journal_time += time.perf_counter() - started
+            started = time.perf_counter()
+            database.flush(planes, now)
+            db_time += time.perf_counter() - started
+            if minute == MINUTES // 2:
+                #A restarted tracker must keep updating the sightings it already wrote today
+                database.close()
+                database = HistoryDatabase(db_path)
+                journal = FlightHistoryJournal(csv_dir)
+
+        csv_rows = load_flight_history_day(csv_dir, day)
+        db_rows = load_sightings_day(db_path, day)
+        assert set(csv_rows) == set(db_rows) == set(planes)
+        for icao, row in csv_rows.items():
+            assert db_rows[icao] == row, icao
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute('SELECT COUNT(*) FROM sightings').fetchone()[0] == len(planes)
+
+        assert build_model_counts(csv_dir) == build_model_counts(csv_dir, db_path)
+        assert load_today_heatmap_hits(csv_dir) == load_today_heatmap_hits(csv_dir, history_db=db_path)
+
+        started = time.perf_counter()
+        csv_stats = get_stats(*CENTRE, csv_dir)
+        csv_stats_time = time.perf_counter() - started
+        started = time.perf_counter()
+        db_stats = get_stats(*CENTRE, csv_dir, db_path)
+        db_stats_time = time.perf_counter() - started
+        assert csv_stats['total'] == len(planes)
+        assert without_time(db_stats) == without_time(csv_stats)
+
+        #Incremental stats: the cache only re-reads rows whose last_seen moved
+        fly(traffic, planes, 60)
+        now = datetime.now()
+        journal.flush(planes, now)
+        database.flush(planes, now)
+        started = time.perf_counter()
+        db_stats = get_stats(*CENTRE, csv_dir, db_path)
+        incremental_time = time.perf_counter() - started
+        assert without_time(db_stats) == without_time(get_stats(*CENTRE, csv_dir))
+        assert len(sightings_cache.rows) == len(planes)
+
+        #WAL: a reader runs to completion while a write transaction is open
+        writer = connect_history_db(db_path)
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute("UPDATE sightings SET model = 'X' WHERE icao = ?", (next(iter(planes)),))
+        result = []
+        reader = threading.Thread(target=lambda: result.append(load_sightings_day(db_path, day, with_history=False)))
+        reader.start()
+        reader.join(5)
+        assert result and len(result[0]) == len(planes) and 'X' not in {row['model'] for row in result[0].values()}
+        writer.rollback()
+        writer.close()
+
+        save_plane_to_db(db_path, 'ABC123', {'manufacturer': 'Airbus', 'model': 'A320', 'owner': 'Test Air', 'registration': 'G-TEST', 'altitude': 30000})
+        save_plane_to_db(db_path, 'ABC124', {'manufacturer': '-', 'model': 'A320', 'owner': 'Test Air', 'registration': 'G-TEST'})
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute('SELECT icao, full_model FROM aircraft').fetchall() == [('ABC123', 'Airbus A320')]
+
+        #Migrating the compacted CSVs gives the same stats and trails, twice over
+        compact_pending_days(csv_dir, include_today=True)
+        migrated_path = os.path.join(tmp, 'migrated.db')
+        conn = connect_history_db(migrated_path)
+        for _ in range(2):
+            import_flight_history_rows(conn, day, load_flight_history_day(csv_dir, day))
+        conn.close()
+        migrated = load_sightings_day(migrated_path, day)
+        assert {icao: row['location_history'] for icao, row in migrated.items()} == {icao: row['location_history'] for icao, row in load_sightings_day(db_path, day).items()}
+        assert without_time(get_stats(*CENTRE, csv_dir, migrated_path)) == without_time(get_stats(*CENTRE, csv_dir))
+        database.close()
+
+        print(f"{len(planes)} planes, {MINUTES + 1} flushes")
+        print(f"journal flush:      {journal_time / MINUTES * 1000:8.2f} ms")
+        print(f"sqlite flush:       {db_time / MINUTES * 1000:8.2f} ms")
+        print(f"get_stats csv:      {csv_stats_time * 1000:8.2f} ms")
+        print(f"get_stats sqlite:   {db_stats_time * 1000:8.2f} ms (first call), {incremental_time * 1000:.2f} ms (incremental)")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
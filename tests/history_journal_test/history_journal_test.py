@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# Flies synthetic traffic for a simulated ten minutes, flushing the flight history
+# journal every minute and compacting every 4. Checks that the compacted CSV and
+# points file match what save_flight_history writes for the same planes, that readers
+# see journal data before it is compacted, that a read racing a compaction
+# still sees every record, that a trail wrapping past the last flush
+# still journals every point and that a snapshot taken under the lock is not
+# affected by points added before it is collected. Prints flush cost against
+# the full rewrite, for the test's day and for a busy day already on disk.
+
+import csv
+import os
+import sys
+import tempfile
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import get_stats, load_today_heatmap_hits, parse_aircraft, save_flight_history
+from modules.history_journal import (FLIGHT_HISTORY_FIELDS, FlightHistoryJournal, compact_flight_history, flight_history_row, history_csv_path,
+                                     journal_days, load_flight_history_day, read_journal, seal_journal, sealed_journal_paths)
+from modules.rarity import build_model_counts
+from modules.synthetic_traffic import SyntheticTraffic
+from modules.trajectory_points import POINT_DTYPE, encode_icao, points_path, points_to_histories, read_points, sort_points, write_points
+from modules.trajectory_store import TrajectoryStore
+
+CENTRE = (51.5, -0.12)
+PLANES = 100
+MINUTES = 10
+#Already written when the large day's flushes are timed
+LARGE_DAY_AIRCRAFT = 3000
+LARGE_DAY_POINTS = 400
+LARGE_DAY_MINUTES = 3
+
+
+def fly(traffic, planes, seconds):
+    for _ in range(seconds):
+        traffic.step(1.0)
+        for aircraft in traffic.snapshot()['aircraft']:
+            plane = planes.get(aircraft['hex'].upper())
+            if plane is None:
+                plane = planes[aircraft['hex'].upper()] = parse_aircraft(aircraft)
+                plane['location_history'] = TrajectoryStore(256)
+            else:
+                plane.update(parse_aircraft(aircraft))
+            plane['model'] = 'A320'
+            plane['last_lat'], plane['last_lon'] = plane['lat'], plane['lon']
+            plane['location_history'].append(traffic.now, plane['lat'], plane['lon'])
+
+
+def read_csv(path):
+    csv.field_size_limit(10 * 1024 * 1024)
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return {row['icao']: row for row in csv.DictReader(f)}
+
+
+def check_points_after_wrap(tmp):
+    store = TrajectoryStore(8, spill_path=os.path.join(tmp, 'wrap.traj'), spill_batch=4)
+    for i in range(6):
+        store.append(float(i), 50.0, 0.0)
+    assert [p[0] for p in store.points_after(2.0)] == [3.0, 4.0, 5.0]
+    for i in range(6, 30):
+        store.append(float(i), 50.0, 0.0)
+    assert [p[0] for p in store.points_after(25.0)] == [26.0, 27.0, 28.0, 29.0]
+    assert store.points_after(100.0) == []
+
+    #First flush at 6 points, then the ring wraps three times before the next
+    wrapped = TrajectoryStore(8, spill_path=os.path.join(tmp, 'wrapped.traj'), spill_batch=4)
+    journal = FlightHistoryJournal(os.path.join(tmp, 'wrap_history'))
+    for i in range(6):
+        wrapped.append(float(i), 50.0, 0.0)
+    _, records = journal.collect(journal.snapshot({'W': {'location_history': wrapped}}))
+    assert [p[0] for p in records[0]['u']] == [i * 1000000 for i in range(6)]
+    for i in range(6, 30):
+        wrapped.append(float(i), 50.0, 0.0)
+    _, records = journal.collect(journal.snapshot({'W': {'location_history': wrapped}}))
+    assert [p[0] for p in records[0]['u']] == [i * 1000000 for i in range(6, 30)]
+
+    #An epoch just above its microsecond is written once, on that microsecond
+    store = TrajectoryStore(8)
+    store.append(1700000000.0000004, 50.0, 0.0)
+    _, records = journal.collect(journal.snapshot({'R': {'location_history': store}}))
+    assert [p[0] for p in records[0]['u']] == [1700000000000000]
+    assert journal.collect(journal.snapshot({'R': {'location_history': store}}))[1] == []
+
+    #Points added between the snapshot and collect() are left for the next flush
+    store.append(1700000001.0, 50.0, 0.0)
+    snapshot = journal.snapshot({'R': {'location_history': store}})
+    for i in range(2, 12):
+        store.append(1700000000.0 + i, 51.0, 0.0)
+    _, records = journal.collect(snapshot)
+    assert [p[0] for p in records[0]['u']] == [1700000001000000]
+    _, records = journal.collect(journal.snapshot({'R': {'location_history': store}}))
+    assert [p[0] for p in records[0]['u']] == [1700000000000000 + i * 1000000 for i in range(4, 12)]
+
+
+def write_large_day(history_dir, day, day_start):
+    # A busy day's morning already on disk: its CSV rows and points file
+    rng = np.random.default_rng(5)
+    icaos = [f'{0xA00000 + n:06X}' for n in range(LARGE_DAY_AIRCRAFT)]
+    os.makedirs(history_dir)
+    with open(history_csv_path(history_dir, day), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FLIGHT_HISTORY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for icao in icaos:
+            writer.writerow(dict(flight_history_row(icao, {'model': 'A320', 'lat': CENTRE[0], 'lon': CENTRE[1]}), first_seen=day, last_seen=day))
+    points = np.empty(LARGE_DAY_AIRCRAFT * LARGE_DAY_POINTS, dtype=POINT_DTYPE)
+    points['icao'] = np.repeat([encode_icao(icao) for icao in icaos], LARGE_DAY_POINTS)
+    points['ts'] = day_start + np.tile(np.arange(LARGE_DAY_POINTS, dtype=np.float64) * 5, LARGE_DAY_AIRCRAFT)
+    points['lat'] = CENTRE[0] + rng.uniform(-3, 3, len(points))
+    points['lon'] = CENTRE[1] + rng.uniform(-4, 4, len(points))
+    write_points(points_path(history_dir, day), sort_points(points))
+    return len(points)
+
+
+def time_large_day(tmp, day):
+    # Per-minute cost of both writers once the day already holds a lot: the
+    # rewrite re-reads and re-merges all of it, the flush only the last minute
+    journal_dir = os.path.join(tmp, 'large_journal')
+    rewrite_dir = os.path.join(tmp, 'large_rewrite')
+    stored = write_large_day(journal_dir, day, time.time() - 3 * 60 * 60)
+    shutil.copytree(journal_dir, rewrite_dir)
+    traffic = SyntheticTraffic(*CENTRE, count=PLANES, radius_km=300, seed=9, dropout_rate=0, bad_position_rate=0, now=time.time() - LARGE_DAY_MINUTES * 60)
+    planes = {}
+    journal = FlightHistoryJournal(journal_dir)
+    flush_time = rewrite_time = 0.0
+    for _ in range(LARGE_DAY_MINUTES):
+        fly(traffic, planes, 60)
+        started = time.perf_counter()
+        journal.flush(planes)
+        flush_time += time.perf_counter() - started
+        started = time.perf_counter()
+        save_flight_history(planes, rewrite_dir)
+        rewrite_time += time.perf_counter() - started
+    assert flush_time < rewrite_time, (flush_time, rewrite_time)
+    return stored, flush_time / LARGE_DAY_MINUTES, rewrite_time / LARGE_DAY_MINUTES
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_points_after_wrap(tmp)
+
+        journal_dir = os.path.join(tmp, 'journal')
+        rewrite_dir = os.path.join(tmp, 'rewrite')
+        traffic = SyntheticTraffic(*CENTRE, count=PLANES, radius_km=300, seed=7, dropout_rate=0, bad_position_rate=0, now=time.time() - MINUTES * 60)
+        planes = {}
+        journal = FlightHistoryJournal(journal_dir)
+        day = datetime.now().strftime('%Y-%m-%d')
+        flush_time = rewrite_time = 0.0
+        lines_written = 0
+
+        for minute in range(1, MINUTES + 1):
+            fly(traffic, planes, 60)
+            started = time.perf_counter()
+            lines_written += journal.flush(planes)
+            flush_time += time.perf_counter() - started
+            started = time.perf_counter()
+            save_flight_history(planes, rewrite_dir)
+            rewrite_time += time.perf_counter() - started
+            if minute % 4 == 0 and minute != MINUTES:
+                seal_journal(journal_dir, day)
+                compact_flight_history(journal_dir, day)
+
+        #Readers see the tail that is still only in the journal
+        assert day in journal_days(journal_dir)
+        pending = load_flight_history_day(journal_dir, day)
+        assert set(pending) == set(planes)
+        hits = load_today_heatmap_hits(journal_dir)
+        assert len(hits) == sum(len(row['location_history']) for row in pending.values())
+        assert build_model_counts(journal_dir) == {'A320': len(planes)}
+        assert get_stats(*CENTRE, journal_dir)['total'] == len(planes)
+
+        seal_journal(journal_dir, day)
+        compact_flight_history(journal_dir, day)
+        assert not sealed_journal_paths(journal_dir, day) and day not in journal_days(journal_dir)
+
+        compacted = read_csv(os.path.join(journal_dir, f'{day}.csv'))
+        rewritten = read_csv(os.path.join(rewrite_dir, f'{day}.csv'))
+        assert set(compacted) == set(rewritten)
+        for icao, row in rewritten.items():
+            assert 'location_history' not in row
+            for field, value in row.items():
+                if field not in ('first_seen', 'last_seen'):
+                    assert compacted[icao][field] == value, (icao, field, compacted[icao][field], value)
+        compacted_trails = points_to_histories(read_points(points_path(journal_dir, day)))
+        assert compacted_trails == points_to_histories(read_points(points_path(rewrite_dir, day)))
+        assert compacted_trails == {icao: row['location_history'] for icao, row in pending.items()}
+
+        journal_size = sum(os.path.getsize(os.path.join(journal_dir, n)) for n in os.listdir(journal_dir))
+        csv_size = os.path.getsize(os.path.join(rewrite_dir, f'{day}.csv'))
+        print(f"{len(planes)} planes, {MINUTES} flushes, {lines_written} journal lines")
+        print(f"journal flush:       {flush_time / MINUTES * 1000:8.2f} ms per minute")
+        print(f"full CSV rewrite:    {rewrite_time / MINUTES * 1000:8.2f} ms per minute (final CSV {csv_size // 1024} KB, rewritten every minute)")
+        print(f"history dir after compaction: {journal_size // 1024} KB")
+        stored, large_flush, large_rewrite = time_large_day(tmp, day)
+        print(f"large day, {LARGE_DAY_AIRCRAFT} aircraft and {stored} points on disk:")
+        print(f"journal flush:       {large_flush * 1000:8.2f} ms per minute")
+        print(f"full CSV rewrite:    {large_rewrite * 1000:8.2f} ms per minute")
+
+        #A read racing seal + compaction must still see every record
+        fly(traffic, planes, 60)
+        journal.flush(planes)
+        expected = load_flight_history_day(journal_dir, day)
+        stop = threading.Event()
+
+        def compactor():
+            while not stop.is_set():
+                fly(traffic, planes, 1)
+                journal.flush(planes)
+                seal_journal(journal_dir, day)
+                compact_flight_history(journal_dir, day)
+
+        thread = threading.Thread(target=compactor)
+        thread.start()
+        try:
+            for _ in range(5):
+                rows = load_flight_history_day(journal_dir, day)
+                assert set(rows) >= set(expected)
+                for icao, row in expected.items():
+                    assert set(row['location_history']) <= set(rows[icao]['location_history']), icao
+        finally:
+            stop.set()
+            thread.join()
+        assert read_journal(os.path.join(journal_dir, 'missing.journal')) is None
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+# Checks the persistent ICAO cache: the old JSON file is imported once,
+# lookups hit the in-memory LRU then the database, entries past their age
+# are misses and get evicted, the LRU stays bounded, entries survive a
+# reopen and concurrent writers don't lose any. ICAOs hexdb doesn't know
+# are remembered across a reopen with a doubling re-check delay and
+# forgotten once found. Prints the cost of one
+# cached lookup being saved and of opening the cache against rewriting and
+# loading the whole JSON file.
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.icao_cache import IcaoCache
+from modules.metrics import MetricsRegistry
+
+ENTRIES = 20000
+DAY = 86400
+
+
+def entry(n, cached_at):
+    return {'manufacturer': 'Airbus', 'model': f'A3{n % 40:02d}', 'owner': 'Test Air', 'registration': f'G-{n:05d}', 'cached_at': cached_at}
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        now = time.time()
+        json_path = os.path.join(tmp, 'icao_cache.json')
+        legacy = {f"{0x400000 + n:06X}": entry(n, now - (40 * DAY if n % 10 == 0 else DAY)) for n in range(ENTRIES)}
+        with open(json_path, 'w') as f:
+            json.dump(legacy, f)
+
+        #What every successful lookup used to cost: rewrite the whole file
+        started = time.perf_counter()
+        with open(json_path, 'r') as f:
+            json.load(f)
+        json_load_time = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(20):
+            with open(json_path + '.tmp', 'w') as f:
+                json.dump(legacy, f)
+        json_save_time = (time.perf_counter() - started) / 20
+        os.remove(json_path + '.tmp')
+
+        registry = MetricsRegistry()
+        db_path = os.path.join(tmp, 'icao_cache.db')
+        cache = IcaoCache(db_path, max_age_days=30, hot_size=100, legacy_json_path=json_path, registry=registry)
+        #Imported once, the expired tenth is evicted straight away
+        assert not os.path.exists(json_path) and os.path.exists(json_path + '.imported')
+        assert len(cache) == ENTRIES - ENTRIES // 10
+        assert registry.snapshot()['counters']['icao_cache_evicted'] == ENTRIES // 10
+
+        assert cache.get('400001')['registration'] == 'G-00001'
+        assert cache.get('400001')['model'] == 'A301'
+        assert cache.get('400000') is None and cache.get('ABCDEF') is None
+        counters = registry.snapshot()['counters']
+        assert (counters['icao_cache_disk_hits'], counters['icao_cache_hits'], counters['icao_cache_misses']) == (1, 1, 2)
+
+        #Older than max_age is a miss even while it is still in memory
+        assert cache.get('400001', now=now + 30 * DAY) is None
+        assert registry.snapshot()['counters']['icao_cache_expired'] == 1
+
+        for n in range(1, 500):
+            cache.get(f"{0x400000 + n:06X}")
+        assert len(cache.hot) == 100
+
+        started = time.perf_counter()
+        for n in range(1000):
+            cache.put(f"{0x500000 + n:06X}", entry(n, now), now=now)
+        put_time = (time.perf_counter() - started) / 1000
+        cache.put('400002', {'manufacturer': 'Boeing', 'model': 'B738', 'owner': 'Test Air', 'registration': 'G-NEW'})
+        assert cache.get('400002')['model'] == 'B738'
+
+        #Hourly eviction drops what expired since
+        cache.put('600000', entry(0, now), now=now + 29.5 * DAY)
+        cache.evict_expired(now=now + 29.5 * DAY)
+        assert cache.get('400003', now=now + 29.5 * DAY) is None and cache.get('500001', now=now + 29.5 * DAY) is not None
+        cache.close()
+
+        #API workers and the ingest thread share one cache
+        started = time.perf_counter()
+        cache = IcaoCache(db_path, hot_size=100)
+        open_time = time.perf_counter() - started
+        assert cache.get('400002')['registration'] == 'G-NEW'
+
+        #Unknowns: 1 day, then 2, then 4, capped, errors on their own shorter schedule
+        assert cache.unknown_until('ABC001') is None
+        assert cache.record_unknown('ABC001', now=now) == now + DAY
+        assert cache.unknown_until('ABC001', now=now + DAY - 1) == now + DAY and cache.unknown_until('ABC001', now=now + DAY) is None
+        assert cache.record_unknown('ABC001', now=now + DAY) == now + 3 * DAY
+        assert cache.record_unknown('ABC001', now=now + 3 * DAY) == now + 7 * DAY
+        assert cache.record_unknown('ABC002', 'error', now=now) == now + 3600
+        for _ in range(10):
+            cache.record_unknown('ABC003', now=now)
+        assert cache.unknown_until('ABC003', now=now) == now + 30 * DAY
+        cache.close()
+        cache = IcaoCache(db_path, hot_size=100, registry=registry)
+        assert cache.unknown_until('ABC001', now=now + 6 * DAY) == now + 7 * DAY
+        assert registry.snapshot()['counters']['icao_unknown_skips'] == 1
+        #Found after all
+        cache.put('ABC001', entry(1, now))
+        assert cache.unknown_until('ABC001', now=now) is None
+        cache.close()
+        cache = IcaoCache(db_path, hot_size=100)
+        assert cache.unknown_until('ABC001', now=now) is None and cache.unknown_until('ABC002', now=now) is not None
+        #Forgotten once overdue for re-check by max_age
+        cache.evict_expired(now=now + 61 * DAY)
+        assert cache.unknown == {}
+
+        threads = [threading.Thread(target=lambda base=base: [cache.put(f"{base + n:06X}", entry(n, time.time())) or cache.get(f"{base + n:06X}") for n in range(200)])
+                   for base in (0x700000, 0x710000, 0x720000, 0x730000)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(cache.get(f"{base + 199:06X}") for base in (0x700000, 0x710000, 0x720000, 0x730000))
+        cache.close()
+
+        print(f"{ENTRIES} cached aircraft")
+        print(f"json: load {json_load_time * 1000:8.2f} ms, save per lookup {json_save_time * 1000:8.2f} ms")
+        print(f"db:   open {open_time * 1000:8.2f} ms, save per lookup {put_time * 1000:8.3f} ms")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Checks the metrics registry: counters, gauges (also set during snapshots),
+# histogram percentiles over the rolling window, and that TimedLock records
+# wait time under contention and hold time. Prints the per-acquire overhead of TimedLock against a bare
+# threading.Lock, since data_lock is taken on every ingest and frame.
+
+import os
+import sys
+import threading
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.metrics import HISTOGRAM_WINDOW, MetricsRegistry, TimedLock
+
+ACQUIRES = 200_000
+
+
+def check_registry():
+    registry = MetricsRegistry()
+    registry.inc('polls')
+    registry.inc('polls', 4)
+    registry.set_gauge('aircraft', 12)
+    for value in range(1, 101):
+        registry.observe('ingest_ms', float(value))
+    with registry.timer('sleep_ms'):
+        time.sleep(0.02)
+
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == {'polls': 5}
+    assert snapshot['gauges'] == {'aircraft': 12}
+    ingest = snapshot['histograms']['ingest_ms']
+    assert ingest['count'] == 100 and ingest['sum'] == 5050
+    assert ingest['p50'] in (50.0, 51.0) and ingest['p99'] == 99.0 and ingest['max'] == 100.0
+    assert 15 <= snapshot['histograms']['sleep_ms']['p50'] <= 200
+
+    #Percentiles only cover the rolling window, the count covers everything
+    for _ in range(HISTOGRAM_WINDOW):
+        registry.observe('ingest_ms', 1.0)
+    ingest = registry.snapshot()['histograms']['ingest_ms']
+    assert ingest['count'] == 100 + HISTOGRAM_WINDOW and ingest['max'] == 1.0
+
+    #New gauges appearing while another thread (the status server) takes snapshots
+    setting = threading.Thread(target=lambda: [registry.set_gauge(f'gauge_{n}', n) for n in range(50000)])
+    setting.start()
+    while setting.is_alive():
+        registry.snapshot()
+    setting.join()
+    assert len(registry.snapshot()['gauges']) == 50001
+
+
+def check_timed_lock():
+    registry = MetricsRegistry()
+    lock = TimedLock('data_lock', registry)
+    holding = threading.Event()
+
+    def holder():
+        with lock:
+            holding.set()
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    holding.wait()
+    with lock:
+        pass
+    thread.join()
+
+    histograms = registry.snapshot()['histograms']
+    assert histograms['data_lock_wait_ms']['count'] == 2
+    assert histograms['data_lock_wait_ms']['max'] >= 30
+    assert histograms['data_lock_hold_ms']['max'] >= 45
+    assert not lock.locked()
+    assert lock.acquire(blocking=False)
+    assert not lock.acquire(blocking=False)
+    lock.release()
+
+
+def time_acquire(lock):
+    started = time.perf_counter()
+    for _ in range(ACQUIRES):
+        with lock:
+            pass
+    return (time.perf_counter() - started) / ACQUIRES * 1e9
+
+
+def run():
+    check_registry()
+    check_timed_lock()
+
+    bare = time_acquire(threading.Lock())
+    timed = time_acquire(TimedLock('bench', MetricsRegistry()))
+    print(f"threading.Lock: {bare:8.0f} ns per acquire/release")
+    print(f"TimedLock:      {timed:8.0f} ns per acquire/release")
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# Runs fetch_plane_info through the provider router against local HTTP
+# stand-ins shaped like hexdb, adsbdb and OpenSky. Checks that the three
+# answers normalise to the same fields, that traffic settles on the fastest
+# provider, that a miss falls through to the next one, that a provider
+# returning 500s or 429 is skipped until its cooldown ends and closed again
+# by a successful trial, that the error / unknown results keep
+# fetch_plane_info's contract and that with every circuit open nothing is
+# asked and the lookup is put off rather than failed. Prints the latency
+# with and without routing.
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.metrics import MetricsRegistry
+from modules.network_utils import can_retry_plane_api, fetch_plane_info, make_http_session
+from modules.providers import Provider, ProviderRouter, parse_adsbdb, parse_hexdb, parse_opensky
+
+ICAO = '407CB2'
+KNOWN = {
+    'hexdb': {'ModeS': ICAO, 'Registration': 'G-RUKF', 'Manufacturer': 'Boeing', 'ICAOTypeCode': 'B738', 'Type': '737NG 8AS/W',
+              'RegisteredOwners': 'Ryanair UK', 'OperatorFlagCode': 'RUK'},
+    'adsbdb': {'response': {'aircraft': {'type': '737NG 8AS/W', 'icao_type': 'B738', 'manufacturer': 'Boeing', 'mode_s': ICAO, 'registration': 'G-RUKF',
+                                         'registered_owner': 'Ryanair UK', 'registered_owner_operator_flag_code': 'RUK'}}},
+    'opensky': {'icao24': ICAO.lower(), 'registration': 'G-RUKF', 'manufacturerName': 'The Boeing Company', 'model': '737NG 8AS/W',
+                'typecode': 'B738', 'owner': 'Ryanair UK', 'operatorIcao': 'RUK'},
+}
+#/<provider>/<icao>, behaviour per provider is switched by the test
+behaviour = {'hexdb': ('ok', 0.05), 'adsbdb': ('ok', 0.005), 'opensky': ('ok', 0.02)}
+hits = {name: 0 for name in behaviour}
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        _, name, icao = self.path.split('/')
+        hits[name] += 1
+        mode, delay = behaviour[name]
+        time.sleep(delay)
+        if mode == 'broken':
+            self.reply(500, {'error': 'boom'})
+        elif mode == 'limited':
+            self.reply(429, {'error': 'slow down'}, {'Retry-After': '2'})
+        elif icao != ICAO:
+            self.reply(404, {'response': 'unknown aircraft'} if name == 'adsbdb' else {'status': '404'})
+        else:
+            self.reply(200, KNOWN[name])
+
+    def reply(self, code, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    parsers = {'hexdb': parse_hexdb, 'adsbdb': parse_adsbdb, 'opensky': parse_opensky}
+    providers = {name: Provider(name, f'{base}/{name}/{{icao}}', parse, timeout=2) for name, parse in parsers.items()}
+    session = make_http_session(2)
+
+    #The three response shapes normalise to the same fields
+    answers = [fetch_plane_info(ICAO, session, ProviderRouter([providers[name]])) for name in parsers]
+    assert answers[0] == answers[1] == answers[2] == {'manufacturer': 'Boeing', 'registration': 'G-RUKF', 'owner': 'Ryanair UK', 'model': '737NG 8AS W',
+                                                      'icao_type_code': 'B738', 'operator_flag': 'RUK', 'last_api_error': 0}, answers
+    assert fetch_plane_info('400000', session, ProviderRouter([providers['adsbdb']])) is None
+
+    #hexdb alone, what production used to do
+    hexdb_only = ProviderRouter([providers['hexdb']])
+    started = time.perf_counter()
+    for _ in range(20):
+        fetch_plane_info(ICAO, session, hexdb_only)
+    single_time = (time.perf_counter() - started) / 20
+
+    #Routed: each provider gets tried once, then the fastest takes the traffic
+    registry = MetricsRegistry()
+    router = ProviderRouter(providers.values(), cooldown=1.0, explore_every=0, registry=registry)
+    for name in hits:
+        hits[name] = 0
+    started = time.perf_counter()
+    for _ in range(20):
+        assert fetch_plane_info(ICAO, session, router)['registration'] == 'G-RUKF'
+    routed_time = (time.perf_counter() - started) / 20
+    assert hits['adsbdb'] >= 18 and hits['hexdb'] == 1 and hits['opensky'] == 1, hits
+    status = router.status()
+    assert status['adsbdb']['latency_ms'] < status['opensky']['latency_ms'] < status['hexdb']['latency_ms'], status
+
+    #Unknown to every provider is None, each one asked once
+    for name in hits:
+        hits[name] = 0
+    assert fetch_plane_info('400000', session, router) is None and hits == {'hexdb': 1, 'adsbdb': 1, 'opensky': 1}
+
+    #adsbdb breaks: the answer still comes from the next provider, three failures open its circuit
+    behaviour['adsbdb'] = ('broken', 0)
+    for _ in range(3):
+        assert fetch_plane_info(ICAO, session, router)['registration'] == 'G-RUKF'
+    assert status_open(router) == {'adsbdb'}
+    hits['adsbdb'] = 0
+    for _ in range(5):
+        fetch_plane_info(ICAO, session, router)
+    assert hits['adsbdb'] == 0
+    counters = registry.snapshot()['counters']
+    assert counters['provider_adsbdb_errors'] == 3 and counters['provider_adsbdb_opened'] == 1
+
+    #opensky rate limits: opened straight away, for as long as Retry-After asks
+    behaviour['opensky'] = ('limited', 0)
+    router.states['hexdb'].latency_ms = 1000.0
+    fetch_plane_info(ICAO, session, router)
+    assert status_open(router) == {'adsbdb', 'opensky'}
+    assert router.states['opensky'].open_until - time.time() > 1.5
+
+    #Past the cooldown one trial request goes through: a failure doubles the cooldown, a success closes it
+    time.sleep(1.1)
+    fetch_plane_info(ICAO, session, router)
+    assert router.states['adsbdb'].cooldown == 2.0 and 'adsbdb' in status_open(router)
+    behaviour['adsbdb'] = ('ok', 0.005)
+    behaviour['opensky'] = ('ok', 0.02)
+    time.sleep(2.1)
+    assert fetch_plane_info(ICAO, session, router)['registration'] == 'G-RUKF'
+    fetch_plane_info(ICAO, session, router)
+    assert status_open(router) == set(), router.status()
+    assert registry.snapshot()['counters']['provider_adsbdb_closed'] == 1
+
+    #Every provider failing is an error result so the plane is retried later
+    for name in behaviour:
+        behaviour[name] = ('broken', 0)
+    result = fetch_plane_info(ICAO, session, ProviderRouter(providers.values()))
+    assert result['last_api_error'] > 0 and '500 server error' in result['api_error_msg']
+
+    #Every circuit open: no request, no error to count against the plane, just when to ask again
+    registry = MetricsRegistry()
+    broken = ProviderRouter([providers['hexdb']], failure_threshold=1, cooldown=5.0, registry=registry)
+    fetch_plane_info(ICAO, session, broken)
+    hits['hexdb'] = 0
+    result = fetch_plane_info(ICAO, session, broken)
+    assert hits['hexdb'] == 0 and set(result) == {'unavailable_until'} and 4.0 < result['unavailable_until'] - time.time() <= 5.0, result
+    assert registry.snapshot()['counters']['provider_unavailable'] == 1
+    plane = {'last_api_error': 0, 'api_unavailable_until': result['unavailable_until']}
+    assert not can_retry_plane_api(plane, 60)
+    plane['api_unavailable_until'] = time.time() - 1
+    assert can_retry_plane_api(plane, 60)
+    server.shutdown()
+    result = fetch_plane_info(ICAO, session, ProviderRouter([Provider('hexdb', 'http://127.0.0.1:1/{icao}', parse_hexdb, timeout=2)]))
+    assert result['last_api_error'] > 0 and 'ConnectionError' in result['api_error_msg'], result
+
+    print(f"hexdb only: {single_time * 1000:8.1f} ms per lookup")
+    print(f"routed:     {routed_time * 1000:8.1f} ms per lookup")
+
+    print("\nOK")
+
+
+def status_open(router):
+    return {name for name, state in router.status().items() if state['open']}
+
+
+if __name__ == '__main__':
+    run()
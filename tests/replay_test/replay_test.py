@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Writes a replay log from the SBS capture in tests/sbs_test plus a few
+# aircraft.json snapshots, then replays it at full speed and at 4x. Checks
+# pacing, that replay times keep the recorded spacing, and that looping
+# carries the timeline on instead of jumping back.
+
+import os
+import sys
+import tempfile
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import aircraft_position_time, parse_aircraft
+from modules.replay_utils import REPLAY_KIND_JSON, REPLAY_KIND_SBS, open_replay_log, rebase_snapshot, replay_log, write_replay_record
+from modules.sbs_utils import apply_sbs_message, parse_sbs_line
+
+SBS_SAMPLE = os.path.join(_PROJECT_ROOT, 'tests', 'sbs_test', 'sbs_sample.txt')
+RECORD_SPACING = 0.05
+RECORDED_AT = 1_700_000_000.0
+
+
+def write_log(path):
+    with open(SBS_SAMPLE, 'r') as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    t = RECORDED_AT
+    with open_replay_log(path, 'wt') as f:
+        for i in range(3):
+            snapshot = {'now': t, 'messages': i, 'aircraft': [
+                {'hex': '4ca123', 'flight': 'RYR1AB', 'alt_baro': 3000 + i * 100, 'lat': 53.3 + i * 0.01, 'lon': -6.2, 'seen_pos': 0.2, 'messages': 10 + i},
+            ]}
+            write_replay_record(f, REPLAY_KIND_JSON, snapshot, t)
+            t += RECORD_SPACING
+        for line in lines:
+            write_replay_record(f, REPLAY_KIND_SBS, line, t)
+            t += RECORD_SPACING
+    return len(lines) + 3, t - RECORD_SPACING - RECORDED_AT
+
+
+def replay(path, speed, loop_limit=None):
+    times = []
+    sbs_state = {}
+    snapshots = []
+
+    def on_record(record, replay_time):
+        times.append(replay_time)
+        if record['kind'] == REPLAY_KIND_JSON:
+            snapshots.append(rebase_snapshot(record['data'], replay_time))
+        else:
+            message = parse_sbs_line(record['line'])
+            if message is not None:
+                apply_sbs_message(sbs_state, message, replay_time)
+
+    def should_run():
+        return loop_limit is None or len(times) < loop_limit
+
+    started = time.time()
+    count = replay_log(path, on_record, speed=speed, should_run=should_run, loop=loop_limit is not None)
+    return count, time.time() - started, times, sbs_state, snapshots
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capture.jsonl.gz')
+        records, span = write_log(path)
+        print(f"Log: {records} records spanning {span:.2f}s, {os.path.getsize(path)} bytes compressed")
+        print("=" * 80)
+
+        count, elapsed, times, sbs_state, snapshots = replay(path, speed=0)
+        print(f"full speed: {count} records in {elapsed * 1000:.1f} ms, timeline {times[-1] - times[0]:.2f}s")
+        assert count == records
+        assert abs((times[-1] - times[0]) - span) < 1e-6
+        assert len(sbs_state) == 3
+
+        position_times = [aircraft_position_time(s['aircraft'][0], s['now']) for s in snapshots]
+        assert all(b > a for a, b in zip(position_times, position_times[1:]))
+        plane = parse_aircraft(snapshots[-1]['aircraft'][0])
+        assert plane['icao'] == '4CA123' and plane['altitude'] == 3200
+
+        count, elapsed, times, _, _ = replay(path, speed=4)
+        print(f"4x:         {count} records in {elapsed:.2f}s (expected ~{span / 4:.2f}s)")
+        assert span / 4 - 0.05 <= elapsed <= span / 4 + 0.5
+
+        count, elapsed, times, _, _ = replay(path, speed=0, loop_limit=records * 2 + 5)
+        print(f"looped:     {count} records, timeline {times[-1] - times[0]:.2f}s")
+        assert all(b >= a for a, b in zip(times, times[1:]))
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
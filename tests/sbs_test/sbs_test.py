@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Feeds a recorded SBS/BaseStation capture through the streaming ingest using a
+# local TCP stand-in for readsb's port 30003. The stand-in drops the connection
+# after each replay so the reconnect/backoff path is exercised too.
+
+import os
+import socket
+import sys
+import threading
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import parse_aircraft
+from modules.sbs_utils import sbs_stream
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sbs_sample.txt')
+REPLAYS = 2
+LINE_DELAY_SECONDS = 0.005
+
+
+def serve_sample(server_sock, replays):
+    with open(SAMPLE_FILE, 'rb') as f:
+        lines = f.readlines()
+
+    for _ in range(replays):
+        conn, _addr = server_sock.accept()
+        with conn:
+            for line in lines:
+                conn.sendall(line)
+                time.sleep(LINE_DELAY_SECONDS)
+    server_sock.close()
+
+
+def run():
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_sock.bind(('127.0.0.1', 0))
+    server_sock.listen(1)
+    server = server_sock.getsockname()
+    threading.Thread(target=serve_sample, args=(server_sock, REPLAYS), daemon=True).start()
+
+    updates = []
+    statuses = []
+    connects = []
+
+    def on_aircraft(aircraft, message):
+        if 'lat' in message:
+            updates.append(parse_aircraft(dict(aircraft)))
+
+    def on_status(text):
+        statuses.append(text)
+        if text.startswith('Connected'):
+            connects.append(time.time())
+
+    def should_run():
+        return len(connects) <= REPLAYS and not (len(connects) == REPLAYS and statuses[-1].endswith('closed the connection'))
+
+    started = time.time()
+    state = sbs_stream(server, on_aircraft, should_run=should_run, on_status=on_status, retry_delay=0.2, max_retry_delay=1)
+    elapsed = time.time() - started
+
+    print(f"Stand-in: {server[0]}:{server[1]}, {REPLAYS} replays of {os.path.basename(SAMPLE_FILE)}")
+    print(f"Elapsed: {elapsed:.2f}s, position updates: {len(updates)}")
+    print("=" * 80)
+    for text in statuses:
+        print(f"  status: {text}")
+    print("=" * 80)
+    for hex_code, aircraft in sorted(state.items()):
+        plane = parse_aircraft(dict(aircraft))
+        print(f"  {plane['icao']:8s} flight={plane['flight']:8s} alt={plane['altitude']!s:>6} "
+              f"spd={plane['speed']!s:>6} trk={plane['track']!s:>6} vr={plane['baro_rate']!s:>6} "
+              f"sq={plane['squawk']:5s} lat={plane['lat']} lon={plane['lon']} msgs={plane['messages']}")
+
+    assert len(connects) == REPLAYS, 'expected one reconnect per replay'
+    assert len(state) == 3, 'expected three aircraft in the capture'
+    assert all(plane['lat'] != '-' for plane in updates)
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
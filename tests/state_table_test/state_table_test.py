@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Fills the aircraft state table from synthetic traffic (some planes without
+# a position or with 'ground' / '-' altitudes) and checks the column helpers
+# the render loop uses against the per-plane functions they replace:
+# haversine_km against calculate_distance, altitude_mask and distance_mask
+# against the filter functions, project_xy against coords_to_xy pixel for
+# pixel. Also checks pruning, display_until and slot reuse. Prints the
+# per-plane loop against the column version at 2000 aircraft.
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.core_utils import calculate_distance, coords_to_xy
+from modules.data_utils import parse_aircraft
+from modules.state_table import AircraftStateTable, altitude_mask, distance_mask, haversine_km, project_xy
+from modules.synthetic_traffic import SyntheticTraffic
+from modules.ui_utils import plane_matches_altitude_filter, plane_matches_distance_filter
+
+CENTRE = (51.5, -0.12)
+PLANES = 2000
+REPEATS = 50
+CENTER_XY = (540, 540)
+
+
+def fill_table(now):
+    traffic = SyntheticTraffic(*CENTRE, count=PLANES, radius_km=400, seed=5, dropout_rate=0, bad_position_rate=0, now=now)
+    rng = random.Random(5)
+    table = AircraftStateTable(capacity=64)
+    for aircraft in traffic.snapshot()['aircraft']:
+        plane = parse_aircraft(aircraft)
+        roll = rng.random()
+        if roll < 0.05:
+            plane['altitude'] = 'ground'
+        elif roll < 0.1:
+            plane['altitude'] = '-'
+        if rng.random() > 0.05:
+            plane['last_lat'], plane['last_lon'] = plane['lat'], plane['lon']
+        plane['last_update_time'] = now - rng.uniform(0, 120)
+        table.upsert(plane['icao'], plane, display_until=now + rng.uniform(-30, 60))
+    return table
+
+
+def per_plane(planes, view, range_km, altitude, distance):
+    # What the render loop did for each plane before the column helpers
+    result = {}
+    for icao, plane in planes.items():
+        if not plane_matches_altitude_filter(plane, *altitude) or not plane_matches_distance_filter(plane, *distance):
+            continue
+        if plane.get('last_lat') is None:
+            result[icao] = (None, None)
+            continue
+        result[icao] = coords_to_xy(float(plane['last_lat']), float(plane['last_lon']), range_km, *view, 1080, 1080, *CENTER_XY)
+    return result
+
+
+def by_columns(table, slots, distances, view, range_km, altitude, distance):
+    keep = altitude_mask(table.altitude[slots], *altitude) & distance_mask(distances, *distance)
+    placed = keep & np.isfinite(table.lat[slots])
+    xs, ys = project_xy(table.lat[slots][placed], table.lon[slots][placed], range_km, *view, *CENTER_XY)
+    positions = dict(zip((table.icaos[slot] for slot in slots[placed]), zip(xs.tolist(), ys.tolist())))
+    return {table.icaos[slot]: positions.get(table.icaos[slot], (None, None)) for slot in slots[keep]}
+
+
+def run():
+    now = time.time()
+    table = fill_table(now)
+    assert len(table) == PLANES and len(table.icaos) >= PLANES
+
+    view = (51.2, 0.3)
+    slots = table.displayed_slots(now)
+    assert 0 < len(slots) < PLANES
+    assert set(table.icaos[slot] for slot in slots) == {icao for icao in table if table.is_displayed(icao, now)}
+    planes = {table.icaos[slot]: table.records[slot] for slot in slots}
+
+    distances = haversine_km(*view, table.lat[slots], table.lon[slots])
+    for slot, distance in zip(slots.tolist(), distances.tolist()):
+        plane = table.records[slot]
+        if plane.get('last_lat') is None:
+            assert distance != distance
+        else:
+            assert abs(distance - calculate_distance(*view, plane['last_lat'], plane['last_lon'])) <= 0.1
+        plane['distance'] = distance
+
+    cases = [((0, True), (0, False)), ((20000, True), (150, False)), ((15000, False), (150, True)), ((0, True), (80, True))]
+    for range_km in (25, 100, 300):
+        for altitude, distance in cases:
+            expected = per_plane(planes, view, range_km, altitude, distance)
+            assert by_columns(table, slots, distances, view, range_km, altitude, distance) == expected, (range_km, altitude, distance)
+    assert any(position == (None, None) for position in per_plane(planes, view, 100, (0, True), (0, False)).values())
+
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        per_plane(planes, view, 100, (20000, True), (150, False))
+    loop_time = (time.perf_counter() - started) / REPEATS
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        by_columns(table, slots, distances, view, 100, (20000, True), (150, False))
+    column_time = (time.perf_counter() - started) / REPEATS
+
+    #Stale planes go, their slots are reused before the arrays grow
+    capacity = len(table.icaos)
+    removed = table.prune(now - 60)
+    assert removed and len(table) == PLANES - len(removed)
+    assert all(icao not in table for icao in removed)
+    assert not np.any(table.used & (table.last_update < now - 60))
+    for icao, plane in list(removed.items())[:10]:
+        table.upsert(icao, plane, display_until=now + 60)
+    assert len(table.icaos) == capacity and all(table.is_displayed(icao, now) for icao in list(removed)[:10])
+
+    print(f"{len(slots)} displayed of {PLANES} aircraft")
+    print(f"per plane:   {loop_time * 1000:8.2f} ms")
+    print(f"columns:     {column_time * 1000:8.2f} ms")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Feeds a burst of enriched planes (with repeats) to the stats.csv
+# write-behind queue and to save_plane_to_csv. Checks that the queued file
+# ends up with the same rows (the newest per icao), that the size threshold
+# flushes without waiting for the timer, that a full queue drops new aircraft
+# at once but still coalesces known ones, that rows already in the file are
+# kept, that close() writes what is pending and that the location_history
+# column keeps every trail point submitted so far, as copied at submit time. Prints the cost per plane of both.
+
+import ast
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import save_plane_to_csv
+from modules.metrics import MetricsRegistry
+from modules.stats_writer import StatsCsvWriter
+from modules.trajectory_store import TrajectoryStore
+
+UPDATES = 600
+AIRCRAFT = 150
+_MODELS = ['A320', 'B738', 'A321', 'E190']
+
+
+def plane(rng, altitude=None):
+    return {'manufacturer': 'Airbus', 'model': rng.choice(_MODELS), 'owner': 'Test Air ', 'registration': 'G-TEST', 'altitude': altitude or rng.randrange(40000)}
+
+
+def read_rows(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return {row['icao']: {key: value for key, value in row.items() if key != 'timestamp'} for row in csv.DictReader(f)}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(3)
+        updates = [(f"{0x400000 + rng.randrange(AIRCRAFT):06X}", plane(rng)) for _ in range(UPDATES)]
+        updates.append(('400999', {'manufacturer': '-', 'model': 'A320', 'owner': 'Test Air', 'registration': 'G-TEST'}))
+
+        #save_plane_to_csv rewrites the file for every plane, relative to the cwd
+        os.chdir(tmp)
+        started = time.perf_counter()
+        for icao, data in updates:
+            save_plane_to_csv(icao, data)
+        direct_time = time.perf_counter() - started
+        direct_rows = read_rows(os.path.join(tmp, 'stats_history', 'stats.csv'))
+
+        registry = MetricsRegistry()
+        queued_path = os.path.join(tmp, 'queued', 'stats.csv')
+        writer = StatsCsvWriter(queued_path, flush_interval=60, flush_size=AIRCRAFT // 2, registry=registry).start()
+        started = time.perf_counter()
+        accepted = sum(writer.submit(icao, data) for icao, data in updates)
+        submit_time = time.perf_counter() - started
+        #Half the aircraft pending triggers a flush long before the 60s timer
+        assert wait_for(lambda: os.path.exists(queued_path))
+        writer.close()
+        queued_time = submit_time + sum(registry.histogram('stats_csv_flush_ms').values) / 1000
+        assert accepted == UPDATES
+        assert read_rows(queued_path) == direct_rows
+        counters = registry.snapshot()['counters']
+        assert counters['stats_csv_rows_written'] < UPDATES and counters['stats_csv_coalesced'] > 0
+        assert not writer.pending and writer.thread is None
+
+        #Bounded: with nothing draining, new aircraft are dropped but known ones still update
+        full = StatsCsvWriter(queued_path, flush_size=100, max_pending=3, registry=registry)
+        for n in range(3):
+            assert full.submit(f"ABC00{n}", plane(rng))
+        started = time.perf_counter()
+        assert not full.submit('ABC003', plane(rng))
+        assert time.perf_counter() - started < 0.01
+        assert full.submit('ABC000', plane(rng, altitude=12345))
+        assert registry.snapshot()['counters']['stats_csv_dropped'] == 1
+        full.close()
+        rows = read_rows(queued_path)
+        assert rows['ABC000']['altitude'] == '12345' and 'ABC003' not in rows
+        assert len(rows) == len(direct_rows) + 3
+
+        #A trail that moved on since the last write is merged with what the file holds. The row is
+        #built when the writer flushes, from the trail as copied at submit time.
+        trail = TrajectoryStore(2)
+        tracked = plane(rng)
+        for n in range(4):
+            trail.append(1700000000.0 + n, 51.0 + n, -0.5)
+            trailed = StatsCsvWriter(queued_path, registry=registry)
+            assert trailed.submit('ABC100', dict(tracked, location_history=trail.copy()))
+            if n == 3:
+                trail.append(1700000010.0, 10.0, 10.0)
+            trailed.close()
+        history = ast.literal_eval(read_rows(queued_path)['ABC100']['location_history'])
+        assert sorted(history) == [f"{1700000000.0 + n:.6f}" for n in range(4)] and history[f"{1700000003.0:.6f}"] == [54.0, -0.5]
+
+        print(f"{UPDATES} enriched planes, {AIRCRAFT} aircraft")
+        print(f"save_plane_to_csv:  {direct_time / UPDATES * 1000:8.3f} ms per plane")
+        print(f"StatsCsvWriter:     {queued_time / UPDATES * 1000:8.3f} ms per plane ({counters['stats_csv_rows_written']} rows written)")
+        os.chdir(_PROJECT_ROOT)
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Starts the status server on a free port with a populated registry, then
+# checks the Prometheus text on /metrics, the JSON on /status, the 404 for
+# other paths, and that a failing provider returns a 500 instead of killing
+# the server thread. Prints the scrape time for /metrics.
+
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.metrics import MetricsRegistry
+from modules.status_server import PROMETHEUS_CONTENT_TYPE, format_prometheus, start_status_server
+
+SCRAPES = 50
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.headers.get('Content-Type'), response.read().decode()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers.get('Content-Type'), error.read().decode()
+
+
+def run():
+    registry = MetricsRegistry()
+    registry.inc('snapshots_ingested', 7)
+    registry.set_gauge('planes_active', 42)
+    registry.set_gauge('source', 'json')
+    for value in range(100):
+        registry.observe('ingest_snapshot_ms', value / 10)
+
+    text = format_prometheus(registry.snapshot())
+    assert 'planetracker_snapshots_ingested_total 7.0' in text
+    assert 'planetracker_planes_active 42.0' in text
+    assert 'planetracker_source' not in text
+    assert 'planetracker_ingest_snapshot_ms{quantile="0.99"} 9.8' in text
+    assert 'planetracker_ingest_snapshot_ms_count 100.0' in text
+    for line in text.splitlines():
+        assert line.startswith('# TYPE ') or len(line.split(' ')) == 2, line
+
+    status_calls = []
+
+    def status_provider():
+        status_calls.append(1)
+        if len(status_calls) == 2:
+            raise RuntimeError('provider failed')
+        return {'aircraft': {'active': 42}}
+
+    server = start_status_server('127.0.0.1', 0, registry.snapshot, status_provider)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        code, content_type, body = fetch(base + '/metrics')
+        assert code == 200 and content_type == PROMETHEUS_CONTENT_TYPE
+        assert 'planetracker_planes_active 42.0' in body
+
+        code, content_type, body = fetch(base + '/status')
+        assert code == 200 and content_type == 'application/json'
+        assert json.loads(body) == {'aircraft': {'active': 42}}
+
+        code, _, body = fetch(base + '/status')
+        assert code == 500 and 'provider failed' in body
+        code, _, _ = fetch(base + '/')
+        assert code == 200
+        code, _, _ = fetch(base + '/nope')
+        assert code == 404
+
+        started = time.perf_counter()
+        for _ in range(SCRAPES):
+            fetch(base + '/metrics')
+        print(f"/metrics: {(time.perf_counter() - started) / SCRAPES * 1000:.2f} ms per scrape")
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Runs the synthetic traffic generator at 10, 500 and 5000 aircraft for two
+# simulated minutes. Checks that it stays inside its radius, that tracks follow
+# great circles, and that dropouts, stale fixes and corrupt positions all show
+# up. Also checks that the SBS output goes through the SBS parser. Prints
+# generation and parse_aircraft cost per snapshot at each scale.
+
+import os
+import sys
+import time
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.core_utils import calculate_distance
+from modules.data_utils import parse_aircraft
+from modules.sbs_utils import apply_sbs_message, parse_sbs_line
+from modules.synthetic_traffic import SyntheticTraffic, great_circle_step
+
+CENTRE = (51.5, -0.12)
+RADIUS_KM = 400
+SIZES = [10, 500, 5000]
+STEPS = 120
+
+
+def check_great_circle():
+    #Quarter of the way round the equator heading east, and a due-north leg
+    lat, lon, track = great_circle_step(0.0, 0.0, 90.0, 6371 * 3.141592653589793 / 2)
+    assert abs(lat) < 1e-9 and abs(lon - 90.0) < 1e-9 and abs(track - 90.0) < 1e-6
+    lat, lon, track = great_circle_step(50.0, 0.0, 0.0, 111.195)
+    assert abs(lat - 51.0) < 1e-3 and abs(lon) < 1e-9 and abs(track) < 1e-6
+    #Eastbound from 50N the track swings south of 090 on a great circle
+    _, _, track = great_circle_step(50.0, 0.0, 90.0, 1000)
+    assert 90.0 < track < 110.0
+
+
+def run():
+    check_great_circle()
+    print(f"{'aircraft':>8} {'step ms':>8} {'snapshot ms':>12} {'parse ms':>9} {'reported':>9} {'stale':>6} {'bad':>5}")
+    print("=" * 64)
+
+    for size in SIZES:
+        traffic = SyntheticTraffic(*CENTRE, count=size, radius_km=RADIUS_KM, dropout_rate=0.01, bad_position_rate=0.002, now=1_700_000_000.0)
+        step_time = snapshot_time = parse_time = 0.0
+        stale = bad = reported = 0
+
+        for _ in range(STEPS):
+            started = time.perf_counter()
+            traffic.step(1.0)
+            step_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            snapshot = traffic.snapshot()
+            snapshot_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            planes = [parse_aircraft(aircraft) for aircraft in snapshot['aircraft']]
+            parse_time += time.perf_counter() - started
+
+            reported += len(planes)
+            stale += sum(1 for aircraft in snapshot['aircraft'] if aircraft['seen_pos'] > 0)
+            bad += sum(1 for plane in planes if calculate_distance(*CENTRE, plane['lat'], plane['lon']) > RADIUS_KM + 50)
+
+        assert len(traffic.aircraft) == size
+        assert all(calculate_distance(*CENTRE, plane['lat'], plane['lon']) <= RADIUS_KM + 1 for plane in traffic.aircraft)
+        assert reported < size * STEPS, 'dropouts should hide some aircraft'
+        if size >= 500:
+            assert stale > 0 and bad > 0
+
+        print(f"{size:>8} {step_time / STEPS * 1000:>8.2f} {snapshot_time / STEPS * 1000:>12.2f} {parse_time / STEPS * 1000:>9.2f} "
+              f"{reported / STEPS:>9.1f} {stale:>6} {bad:>5}")
+
+    sbs_state = {}
+    traffic = SyntheticTraffic(*CENTRE, count=50, radius_km=RADIUS_KM, now=1_700_000_000.0)
+    traffic.step(1.0)
+    for line in traffic.sbs_lines():
+        message = parse_sbs_line(line)
+        assert message is not None, line
+        apply_sbs_message(sbs_state, message)
+    assert len(sbs_state) == 50
+    assert all('lat' in aircraft and 'gs' in aircraft for aircraft in sbs_state.values())
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+# Checks the per-day trail points file: icao encoding, (icao, ts) ordering
+# and dedupe, per-aircraft and time-range queries, and that a day CSV in the
+# old format (trails in a location_history column) is still read and has its
+# trails moved into the points file on compaction. Prints the cost of
+# reading a day's trails from the points file against literal_eval on the
+# old column.
+
+import ast
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, _PROJECT_ROOT)
+
+from modules.data_utils import load_recent_heatmap_history, load_today_heatmap_hits
+from modules.history_journal import (FLIGHT_HISTORY_FIELDS, FlightHistoryJournal, compact_flight_history, load_flight_history_day,
+                                     seal_journal)
+from modules.trajectory_points import (decode_icao, encode_icao, merge_points_file, points_from_lists, points_path, points_to_histories,
+                                       query_points, read_points)
+
+PLANES = 500
+POINTS_PER_PLANE = 400
+
+
+def check_encoding():
+    for icao in ('000000', '4CA123', 'FFFFFF', '~ABC123'):
+        assert decode_icao(encode_icao(icao)) == icao, icao
+    assert encode_icao('4ca123') == encode_icao('4CA123')
+    for bad in ('', 'XYZ', '1000000', '~'):
+        assert encode_icao(bad) is None, bad
+
+
+def check_sort_and_query(tmp):
+    path = os.path.join(tmp, 'check.points')
+    merge_points_file(path, points_from_lists({'4CA123': [(3.0, 1, 1), (1.0, 2, 2)], '~00BEEF': [(2.0, 3, 3)], 'bad!': [(1.0, 0, 0)]}))
+    #Later points for the same (icao, ts) replace earlier ones
+    merge_points_file(path, points_from_lists({'4CA123': [(1.0, 5, 5), (2.0, 4, 4)]}))
+    points = read_points(path)
+    assert [decode_icao(code) for code in points['icao']] == ['4CA123'] * 3 + ['~00BEEF']
+    assert points['ts'].tolist() == [1.0, 2.0, 3.0, 2.0]
+    assert points['lat'].tolist() == [5.0, 4.0, 1.0, 3.0]
+    #The same microsecond is the same point, however the writer rounded the epoch
+    merge_points_file(path, points_from_lists({'4CA123': [(1.0000004, 6, 6)]}))
+    assert read_points(path)['lat'].tolist() == [6.0, 4.0, 1.0, 3.0]
+    points = read_points(path)
+    assert query_points(points, icao='4CA123', start=2.0)['ts'].tolist() == [2.0, 3.0]
+    assert query_points(points, start=2.0, end=3.0)['ts'].tolist() == [2.0, 2.0]
+    assert len(query_points(points, icao='000001')) == 0
+    assert len(read_points(os.path.join(tmp, 'missing.points'))) == 0
+
+
+def legacy_day(history_dir, day, day_start):
+    # A CSV the way save_flight_history wrote it before the points file
+    rng = random.Random(1)
+    trails = {}
+    os.makedirs(history_dir, exist_ok=True)
+    with open(os.path.join(history_dir, f'{day}.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FLIGHT_HISTORY_FIELDS + ['location_history'], extrasaction='ignore')
+        writer.writeheader()
+        for n in range(PLANES):
+            icao = f"{0x400000 + n:06X}"
+            trail = {}
+            for i in range(POINTS_PER_PLANE):
+                trail[f"{day_start + n + i * 7:.6f}"] = [round(rng.uniform(50, 53), 6), round(rng.uniform(-2, 2), 6)]
+            trails[icao] = trail
+            writer.writerow({'icao': icao, 'model': 'A320', 'first_seen': f'{day} 00:00:00', 'last_seen': f'{day} 01:00:00', 'location_history': str(trail)})
+    return trails
+
+
+def run():
+    check_encoding()
+    with tempfile.TemporaryDirectory() as tmp:
+        check_sort_and_query(tmp)
+
+        history_dir = os.path.join(tmp, 'flight_history')
+        day = datetime.now().strftime('%Y-%m-%d')
+        day_start = datetime.strptime(day, '%Y-%m-%d').timestamp()
+        trails = legacy_day(history_dir, day, day_start)
+
+        started = time.perf_counter()
+        with open(os.path.join(history_dir, f'{day}.csv'), 'r', newline='', encoding='utf-8') as f:
+            csv.field_size_limit(10 * 1024 * 1024)
+            for row in csv.DictReader(f):
+                ast.literal_eval(row['location_history'])
+        literal_eval_time = time.perf_counter() - started
+
+        #The old column is read as is, then moved out by the next compaction
+        rows = load_flight_history_day(history_dir, day)
+        assert {icao: len(row['location_history']) for icao, row in rows.items()} == {icao: len(trail) for icao, trail in trails.items()}
+        journal = FlightHistoryJournal(history_dir)
+        journal.flush({'400000': {'model': 'B738', 'location_history': {f"{day_start + 5000:.6f}": [51.0, 0.0]}}})
+        seal_journal(history_dir, day)
+        compact_flight_history(history_dir, day)
+        with open(os.path.join(history_dir, f'{day}.csv'), 'r', newline='', encoding='utf-8') as f:
+            assert 'location_history' not in next(csv.reader(f))
+
+        points = read_points(points_path(history_dir, day))
+        assert len(points) == PLANES * POINTS_PER_PLANE + 1
+        histories = points_to_histories(points)
+        #Coordinates are stored as float32 like TrajectoryStore keeps them, well under a metre
+        assert histories['400001'].keys() == trails['400001'].keys()
+        for key, (lat, lon) in trails['400001'].items():
+            assert abs(histories['400001'][key][0] - lat) < 1e-5 and abs(histories['400001'][key][1] - lon) < 1e-5
+        compacted = load_flight_history_day(history_dir, day)
+        assert compacted['400000']['model'] == 'B738' and len(compacted['400000']['location_history']) == POINTS_PER_PLANE + 1
+        assert len(load_today_heatmap_hits(history_dir, now=day_start + 3600)) == len(points)
+
+        started = time.perf_counter()
+        points = read_points(points_path(history_dir, day))
+        one_trail = query_points(points, icao='4000FF')
+        window = query_points(points, start=day_start + 600, end=day_start + 1200)
+        query_time = time.perf_counter() - started
+        assert len(one_trail) == POINTS_PER_PLANE
+        assert ((window['ts'] >= day_start + 600) & (window['ts'] < day_start + 1200)).all()
+
+        recent = load_recent_heatmap_history(history_dir, history_seconds=600, now=day_start + 1200)
+        assert len(recent) == len(query_points(points, start=day_start + 600, end=day_start + 1200.000001))
+
+        print(f"{PLANES} planes x {POINTS_PER_PLANE} points")
+        print(f"literal_eval of the old column: {literal_eval_time * 1000:8.2f} ms")
+        print(f"points file, one trail + window: {query_time * 1000:8.2f} ms")
+        print(f"points file size: {os.path.getsize(points_path(history_dir, day)) // 1024} KB")
+
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    run()